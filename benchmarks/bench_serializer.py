@@ -0,0 +1,77 @@
+"""
+Compares FinancialDataEncoder with the dump_financial_data serializer.
+
+    python benchmarks/bench_serializer.py --rows 1000,100000
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+# fmt: off
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+from financial_data import (FinancialData, FinancialDataBatch,
+                            FinancialDataEncoder, dump_financial_data)
+# fmt: on
+
+
+def generate_rows(count: int) -> list:
+    """
+    Generates (symbol, date, open_price, close_price, volume) rows
+    like the ones read from database.
+    """
+
+    rng = random.Random(count)
+    symbols = ['IBM', 'AAPL', 'MSFT', 'GOOG']
+    first_day = date(2000, 1, 1)
+    return [(symbols[index % len(symbols)],
+             first_day + timedelta(days=index // len(symbols)),
+             Decimal(rng.randint(100, 99999)).scaleb(-2),
+             Decimal(rng.randint(100, 99999)).scaleb(-2),
+             rng.randint(1000, 90000000))
+            for index in range(count)]
+
+
+def main():
+    """
+    Runs the benchmark and prints one JSON result per line.
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', default='1000,100000',
+                        help='comma separated numbers of rows')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for count in [int(value) for value in args.rows.split(',')]:
+        rows = generate_rows(count)
+        items = [FinancialData(*row) for row in rows]
+        batch = FinancialDataBatch.from_rows(rows)
+
+        def encoder():
+            return json.dumps(items, cls=FinancialDataEncoder).encode()
+
+        def serializer():
+            return dump_financial_data(batch)
+
+        if encoder() != serializer():
+            raise AssertionError("Serializer output differs from encoder output")
+
+        encoder_time = min(timeit.repeat(encoder, number=1, repeat=args.repeat))
+        serializer_time = min(timeit.repeat(serializer, number=1, repeat=args.repeat))
+        print(json.dumps({
+            'rows': count,
+            'encoder_ms': round(encoder_time * 1000, 2),
+            'serializer_ms': round(serializer_time * 1000, 2),
+            'speedup': round(encoder_time / serializer_time, 2),
+        }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""
+Measures requests/sec and latency of the financial API server.
+
+Run it against an already running server:
+
+    python benchmarks/bench_server.py --concurrency 1,4,16
+
+or let it start `financial/app.py` once per worker count, to show how
+throughput scales with SERVER_WORKERS (database must be reachable):
+
+    python benchmarks/bench_server.py --spawn-workers 1,2,4,8 --concurrency 16
+
+or with SERVER_PROCESSES in prefork mode, to show how throughput scales
+with the number of cores used. The load is then sent from as many client
+processes as CPUs, so that the client is not the bottleneck:
+
+    python benchmarks/bench_server.py --spawn-processes 1,2,4,8 --concurrency 32
+
+The spawned servers have their result cache disabled unless `--cache`
+is given, so that the same query is answered from the database each time.
+"""
+
+from multiprocessing import Pool
+from typing import List, Tuple
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+APP_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), os.path.pardir, 'financial', 'app.py'))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Returns the given percentile (0..1) of a list of values,
+    using the nearest-rank method.
+    """
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def collect_latencies(host: str, port: int, path: str,
+                      concurrency: int, duration: float) -> Tuple[List[float], int]:
+    """
+    Sends GET requests over keep-alive connections from `concurrency`
+    client threads during `duration` seconds.
+
+    Returns:
+        A tuple with the latency of each successful request and the number of errors.
+    """
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        local_latencies = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            started_at = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    local_errors += 1
+                if response.will_close:
+                    conn.close()
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+                continue
+            local_latencies.append(time.perf_counter() - started_at)
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def run_load(host: str, port: int, path: str,
+             concurrency: int, duration: float,
+             client_processes: int = 1) -> dict:
+    """
+    Sends GET requests over keep-alive connections from `concurrency`
+    clients during `duration` seconds.
+
+    Args:
+        host (str): The server host.
+        port (int): The server port.
+        path (str): The requested path with its query string.
+        concurrency (int): Number of concurrent clients.
+        duration (float): Duration of the run in seconds.
+        client_processes (int): Number of processes the clients are
+            spread over, as one process can not load a multi-process server.
+
+    Returns:
+        A dictionary with requests, errors, throughput and latency percentiles.
+    """
+
+    client_processes = max(1, min(client_processes, concurrency))
+
+    started_at = time.perf_counter()
+    if client_processes == 1:
+        results = [collect_latencies(host, port, path, concurrency, duration)]
+    else:
+        # Spread the clients evenly over the processes
+        shares = [concurrency // client_processes + (index < concurrency % client_processes)
+                  for index in range(client_processes)]
+        with Pool(client_processes) as pool:
+            results = pool.starmap(collect_latencies, [
+                (host, port, path, share, duration) for share in shares])
+    elapsed = time.perf_counter() - started_at
+
+    latencies = [latency for (values, _) in results for latency in values]
+    errors = sum(count for (_, count) in results)
+
+    return {
+        'path': path,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def wait_for_port(host: str, port: int, timeout: float = 15.0):
+    """
+    Waits until the server accepts connections.
+    """
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            http.client.HTTPConnection(host, port, timeout=1).connect()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server did not start on port {port}")
+
+
+def spawn_server(port: int, env: dict) -> subprocess.Popen:
+    """
+    Starts financial/app.py with the given extra environment variables.
+    """
+
+    process = subprocess.Popen(
+        [sys.executable, APP_PATH],
+        env={**os.environ, 'SERVER_PORT': str(port), **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
+    wait_for_port('localhost', port)
+    return process
+
+
+def run_prefork_scaling(args, concurrencies: List[int]):
+    """
+    Starts financial/app.py in prefork mode once per number of processes,
+    and prints the throughput of each run with its speedup over the first
+    number of processes at the same concurrency.
+    """
+
+    client_processes = args.client_processes or os.cpu_count() or 1
+    baseline = {}
+    for processes in args.spawn_processes.split(','):
+        env = {
+            'SERVER_MODE': 'prefork',
+            'SERVER_PROCESSES': processes,
+        }
+        if not args.cache:
+            env['CACHE_MAX_ENTRIES'] = '0'
+
+        process = spawn_server(args.port, env)
+        try:
+            for concurrency in concurrencies:
+                result = run_load('localhost', args.port, args.path,
+                                  concurrency, args.duration, client_processes)
+                result['server_processes'] = int(processes)
+                result['client_processes'] = client_processes
+                result['cpus'] = os.cpu_count()
+                baseline.setdefault(concurrency, result['requests_per_sec'])
+                if baseline[concurrency]:
+                    result['speedup'] = round(
+                        result['requests_per_sec'] / baseline[concurrency], 2)
+                print(json.dumps(result), flush=True)
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    """
+    Runs the benchmark and prints one JSON result per line.
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--path', default='/api/statistics?symbol=IBM'
+                        '&start_date=2000-01-01&end_date=2030-01-01')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--concurrency', default='1,4,16',
+                        help='comma separated numbers of concurrent clients')
+    parser.add_argument('--spawn-workers', default='',
+                        help='comma separated SERVER_WORKERS values to start '
+                        'the server with (threaded mode)')
+    parser.add_argument('--spawn-processes', default='',
+                        help='comma separated SERVER_PROCESSES values to start '
+                        'the server with (prefork mode)')
+    parser.add_argument('--client-processes', type=int, default=0,
+                        help='processes sending the load (default to 1, or to '
+                        'the number of CPUs with --spawn-processes)')
+    parser.add_argument('--cache', action='store_true',
+                        help='keep the result cache of the spawned servers enabled')
+    args = parser.parse_args()
+
+    concurrencies = [int(value) for value in args.concurrency.split(',')]
+
+    if args.spawn_processes:
+        run_prefork_scaling(args, concurrencies)
+        return
+
+    if not args.spawn_workers:
+        for concurrency in concurrencies:
+            print(json.dumps(run_load(args.host, args.port, args.path,
+                                      concurrency, args.duration,
+                                      args.client_processes or 1)))
+        return
+
+    for workers in args.spawn_workers.split(','):
+        env = {
+            'SERVER_MODE': 'threaded',
+            'SERVER_WORKERS': workers,
+            'DATABASE_POOL_SIZE': workers,
+        }
+        if not args.cache:
+            env['CACHE_MAX_ENTRIES'] = '0'
+
+        process = spawn_server(args.port, env)
+        try:
+            for concurrency in concurrencies:
+                result = run_load('localhost', args.port, args.path,
+                                  concurrency, args.duration,
+                                  args.client_processes or 1)
+                result['server_workers'] = int(workers)
+                print(json.dumps(result), flush=True)
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Compares the storage backends on the same synthetic dataset: bulk upsert
+throughput, then latency of range scans and of range aggregations.
+
+    python benchmarks/bench_storage.py --backends mysql,sqlite --symbols 20 --days 2500
+
+The MySQL backend uses the DATABASE_* configurations of the .env file,
+the SQLite one a temporary database file. The rows are written under
+BENCH* symbols, which are deleted at the end of the run.
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# fmt: off
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+from db_connection import DatabaseError, create_backend
+from storage_backends import SQLiteBackend
+from bench_server import percentile
+# fmt: on
+
+COLUMNS = ('symbol', 'date', 'open_price', 'close_price', 'volume')
+
+
+def generate_rows(symbols: int, days: int) -> list:
+    """
+    Generates (symbol, date, open_price, close_price, volume) rows
+    of `days` consecutive dates for `symbols` symbols.
+    """
+
+    rng = random.Random(symbols * days)
+    first_day = date(2000, 1, 1)
+    return [(f"BENCH{index}",
+             first_day + timedelta(days=day),
+             Decimal(rng.randint(100, 99999)).scaleb(-2),
+             Decimal(rng.randint(100, 99999)).scaleb(-2),
+             rng.randint(1000, 90000000))
+            for index in range(symbols)
+            for day in range(days)]
+
+
+def run_backend(backend, rows: list, args) -> dict:
+    """
+    Runs the benchmark on one backend.
+
+    Returns:
+        A dictionary with insert throughput and query latencies.
+    """
+
+    conn = backend.connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM financial_data WHERE symbol LIKE %s", ('BENCH%',))
+        conn.commit()
+
+        # Bulk upsert, committed batch by batch as get_raw_data.py does
+        started_at = time.perf_counter()
+        for offset in range(0, len(rows), args.batch_size):
+            backend.upsert(cursor, 'financial_data', COLUMNS, ('symbol', 'date'),
+                           rows[offset:offset + args.batch_size])
+            conn.commit()
+        insert_time = time.perf_counter() - started_at
+
+        # Random ranges of `range_days` days of random symbols
+        rng = random.Random(args.days)
+        ranges = []
+        for _ in range(args.queries):
+            start = date(2000, 1, 1) + timedelta(
+                days=rng.randint(0, max(0, args.days - args.range_days)))
+            ranges.append((f"BENCH{rng.randrange(args.symbols)}",
+                           start, start + timedelta(days=args.range_days - 1)))
+
+        def measure(query: str) -> list:
+            latencies = []
+            for params in ranges:
+                started_at = time.perf_counter()
+                cursor.execute(query, params)
+                cursor.fetchall()
+                latencies.append(time.perf_counter() - started_at)
+            return latencies
+
+        scans = measure("SELECT * FROM financial_data "
+                        "WHERE symbol = %s AND date >= %s AND date <= %s "
+                        "ORDER BY date")
+        aggregations = measure("SELECT COUNT(*), SUM(open_price), SUM(close_price), "
+                               "SUM(volume) FROM financial_data "
+                               "WHERE symbol = %s AND date >= %s AND date <= %s")
+
+        cursor.execute("DELETE FROM financial_data WHERE symbol LIKE %s", ('BENCH%',))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    return {
+        'backend': backend.name,
+        'rows': len(rows),
+        'insert_rows_per_s': round(len(rows) / insert_time),
+        'scan_rows': args.range_days,
+        'scan_p50_ms': round(percentile(scans, 0.5) * 1000, 3),
+        'scan_p99_ms': round(percentile(scans, 0.99) * 1000, 3),
+        'aggregate_p50_ms': round(percentile(aggregations, 0.5) * 1000, 3),
+        'aggregate_p99_ms': round(percentile(aggregations, 0.99) * 1000, 3),
+    }
+
+
+def main():
+    """
+    Runs the benchmark and prints one JSON result per line.
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--backends', default='mysql,sqlite',
+                        help='comma separated storage backends')
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--days', type=int, default=2500,
+                        help='number of dates per symbol')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--range-days', type=int, default=250,
+                        help='number of dates per queried range')
+    args = parser.parse_args()
+
+    rows = generate_rows(args.symbols, args.days)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.backends.split(','):
+            if name == 'sqlite':
+                backend = SQLiteBackend(os.path.join(directory, 'bench.sqlite3'))
+            else:
+                backend = create_backend(name)
+
+            try:
+                result = run_backend(backend, rows, args)
+            except DatabaseError as error:
+                result = {'backend': name, 'error': str(error)}
+            print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+Runs the benchmark suite of the ingest and API paths on a synthetic dataset.
+
+    python benchmarks/bench_suite.py --symbols 20 --years 10 --concurrency 1,4,16
+
+It runs the selected stages in order, each printing one JSON result per line:
+
+- `generate`: writes the synthetic financial_data of `symbols` x `years`
+  directly with the write path of get_raw_data.py.
+- `ingest`: runs get_raw_data.py against a local fake Alpha Vantage server
+  serving the same dataset, timing the whole ingestion.
+- `api`: starts financial/app.py and loads `api/financial_data` and
+  `api/statistics` at each concurrency level.
+
+The database is the one configured by the DATABASE_* variables (eg:
+DATABASE_BACKEND=sqlite). The rows are written under SYN* symbols, which
+are kept for the next runs. Results of a previous run saved with
+`> baseline.jsonl` can be compared with `--baseline baseline.jsonl`.
+"""
+
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer
+from typing import Optional
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+# fmt: off
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+from bench_server import run_load, spawn_server
+from fake_alphavantage import FakeAlphaVantageHandler, generate_daily_series
+# fmt: on
+
+GET_RAW_DATA_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), os.path.pardir, 'get_raw_data.py'))
+
+# Weekdays per year, as the fake server skips weekends
+TRADING_DAYS_PER_YEAR = 261
+
+
+def synthetic_symbols(count: int) -> list:
+    """
+    Returns the symbols of the synthetic dataset.
+    """
+
+    return [f"SYN{index}" for index in range(count)]
+
+
+def peak_rss_kb(pid: int) -> Optional[int]:
+    """
+    Returns the peak resident set size of a running process, in kB.
+    """
+
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def run_generate(args) -> dict:
+    """
+    Writes the synthetic dataset with the write path of get_raw_data.py:
+    batched upserts, running totals and data versions.
+
+    Returns:
+        A dictionary with the number of rows, duration and throughput.
+    """
+
+    # get_raw_data.py reads its load period when imported
+    os.environ.setdefault('API_GET_RECENT_DATA_IN_DAYS', '14')
+    from financial_data import FinancialData
+    from get_raw_data import _save_items_into_db
+
+    days = args.years * TRADING_DAYS_PER_YEAR
+    rows = 0
+    elapsed = 0.0
+    for symbol in synthetic_symbols(args.symbols):
+        items = [FinancialData(symbol, date.fromisoformat(day),
+                               values['1. open'], values['4. close'],
+                               values['6. volume'])
+                 for (day, values) in generate_daily_series(symbol, days).items()]
+
+        # Keep the progress messages out of the results
+        started_at = time.perf_counter()
+        with redirect_stdout(sys.stderr):
+            _save_items_into_db(items)
+        elapsed += time.perf_counter() - started_at
+        rows += len(items)
+
+    return {
+        'benchmark': 'generate',
+        'symbols': args.symbols,
+        'years': args.years,
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'rows_per_s': round(rows / elapsed) if elapsed else 0,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run_ingest(args) -> dict:
+    """
+    Runs get_raw_data.py against a fake Alpha Vantage server started
+    in this process, serving `years` of daily bars per symbol.
+
+    Returns:
+        A dictionary with the duration, throughput and peak RSS of get_raw_data.py.
+    """
+
+    days = args.years * TRADING_DAYS_PER_YEAR
+    FakeAlphaVantageHandler.delay = args.api_delay
+    FakeAlphaVantageHandler.full_days = days
+    fake_server = ThreadingHTTPServer(('localhost', 0), FakeAlphaVantageHandler)
+    threading.Thread(target=fake_server.serve_forever, daemon=True).start()
+
+    try:
+        started_at = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, GET_RAW_DATA_PATH],
+            env={**os.environ,
+                 'API_URL': (f"http://localhost:{fake_server.server_address[1]}"
+                             "/query?function=TIME_SERIES_DAILY_ADJUSTED&outputsize=full"),
+                 'API_SYMBOLS': ','.join(synthetic_symbols(args.symbols)),
+                 'API_GET_RECENT_DATA_IN_DAYS': str(args.years * 366),
+                 'API_WORKERS': str(args.ingest_workers),
+                 'API_MAX_REQUESTS_PER_MINUTE': '0',
+                 'API_INCREMENTAL': 'false'},
+            stdout=subprocess.DEVNULL)
+
+        # Reap the process ourselves to get its own resource usage
+        (_, status, usage) = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        elapsed = time.perf_counter() - started_at
+    finally:
+        fake_server.shutdown()
+        fake_server.server_close()
+
+    rows = args.symbols * days
+    return {
+        'benchmark': 'ingest',
+        'symbols': args.symbols,
+        'years': args.years,
+        'workers': args.ingest_workers,
+        'exit_code': process.returncode,
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'rows_per_s': round(rows / elapsed) if elapsed else 0,
+        'peak_rss_kb': usage.ru_maxrss,
+    }
+
+
+def run_api(args) -> list:
+    """
+    Starts financial/app.py and loads each API path at each concurrency
+    level. The result cache is disabled unless `--cache` is given, so that
+    the database path is measured.
+
+    Returns:
+        A list of dictionaries with the load results and the peak RSS
+        of the server at the end of each run.
+    """
+
+    end = date.today()
+    start = end - timedelta(days=args.years * 365)
+    paths = args.paths or [
+        f"/api/financial_data?symbol=SYN0&start_date={start}&end_date={end}"
+        f"&limit=100&page=3",
+        f"/api/statistics?symbol=SYN0&start_date={start}&end_date={end}",
+    ]
+
+    env = {
+        'SERVER_MODE': 'threaded',
+        'SERVER_WORKERS': str(args.server_workers),
+        'DATABASE_POOL_SIZE': str(args.server_workers),
+    }
+    if not args.cache:
+        env['CACHE_MAX_ENTRIES'] = '0'
+
+    process = spawn_server(args.port, env)
+    results = []
+    try:
+        for path in paths:
+            for concurrency in args.concurrency:
+                result = run_load('localhost', args.port, path,
+                                  concurrency, args.duration)
+                result['benchmark'] = 'api'
+                result['server_workers'] = args.server_workers
+                result['peak_rss_kb'] = peak_rss_kb(process.pid)
+                results.append(result)
+    finally:
+        process.terminate()
+        process.wait()
+    return results
+
+
+def compare(result: dict, baseline: dict) -> dict:
+    """
+    Adds the ratio of each measure to the same measure of the baseline.
+    """
+
+    for key in ('seconds', 'rows_per_s', 'requests_per_sec',
+                'p50_ms', 'p99_ms', 'peak_rss_kb'):
+        if result.get(key) and baseline.get(key):
+            result[f'{key}_vs_baseline'] = round(result[key] / baseline[key], 3)
+    return result
+
+
+def _result_key(result: dict) -> tuple:
+    """
+    Returns what identifies a result between two runs.
+    """
+
+    return (result.get('benchmark'), result.get('path'), result.get('concurrency'))
+
+
+def main():
+    """
+    Runs the selected stages and prints one JSON result per line.
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--stages', default='generate,ingest,api',
+                        help='comma separated stages to run')
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--ingest-workers', type=int, default=4,
+                        help='API_WORKERS of get_raw_data.py')
+    parser.add_argument('--api-delay', type=float, default=0.0,
+                        help='seconds the fake Alpha Vantage server waits per request')
+    parser.add_argument('--port', type=int, default=5099,
+                        help='port of the benchmarked API server')
+    parser.add_argument('--server-workers', type=int, default=8)
+    parser.add_argument('--concurrency', default='1,4,16',
+                        help='comma separated numbers of concurrent clients')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='seconds of load per path and concurrency')
+    parser.add_argument('--path', dest='paths', action='append',
+                        help='API path to load instead of the default ones (repeatable)')
+    parser.add_argument('--cache', action='store_true',
+                        help='keep the result cache of the API server enabled')
+    parser.add_argument('--baseline', default='',
+                        help='JSON lines of a previous run to compare with')
+    args = parser.parse_args()
+    args.concurrency = [int(value) for value in args.concurrency.split(',')]
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            for line in file:
+                if line.strip():
+                    result = json.loads(line)
+                    baseline[_result_key(result)] = result
+
+    for stage in args.stages.split(','):
+        if stage == 'generate':
+            results = [run_generate(args)]
+        elif stage == 'ingest':
+            results = [run_ingest(args)]
+        elif stage == 'api':
+            results = run_api(args)
+        else:
+            parser.error(f"Unsupported stage: {stage}")
+
+        for result in results:
+            if _result_key(result) in baseline:
+                compare(result, baseline[_result_key(result)])
+            print(json.dumps(result), flush=True)
+
+
+if __name__ == '__main__':
+    main()
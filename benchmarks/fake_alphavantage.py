@@ -0,0 +1,175 @@
+"""
+Local fake of the Alpha Vantage TIME_SERIES_DAILY_ADJUSTED API.
+
+It serves deterministic synthetic daily bars for any requested symbol,
+so that get_raw_data.py can be run and timed without network access:
+
+    python benchmarks/fake_alphavantage.py --port 8080 --delay 0.2
+    API_URL="http://localhost:8080/query?function=TIME_SERIES_DAILY_ADJUSTED" \\
+        API_WORKERS=8 API_MAX_REQUESTS_PER_MINUTE=0 python get_raw_data.py
+"""
+
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+
+# Number of data points returned by the API for outputsize=compact
+COMPACT_SIZE = 100
+
+
+def generate_daily_series(symbol: str, days: int, end: date = None) -> dict:
+    """
+    Generates a deterministic date-descending daily timeseries
+    in the Alpha Vantage payload format.
+
+    Args:
+        symbol (str): The stock symbol, used to seed the generator.
+        days (int): Number of trading days to generate.
+        end (date): Last date of the series (default to today).
+
+    Returns:
+        The "Time Series (Daily)" dictionary keyed by ISO date.
+    """
+
+    rng = random.Random(zlib.crc32(symbol.encode()))
+    current = end or date.today()
+    price = rng.uniform(20, 500)
+
+    series = {}
+    while len(series) < days:
+        # Skip weekends like a real exchange calendar
+        if current.weekday() < 5:
+            open_price = price
+            close_price = max(1.0, open_price * rng.uniform(0.97, 1.03))
+            series[current.isoformat()] = {
+                "1. open": f"{open_price:.4f}",
+                "2. high": f"{max(open_price, close_price) * 1.01:.4f}",
+                "3. low": f"{min(open_price, close_price) * 0.99:.4f}",
+                "4. close": f"{close_price:.4f}",
+                "5. adjusted close": f"{close_price:.4f}",
+                "6. volume": str(rng.randint(100000, 90000000)),
+                "7. dividend amount": "0.0000",
+                "8. split coefficient": "1.0",
+            }
+            # Walk backwards in time
+            price = close_price * rng.uniform(0.98, 1.02)
+        current -= timedelta(days=1)
+
+    return series
+
+
+class FakeAlphaVantageHandler(BaseHTTPRequestHandler):
+    """
+    Request handler emulating the Alpha Vantage query endpoint.
+    """
+
+    # Configured by main()
+    delay = 0.0
+    full_days = 5000
+    rate_limiter = None
+
+    def do_GET(self):
+        """
+        Handle GET requests
+        """
+
+        url_parts = urlparse(self.path)
+        query_params = parse_qs(url_parts.query)
+
+        if url_parts.path != '/query':
+            self.send_error(404, message="Invalid API endpoint")
+            return
+
+        # Simulate network and provider latency
+        if self.delay:
+            time.sleep(self.delay)
+
+        symbol = query_params.get('symbol', [None])[0]
+        if not symbol:
+            payload = {"Error Message": "Invalid API call."}
+        elif self.rate_limiter and not self.rate_limiter():
+            payload = {"Note": "Thank you for using Alpha Vantage! "
+                       "Our standard API call frequency has been exceeded."}
+        else:
+            output_size = query_params.get('outputsize', ['compact'])[0]
+            days = self.full_days if output_size == 'full' else COMPACT_SIZE
+            payload = {
+                "Meta Data": {
+                    "1. Information": "Daily Time Series with Splits and Dividend Events",
+                    "2. Symbol": symbol,
+                    "4. Output Size": output_size.capitalize(),
+                },
+                "Time Series (Daily)": generate_daily_series(symbol, days),
+            }
+
+        body = json.dumps(payload, indent=4).encode()
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """
+        Silences per-request logging.
+        """
+
+
+def _make_rate_limiter(max_calls: int, period: float = 60.0):
+    """
+    Returns a callable answering whether one more call is allowed.
+    """
+
+    calls = []
+    lock = threading.Lock()
+
+    def allow() -> bool:
+        with lock:
+            now = time.monotonic()
+            calls[:] = [call for call in calls if now - call < period]
+            if len(calls) >= max_calls:
+                return False
+            calls.append(now)
+            return True
+
+    return allow
+
+
+def main():
+    """
+    Starts the fake Alpha Vantage server.
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='seconds to sleep before answering a request')
+    parser.add_argument('--full-days', type=int, default=5000,
+                        help='number of days returned for outputsize=full')
+    parser.add_argument('--rate-limit', type=int, default=0,
+                        help='requests per minute before answering with a Note')
+    args = parser.parse_args()
+
+    FakeAlphaVantageHandler.delay = args.delay
+    FakeAlphaVantageHandler.full_days = args.full_days
+    if args.rate_limit > 0:
+        FakeAlphaVantageHandler.rate_limiter = staticmethod(
+            _make_rate_limiter(args.rate_limit))
+
+    httpd = ThreadingHTTPServer(('', args.port), FakeAlphaVantageHandler)
+    print(f'Fake Alpha Vantage server started on port {args.port}...')
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        httpd.server_close()
+        print('Server stopped.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""
+Exports and imports financial data in bulk, as CSV or Parquet files.
+
+The API streams exports from `api/export`. Run this module to import
+such files through the write path of get_raw_data.py, eg: to backfill
+the history of symbols or to copy data between environments:
+
+    python bulk_data.py [--chunk-rows 100000] [--load-data] FILE [FILE ...]
+
+Files have the columns symbol, date, open_price, close_price and volume,
+and their format is given by their extension (`.csv` or `.parquet`).
+Parquet files require the pyarrow package.
+"""
+
+from datetime import date
+from decimal import Decimal
+from typing import Iterator, List
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from db_connection import DatabaseError
+from financial_data import (FINANCIAL_DATA_CSV_HEADER, FinancialData,
+                            FinancialDataBatch, dump_financial_data_csv)
+
+# Supported export formats, and the content type of their files
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Columns of the exported files
+COLUMNS = ('symbol', 'date', 'open_price', 'close_price', 'volume')
+
+# Number of rows of the row groups of exported Parquet files,
+# which readers load one at a time
+PARQUET_ROW_GROUP_ROWS = 64 * 1024
+
+# Ordinal of the first day of the Parquet dates
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _import_pyarrow():
+    """
+    Imports pyarrow, only needed by Parquet files.
+
+    Returns:
+        The pyarrow and pyarrow.parquet modules.
+    """
+
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet files require the pyarrow package") from None
+    return pyarrow, pyarrow.parquet
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Represents a write-only file whose written bytes are taken by chunks.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        """
+        Returns the bytes written since the last call.
+        """
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class CsvStreamWriter:
+    """
+    Represents a CSV file with a header row, written batch by batch.
+    """
+
+    def __init__(self):
+        self._header = FINANCIAL_DATA_CSV_HEADER
+
+    def write(self, batch: FinancialDataBatch) -> bytes:
+        """
+        Adds a batch to the file.
+
+        :param batch: The financial data to write.
+        :return: The bytes of the rows, after the header for the first batch.
+        """
+        (header, self._header) = (self._header, b'')
+        return header + dump_financial_data_csv(batch)
+
+    def close(self) -> bytes:
+        """
+        Completes the file.
+
+        :return: The header row when no batch was written.
+        """
+        (header, self._header) = (self._header, b'')
+        return header
+
+
+class ParquetStreamWriter:
+    """
+    Represents a Parquet file written while its batches are read, whose
+    bytes are returned as soon as a row group is complete.
+    """
+
+    def __init__(self, row_group_rows: int = PARQUET_ROW_GROUP_ROWS):
+        """
+        :param row_group_rows: The number of rows of a row group.
+        :raise ValueError: When pyarrow is not installed.
+        """
+        (self._pa, pq) = _import_pyarrow()
+        self.row_group_rows = row_group_rows
+        self.schema = self._pa.schema([
+            ('symbol', self._pa.string()),
+            ('date', self._pa.date32()),
+            ('open_price', self._pa.decimal128(10, 2)),
+            ('close_price', self._pa.decimal128(10, 2)),
+            ('volume', self._pa.int64()),
+        ])
+        self._sink = _ChunkSink()
+        self._writer = pq.ParquetWriter(self._sink, self.schema)
+        self._pending = FinancialDataBatch()
+
+    def write(self, batch: FinancialDataBatch) -> bytes:
+        """
+        Adds a batch to the file.
+
+        :param batch: The financial data to write.
+        :return: The bytes of the completed row groups, if any.
+        """
+        self._pending.symbols.extend(batch.symbols)
+        self._pending.dates.extend(batch.dates)
+        self._pending.open_prices.extend(batch.open_prices)
+        self._pending.close_prices.extend(batch.close_prices)
+        self._pending.volumes.extend(batch.volumes)
+        if len(self._pending) >= self.row_group_rows:
+            self._write_row_group()
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        """
+        Completes the file.
+
+        :return: The bytes of the last row group and of the file footer.
+        """
+        if len(self._pending):
+            self._write_row_group()
+        self._writer.close()
+        return self._sink.take()
+
+    def _write_row_group(self):
+        """
+        Writes the pending rows as a row group.
+        """
+        pa = self._pa
+        batch = self._pending
+        self._pending = FinancialDataBatch()
+
+        # Prices are stored in cents, which are the unscaled decimals
+        prices = pa.decimal128(10, 2)
+        table = pa.Table.from_arrays([
+            pa.array(batch.symbols, pa.string()),
+            pa.array([day - _EPOCH_ORDINAL for day in batch.dates],
+                     pa.int32()).cast(pa.date32()),
+            pa.array([Decimal(cents).scaleb(-2) for cents in batch.open_prices], prices),
+            pa.array([Decimal(cents).scaleb(-2) for cents in batch.close_prices], prices),
+            pa.array(batch.volumes, pa.int64()),
+        ], schema=self.schema)
+        self._writer.write_table(table, row_group_size=len(batch))
+
+
+def create_export_writer(file_format: str):
+    """
+    Creates the writer of an exported file.
+
+    Args:
+        file_format (str): One of EXPORT_FORMATS.
+
+    Returns:
+        A CsvStreamWriter or ParquetStreamWriter.
+    """
+
+    if file_format == 'csv':
+        return CsvStreamWriter()
+    if file_format == 'parquet':
+        return ParquetStreamWriter()
+    raise ValueError(f"Unsupported format: {file_format}")
+
+
+def read_file(path: str, chunk_rows: int) -> Iterator[List[FinancialData]]:
+    """
+    Reads the financial data of a CSV or Parquet file.
+
+    Args:
+        path (str): The path of the file, whose extension gives its format.
+        chunk_rows (int): The maximum number of rows per chunk.
+
+    Returns:
+        An iterator of lists of financial data.
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return _read_csv_file(path, chunk_rows)
+    if extension == '.parquet':
+        return _read_parquet_file(path, chunk_rows)
+    raise ValueError(f"Unsupported file extension: {path}")
+
+
+def _read_csv_file(path: str, chunk_rows: int) -> Iterator[List[FinancialData]]:
+    """
+    Reads the financial data of a CSV file with a header row.
+    """
+
+    with open(path, newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None or tuple(header) != COLUMNS:
+            raise ValueError(f"{path}: the header must be {','.join(COLUMNS)}")
+
+        chunk = []
+        for (symbol, day, open_price, close_price, volume) in reader:
+            chunk.append(FinancialData(symbol, date.fromisoformat(day),
+                                       Decimal(open_price), Decimal(close_price),
+                                       int(volume)))
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _read_parquet_file(path: str, chunk_rows: int) -> Iterator[List[FinancialData]]:
+    """
+    Reads the financial data of a Parquet file, row group by row group.
+    """
+
+    (_, pq) = _import_pyarrow()
+    file = pq.ParquetFile(path)
+    missing = [column for column in COLUMNS if column not in file.schema_arrow.names]
+    if missing:
+        raise ValueError(f"{path}: missing columns {','.join(missing)}")
+
+    for batch in file.iter_batches(batch_size=chunk_rows, columns=list(COLUMNS)):
+        columns = [batch.column(name).to_pylist() for name in COLUMNS]
+        yield [FinancialData(symbol, day, Decimal(open_price), Decimal(close_price),
+                             int(volume))
+               for (symbol, day, open_price, close_price, volume) in zip(*columns)]
+
+
+def main():
+    """
+    Imports CSV or Parquet files of financial data.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Import CSV or Parquet files of financial_data.")
+    parser.add_argument('files', nargs='+', metavar='FILE',
+                        help='.csv or .parquet file, as written by api/export')
+    parser.add_argument('--chunk-rows', type=int, default=100000,
+                        help='rows read and saved at once')
+    parser.add_argument('--load-data', action='store_true',
+                        help='write each chunk with LOAD DATA LOCAL INFILE (MySQL only)')
+    args = parser.parse_args()
+
+    # get_raw_data.py reads its load period when imported,
+    # which does not matter here
+    os.environ.setdefault('API_GET_RECENT_DATA_IN_DAYS', '14')
+    from get_raw_data import _save_items_into_db
+
+    started_at = time.perf_counter()
+    rows = 0
+    try:
+        for path in args.files:
+            for chunk in read_file(path, max(1, args.chunk_rows)):
+                # Saved with the batched upserts (or LOAD DATA) of get_raw_data.py,
+                # which also updates the running totals and data versions
+                _save_items_into_db(chunk, load_data_min_rows=1 if args.load_data else None)
+                rows += len(chunk)
+
+    except DatabaseError as error:
+        # Handle db exceptions that might occur
+        print("Failed to import files: {}".format(error))
+        sys.exit(1)
+    except (OSError, ValueError) as error:
+        print("Failed to import files: {}".format(error))
+        sys.exit(1)
+
+    elapsed = time.perf_counter() - started_at
+    print(f"Imported {rows} rows in {elapsed:.3f}s "
+          f"({rows / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+"""
+Stores the financial data of each symbol in a local binary file with
+one column per field, so that the API can serve range queries and
+statistics from memory-mapped files instead of the database.
+
+get_raw_data.py rewrites the file of each symbol it ingests. Run this
+module to write the files of symbols already stored in financial_data:
+
+    python column_store.py [--dir DIRECTORY] [--symbols IBM,AAPL]
+
+A file holds a header followed by the columns of the rows ordered by
+date: dates as int32 ordinals, then open prices, close prices (integer
+cents) and volumes as int64, in the native byte order as the files are
+a local cache of the database.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from db_connection import DatabaseError, DbConnection
+from financial_data import FinancialDataBatch
+
+# Bytes of the symbol in the header, enough for the 255 characters of the
+# column encoded in UTF-8, and keeping the header a multiple of 8 bytes
+_SYMBOL_SIZE = 1022
+
+# Magic number, number of rows and symbol of a file
+_HEADER = struct.Struct(f'=8sQH{_SYMBOL_SIZE}s')
+_MAGIC = b'FDCOL\x00\x00\x02'
+
+# File name extension of the column files
+FILE_EXTENSION = '.col'
+
+# Maximum length of the file names derived from symbols, below the
+# 255 bytes allowed by file systems once the extension is added
+_MAX_NAME_LENGTH = 200
+
+
+def column_file_path(directory: str, symbol: str) -> str:
+    """
+    Returns the path of the column file of a symbol. Symbols are matched
+    case-insensitively, as by the database. The files of the symbols whose
+    quoted name would be too long are named after their digest.
+
+    Args:
+        directory (str): The directory of the column files.
+        symbol (str): The stock symbol.
+
+    Returns:
+        str: The path of the file.
+    """
+
+    name = quote(symbol.upper(), safe='')
+    if len(name) > _MAX_NAME_LENGTH:
+        name = hashlib.sha256(symbol.upper().encode()).hexdigest()
+    return os.path.join(directory, name + FILE_EXTENSION)
+
+
+def write_column_file(directory: str, symbol: str, data: FinancialDataBatch):
+    """
+    Writes the column file of a symbol. The file is replaced atomically,
+    readers which mapped the previous file keep reading it.
+
+    Args:
+        directory (str): The directory of the column files.
+        symbol (str): The stock symbol.
+        data (FinancialDataBatch): All the records of the symbol, ordered by date.
+
+    Returns:
+        None.
+
+    Raises:
+        ValueError: When the encoded symbol does not fit in the header.
+    """
+
+    # The symbol would be truncated in the header
+    encoded_symbol = symbol.encode()
+    if len(encoded_symbol) > _SYMBOL_SIZE:
+        raise ValueError(f"Symbol too long for a column file: {symbol}")
+
+    os.makedirs(directory, exist_ok=True)
+
+    # Pad the dates so that the 64 bits columns are aligned
+    dates = array('i', data.dates)
+    if len(dates) % 2:
+        dates.append(0)
+
+    (fd, temp_path) = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(_HEADER.pack(_MAGIC, len(data), len(encoded_symbol),
+                                    encoded_symbol))
+            for column in (dates, data.open_prices, data.close_prices, data.volumes):
+                column.tofile(file)
+        os.replace(temp_path, column_file_path(directory, symbol))
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def export_column_files(db: DbConnection, directory: str, symbols: List[str]):
+    """
+    Writes the column files of the given symbols from financial_data.
+    The file of a symbol without records is removed.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor.
+        directory (str): The directory of the column files.
+        symbols (List[str]): The symbols to write.
+
+    Returns:
+        None.
+    """
+
+    for symbol in symbols:
+        db.cursor.execute(
+            "SELECT symbol, date, open_price, close_price, volume "
+            "FROM financial_data WHERE symbol = %s ORDER BY date",
+            (symbol,))
+        data = FinancialDataBatch.from_rows(db.cursor.fetchall())
+
+        if data:
+            write_column_file(directory, data.symbols[0], data)
+        elif os.path.exists(column_file_path(directory, symbol)):
+            os.unlink(column_file_path(directory, symbol))
+
+
+class ColumnFile:
+    """
+    Represents the memory-mapped column file of a symbol.
+    """
+
+    def __init__(self, path: str):
+        """
+        Maps a column file into memory.
+
+        :param path: The path of the file.
+        """
+
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, count, symbol_length, symbol) = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC:
+            raise ValueError(f"Invalid column file: {path}")
+
+        # Identity of the mapped file, to detect when it is replaced
+        self.file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self.symbol = symbol[:symbol_length].decode()
+
+        # Views of the columns, without copying them
+        view = memoryview(self._mmap)
+        offset = _HEADER.size
+        self.dates = view[offset:offset + 4 * count].cast('i')
+        offset += 4 * (count + count % 2)
+        self.open_prices = view[offset:offset + 8 * count].cast('q')
+        offset += 8 * count
+        self.close_prices = view[offset:offset + 8 * count].cast('q')
+        offset += 8 * count
+        self.volumes = view[offset:offset + 8 * count].cast('q')
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def find(self, start_date: Optional[date], end_date: Optional[date]) -> Tuple[int, int]:
+        """
+        Finds the rows of a date range by binary search.
+
+        :param start_date: Start date of the range, None for no lower bound.
+        :param end_date: End date of the range, None for no upper bound.
+        :return: The index of the first row and the index after the last row.
+        """
+        start = 0
+        end = len(self.dates)
+        if start_date is not None:
+            start = bisect_left(self.dates, start_date.toordinal())
+        if end_date is not None:
+            end = bisect_right(self.dates, end_date.toordinal())
+        return start, max(start, end)
+
+    def slice(self, start: int, end: int) -> FinancialDataBatch:
+        """
+        Copies rows of the file into a batch.
+
+        :param start: The index of the first row.
+        :param end: The index after the last row.
+        :return: The FinancialDataBatch of the rows.
+        """
+        batch = FinancialDataBatch()
+        batch.symbols = [self.symbol] * (end - start)
+        batch.dates.frombytes(self.dates[start:end].cast('B'))
+        batch.open_prices.frombytes(self.open_prices[start:end].cast('B'))
+        batch.close_prices.frombytes(self.close_prices[start:end].cast('B'))
+        batch.volumes.frombytes(self.volumes[start:end].cast('B'))
+        return batch
+
+    def totals(self, start: int, end: int) -> Tuple[int, Decimal, Decimal, int]:
+        """
+        Sums the columns of rows of the file.
+
+        :param start: The index of the first row.
+        :param end: The index after the last row.
+        :return: A tuple with the number of rows and the sums of
+            open prices, close prices and volumes.
+        """
+        if start >= end:
+            return 0, Decimal(0.00), Decimal(0.00), 0
+        return (end - start,
+                Decimal(sum(self.open_prices[start:end])).scaleb(-2),
+                Decimal(sum(self.close_prices[start:end])).scaleb(-2),
+                sum(self.volumes[start:end]))
+
+
+class ColumnStore:
+    """
+    Represents a thread-safe read-through access to the column files
+    of a directory. A file is mapped on first use and mapped again
+    when it has been replaced.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialize a ColumnStore instance.
+
+        :param directory: The directory of the column files.
+        """
+
+        self.directory = directory
+
+        # Mapped files by path
+        self._files = {}
+        self._lock = threading.Lock()
+
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'loads': 0,
+        }
+
+    def get(self, symbol: str) -> Optional[ColumnFile]:
+        """
+        Returns the mapped column file of a symbol.
+
+        :param symbol: The stock symbol.
+        :return: The ColumnFile, or None when the symbol has no file.
+        """
+
+        path = column_file_path(self.directory, symbol)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._files.pop(path, None)
+                self._stats['misses'] += 1
+            return None
+
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            column_file = self._files.get(path)
+            if column_file is not None and column_file.file_id == file_id:
+                self._stats['hits'] += 1
+                return column_file
+
+        # Map the new file outside of the lock, the previous mapping
+        # is released once the requests reading it are completed
+        try:
+            column_file = ColumnFile(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+
+        with self._lock:
+            self._files[path] = column_file
+            self._stats['loads'] += 1
+            self._stats['hits'] += 1
+        return column_file
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the usage counters of the store.
+
+        :return: The counters, and the number of mapped files.
+        """
+        with self._lock:
+            return dict(self._stats, files=len(self._files))
+
+
+def main():
+    """
+    Writes the column files of symbols stored in financial_data.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Write the column files of financial_data symbols.")
+    parser.add_argument('--dir', default=os.getenv('COLUMN_STORE_DIR', ''),
+                        help='directory of the column files (default to COLUMN_STORE_DIR)')
+    parser.add_argument('--symbols', default='',
+                        help='comma separated symbols (default to all)')
+    args = parser.parse_args()
+    symbols = [symbol for symbol in args.symbols.split(',') if symbol]
+
+    if not args.dir:
+        print("No directory given and COLUMN_STORE_DIR is not set.")
+        sys.exit(1)
+
+    db = DbConnection()
+    try:
+        db.connect()
+        db.open_cursor()
+
+        if not symbols:
+            db.cursor.execute("SELECT DISTINCT symbol FROM financial_data")
+            symbols = [symbol for (symbol,) in db.cursor.fetchall()]
+
+        export_column_files(db, args.dir, symbols)
+        print("Wrote column files of", len(symbols), "symbols.")
+
+    except DatabaseError as error:
+        # Handle db exceptions that might occur
+        print("Failed to write column files: {}".format(error))
+        sys.exit(1)
+    finally:
+        db.disconnect()
+
+
+if __name__ == '__main__':
+    main()
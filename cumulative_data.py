@@ -0,0 +1,244 @@
+"""
+Maintains the `financial_data_cumulative` table, which stores for each
+symbol and date the running totals of financial_data up to that date.
+The totals of any date range are then the difference of two rows.
+
+Run this module to check the table against financial_data,
+and to rebuild it when needed:
+
+    python cumulative_data.py [--rebuild] [--symbols IBM,AAPL]
+"""
+
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional, Tuple
+import argparse
+import sys
+from db_connection import DatabaseError, DbConnection
+
+# Number of cumulative rows written per INSERT statement
+INSERT_BATCH_SIZE = 1000
+
+
+def fetch_cumulative_totals(
+        db: DbConnection,
+        symbol: str,
+        start_date: date,
+        end_date: date) -> Tuple[int, Decimal, Decimal, int]:
+    """
+    Computes the totals of a symbol for a date range from
+    the running totals at both ends of the range.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor.
+        symbol (str): The stock symbol.
+        start_date (date): Start date of the range.
+        end_date (date): End date of the range.
+
+    Returns:
+        A tuple with the number of records and the sums of
+        open price, close price and volume in the range.
+    """
+
+    query = ("SELECT row_count, total_open_price, total_close_price, total_volume "
+             "FROM financial_data_cumulative "
+             "WHERE symbol = %s AND date {} %s "
+             "ORDER BY date DESC LIMIT 1")
+
+    # Running totals up to the end of the range
+    db.cursor.execute(query.format('<='), (symbol, end_date))
+    last = db.cursor.fetchone()
+
+    # Running totals before the start of the range
+    db.cursor.execute(query.format('<'), (symbol, start_date))
+    before = db.cursor.fetchone()
+
+    if last is None:
+        return 0, Decimal(0.00), Decimal(0.00), 0
+    if before is None:
+        before = (0, Decimal(0.00), Decimal(0.00), 0)
+
+    count = last[0] - before[0]
+    if count <= 0:
+        return 0, Decimal(0.00), Decimal(0.00), 0
+
+    return (count,
+            last[1] - before[1],
+            last[2] - before[2],
+            int(last[3] - before[3]))
+
+
+def update_cumulative_data(db: DbConnection, symbol: str, since: date):
+    """
+    Recomputes the running totals of a symbol from a given date,
+    continuing from the running totals of the previous date.
+    The caller commits the transaction.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor.
+        symbol (str): The stock symbol whose financial data changed.
+        since (date): The earliest date whose financial data changed.
+
+    Returns:
+        None.
+    """
+
+    # Running totals just before the changed dates
+    db.cursor.execute(
+        "SELECT row_count, total_open_price, total_close_price, total_volume "
+        "FROM financial_data_cumulative "
+        "WHERE symbol = %s AND date < %s "
+        "ORDER BY date DESC LIMIT 1",
+        (symbol, since))
+    previous = db.cursor.fetchone()
+    (count, total_open_price, total_close_price, total_volume) = (
+        previous if previous is not None else (0, Decimal(0.00), Decimal(0.00), 0))
+    total_volume = int(total_volume)
+
+    db.cursor.execute(
+        "SELECT date, open_price, close_price, volume FROM financial_data "
+        "WHERE symbol = %s AND date >= %s ORDER BY date",
+        (symbol, since))
+
+    rows = []
+    for (day, open_price, close_price, volume) in db.cursor.fetchall():
+        count += 1
+        total_open_price += open_price
+        total_close_price += close_price
+        total_volume += int(volume)
+        rows.append((symbol, day, count, total_open_price,
+                     total_close_price, total_volume))
+
+    db.cursor.execute(
+        "DELETE FROM financial_data_cumulative WHERE symbol = %s AND date >= %s",
+        (symbol, since))
+
+    for offset in range(0, len(rows), INSERT_BATCH_SIZE):
+        batch = rows[offset:offset + INSERT_BATCH_SIZE]
+        query = ("INSERT INTO financial_data_cumulative (symbol, date, row_count, "
+                 "total_open_price, total_close_price, total_volume) VALUES "
+                 + ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(batch)))
+        db.cursor.execute(query, [value for row in batch for value in row])
+
+
+def check_cumulative_data(
+        db: DbConnection,
+        symbols: Optional[List[str]] = None) -> List[str]:
+    """
+    Compares the running totals stored in financial_data_cumulative
+    with the ones computed from financial_data.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor.
+        symbols (List[str]): The symbols to check (default to all).
+
+    Returns:
+        List[str]: The symbols whose running totals are inconsistent.
+    """
+
+    # Restrict the checked symbols if requested
+    condition = "1 = 1"
+    params = []
+    if symbols:
+        condition = "{}.symbol IN (" + ", ".join(["%s"] * len(symbols)) + ")"
+        params = list(symbols)
+
+    db.cursor.execute(
+        "SELECT f.symbol, f.open_price, f.close_price, f.volume, c.row_count, "
+        "c.total_open_price, c.total_close_price, c.total_volume "
+        "FROM financial_data f LEFT JOIN financial_data_cumulative c "
+        "ON c.symbol = f.symbol AND c.date = f.date "
+        "WHERE " + condition.format('f') + " ORDER BY f.symbol, f.date",
+        params)
+
+    inconsistent = []
+    current = None
+    for row in db.cursor:
+        (symbol, open_price, close_price, volume) = row[:4]
+        if symbol != current:
+            current = symbol
+            totals = (0, Decimal(0.00), Decimal(0.00), 0)
+        totals = (totals[0] + 1,
+                  totals[1] + open_price,
+                  totals[2] + close_price,
+                  totals[3] + int(volume))
+
+        stored = row[4:]
+        if stored[0] is None or (stored[0], stored[1], stored[2], int(stored[3])) != totals:
+            if not inconsistent or inconsistent[-1] != symbol:
+                inconsistent.append(symbol)
+
+    # Running totals left for dates which are not in financial_data
+    db.cursor.execute(
+        "SELECT DISTINCT c.symbol FROM financial_data_cumulative c "
+        "LEFT JOIN financial_data f ON f.symbol = c.symbol AND f.date = c.date "
+        "WHERE f.symbol IS NULL AND " + condition.format('c'),
+        params)
+    for (symbol,) in db.cursor.fetchall():
+        if symbol not in inconsistent:
+            inconsistent.append(symbol)
+
+    return inconsistent
+
+
+def rebuild_cumulative_data(db: DbConnection, symbols: List[str]):
+    """
+    Rebuilds the running totals of the given symbols
+    from financial_data, committing symbol by symbol.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor.
+        symbols (List[str]): The symbols to rebuild.
+
+    Returns:
+        None.
+    """
+
+    for symbol in symbols:
+        db.cursor.execute(
+            "DELETE FROM financial_data_cumulative WHERE symbol = %s", (symbol,))
+        update_cumulative_data(db, symbol, date.min)
+        db.conn.commit()
+
+
+def main():
+    """
+    Checks the running totals table and optionally rebuilds it.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Check and rebuild the financial_data_cumulative table.")
+    parser.add_argument('--rebuild', action='store_true',
+                        help='rebuild the inconsistent symbols')
+    parser.add_argument('--symbols', default='',
+                        help='comma separated symbols (default to all)')
+    args = parser.parse_args()
+    symbols = [symbol for symbol in args.symbols.split(',') if symbol]
+
+    db = DbConnection()
+    try:
+        db.connect()
+        db.open_cursor()
+
+        inconsistent = check_cumulative_data(db, symbols)
+        if not inconsistent:
+            print("Running totals are consistent.")
+            return
+
+        print("Inconsistent running totals:", ", ".join(inconsistent))
+        if not args.rebuild:
+            sys.exit(1)
+
+        rebuild_cumulative_data(db, inconsistent)
+        print("Rebuilt running totals of", len(inconsistent), "symbols.")
+
+    except DatabaseError as error:
+        # Handle db exceptions that might occur
+        print("Failed to check running totals: {}".format(error))
+        sys.exit(1)
+    finally:
+        db.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,14 @@
-import mysql.connector
+from mysql.connector.errors import Error, PoolError
+from collections import OrderedDict
 from dotenv import load_dotenv
+from typing import Sequence
 import os
+import queue
+import sqlite3
+import threading
+import time
+from metrics import SlowQueryLog, span
+from storage_backends import MySQLBackend, SQLiteBackend
 
 # Load environment variables from .env file
 load_dotenv()
@@ -12,46 +20,451 @@ database_user = os.getenv('DATABASE_USER')
 database_password = os.getenv('DATABASE_PASSWORD')
 database_dbname = os.getenv('DATABASE_DBNAME')
 
+# read DATABASE backend configurations
+database_backend = os.getenv('DATABASE_BACKEND', 'mysql')
+database_sqlite_path = os.getenv('DATABASE_SQLITE_PATH', 'timeseriesdb.sqlite3')
+
+# read DATABASE pool configurations
+database_pool_size = int(os.getenv('DATABASE_POOL_SIZE', '5'))
+database_pool_timeout = float(os.getenv('DATABASE_POOL_TIMEOUT', '10'))
+database_pool_health_check_interval = float(
+    os.getenv('DATABASE_POOL_HEALTH_CHECK_INTERVAL', '30'))
+database_statement_cache_size = int(
+    os.getenv('DATABASE_STATEMENT_CACHE_SIZE', '32'))
+
+# read METRICS configurations
+metrics_slow_query_threshold = float(
+    os.getenv('METRICS_SLOW_QUERY_THRESHOLD', '0.5'))
+metrics_slow_query_log = os.getenv('METRICS_SLOW_QUERY_LOG', '')
+
+
+# Errors raised by the connections of any backend
+DatabaseError = (Error, sqlite3.Error)
+
+
+def create_backend(name: str):
+    """
+    Creates the storage backend selected by DATABASE_BACKEND.
+
+    :param name: `mysql` or `sqlite`.
+    :return: The MySQLBackend or SQLiteBackend instance.
+    """
+    if name == 'mysql':
+        return MySQLBackend(
+            host=database_host,
+            user=database_user,
+            password=database_password,
+            database=database_dbname)
+    if name == 'sqlite':
+        return SQLiteBackend(database_sqlite_path)
+    raise ValueError(f"Unsupported DATABASE_BACKEND: {name}")
+
+
+# Storage backend of all connections
+storage_backend = create_backend(database_backend)
+
+# Log of the queries slower than METRICS_SLOW_QUERY_THRESHOLD
+slow_query_log = SlowQueryLog(metrics_slow_query_threshold, metrics_slow_query_log)
+
+
+def _create_connection(allow_local_infile: bool = False):
+    """
+    Creates a new connection to the database of the storage backend.
+
+    :param allow_local_infile: Whether `LOAD DATA LOCAL INFILE`
+        statements are allowed on this connection.
+    :return: The database connection.
+    """
+    return storage_backend.connect(allow_local_infile)
+
+
+class DbConnectionPool:
+    """
+    Represents a thread-safe pool of reusable database connections.
+    """
+
+    def __init__(
+            self,
+            size: int = database_pool_size,
+            timeout: float = database_pool_timeout,
+            health_check_interval: float = database_pool_health_check_interval):
+        """
+        Initialize a DbConnectionPool instance.
+
+        :param size: Maximum number of connections opened by the pool.
+        :param timeout: Seconds to wait for a free connection
+            before raising a PoolError.
+        :param health_check_interval: Idle seconds after which a connection
+            is pinged before being handed out again.
+        """
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        # Idle connections with the time they were returned to the pool
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+        self._stats = {
+            'checkouts': 0,
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'stale': 0,
+        }
+
+    def get_connection(self):
+        """
+        Checks out a connection from the pool, opening a new one while
+        the pool is not full, otherwise waiting for a connection to be
+        released.
+
+        :return: The database connection.
+        """
+        waited = False
+        while True:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open_connection_if_allowed()
+                if conn is not None:
+                    self._increment('checkouts', 'misses')
+                    return conn
+
+                # The pool is full, wait for a connection to be released
+                if not waited:
+                    waited = True
+                    self._increment('waits')
+                try:
+                    conn, released_at = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    self._increment('timeouts')
+                    raise PoolError(
+                        f"Timed out after {self.timeout}s waiting "
+                        "for a database connection")
+
+            if self._is_healthy(conn, released_at):
+                self._increment('checkouts', 'hits')
+                return conn
+
+            # Drop the stale connection and try again
+            self._increment('stale')
+            self._discard(conn)
+
+    def release(self, conn):
+        """
+        Returns a connection to the pool. Any pending transaction
+        is rolled back, so that the next user starts from a clean state.
+
+        :param conn: The database connection checked out from this pool.
+        """
+        try:
+            conn.rollback()
+        except DatabaseError:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    def stats(self) -> dict:
+        """
+        Returns the usage counters of the pool.
+
+        :return: A dictionary with pool size, opened and idle connections,
+            and the checkouts, hits, misses, waits, timeouts and stale counters.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['opened'] = self._opened
+        stats['idle'] = self._idle.qsize()
+        return stats
+
+    def _open_connection_if_allowed(self):
+        """
+        Opens a new connection unless the pool is already full.
+
+        :return: The new database connection, or None when the pool is full.
+        """
+        with self._lock:
+            if self._opened >= self.size:
+                return None
+            self._opened += 1
+        try:
+            return _create_connection()
+        except BaseException:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def _is_healthy(self, conn, released_at: float) -> bool:
+        """
+        Checks whether an idle connection can be reused. Connections idle
+        for longer than the health check interval are pinged.
+        """
+        if time.monotonic() - released_at < self.health_check_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except DatabaseError:
+            return False
+
+    def _discard(self, conn):
+        """
+        Closes a connection and frees its slot in the pool.
+        """
+        with self._lock:
+            self._opened -= 1
+        try:
+            conn.close()
+        except DatabaseError:
+            pass
+
+    def _increment(self, *counters: str):
+        """
+        Increments the given usage counters.
+        """
+        with self._lock:
+            for counter in counters:
+                self._stats[counter] += 1
+
+
+class StatementCache:
+    """
+    Represents the prepared statements of a connection, by query text.
+    The least recently used statements are closed beyond the cache size.
+    """
+
+    # Usage counters of the caches of all connections
+    _stats = {
+        'hits': 0,
+        'misses': 0,
+        'evictions': 0,
+    }
+    _stats_lock = threading.Lock()
+
+    def __init__(self, conn, size: int = database_statement_cache_size):
+        """
+        Initialize a StatementCache instance.
+
+        :param conn: The database connection of the statements.
+        :param size: Maximum number of prepared statements kept open.
+        """
+        self.conn = conn
+        self.size = size
+
+        # Query text and prepared cursor by query text
+        self._statements = OrderedDict()
+
+    def execute(self, query: str, params: Sequence = ()) -> list:
+        """
+        Executes a query with its prepared statement,
+        preparing it on first use, and fetches all the rows.
+
+        :param query: The query, with `%s` placeholders.
+        :param params: The parameters of the query.
+        :return: The rows of the result.
+        """
+        entry = self._statements.get(query)
+        if entry is not None:
+            self._statements.move_to_end(query)
+            self._increment('hits')
+        else:
+            # The prepared cursor compares the query text by identity,
+            # so the cached text is passed on each execution
+            entry = (query, storage_backend.prepared_cursor(self.conn))
+            self._statements[query] = entry
+            self._increment('misses')
+            if len(self._statements) > self.size:
+                (_, (_, evicted)) = self._statements.popitem(last=False)
+                self._close(evicted)
+                self._increment('evictions')
+
+        (prepared_query, cursor) = entry
+        try:
+            with slow_query_log.timed(query, params):
+                cursor.execute(prepared_query, params)
+                return cursor.fetchall()
+        except DatabaseError:
+            # The statement is prepared again on next use
+            self._statements.pop(query, None)
+            self._close(cursor)
+            raise
+
+    @staticmethod
+    def _close(cursor):
+        """
+        Closes a prepared cursor, deallocating its statement.
+        """
+        try:
+            cursor.close()
+        except DatabaseError:
+            pass
+
+    @classmethod
+    def _increment(cls, counter: str):
+        """
+        Increments a usage counter.
+        """
+        with cls._stats_lock:
+            cls._stats[counter] += 1
+
+    @classmethod
+    def stats(cls) -> dict:
+        """
+        Returns the usage counters of the caches of all connections.
+
+        :return: A dictionary with the hits, misses and evictions counters,
+            and the hit rate.
+        """
+        with cls._stats_lock:
+            stats = dict(cls._stats)
+        executions = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / executions, 4) if executions else 0.0
+        return stats
+
+
+class TimedCursor:
+    """
+    Represents a cursor whose slow queries are written to the slow query log.
+    """
+
+    def __init__(self, cursor):
+        """
+        :param cursor: The wrapped cursor.
+        """
+        self._cursor = cursor
+
+    def execute(self, query: str, params: Sequence = ()):
+        with slow_query_log.timed(query, params):
+            return self._cursor.execute(query, params)
+
+    def executemany(self, query: str, rows: Sequence[Sequence]):
+        with slow_query_log.timed(query):
+            return self._cursor.executemany(query, rows)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _reset_pool_after_fork():
+    """
+    Drops the pool inherited by a forked child process, whose connections
+    belong to the parent: the child opens its own ones on first use.
+    """
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+def get_pool() -> DbConnectionPool:
+    """
+    Returns the process-wide connection pool, creating it on first use.
+
+    :return: The DbConnectionPool instance.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DbConnectionPool()
+        return _pool
+
 
 class DbConnection:
     """
     Represents a database connection instance.
     """
 
-    def __init__(self):
+    def __init__(self, pooled: bool = False):
+        """
+        :param pooled: Whether the connection is checked out from
+            the process-wide pool instead of being opened and closed.
+        """
+        self.pooled = pooled
         self.conn = None
         self.cursor = None
+        self._from_pool = False
 
-    def connect(self):
+    def connect(self, allow_local_infile: bool = False):
         """
-        Establishes a connection to the MySQL database.
+        Establishes a connection to the database.
+
+        :param allow_local_infile: Whether `LOAD DATA LOCAL INFILE`
+            statements are allowed on this connection.
+            Such connections are never taken from the pool.
         """
-        self.conn = mysql.connector.connect(
-            host=database_host,
-            user=database_user,
-            password=database_password,
-            database=database_dbname
-        )
+        with span('connect'):
+            if self.pooled and not allow_local_infile:
+                self.conn = get_pool().get_connection()
+                self._from_pool = True
+            else:
+                self.conn = _create_connection(allow_local_infile)
+                self._from_pool = False
 
     def disconnect(self):
         """
-        Closes the database cursor and connection.
+        Closes the database cursor and connection,
+        or returns the connection to the pool.
         """
-        self.close_cursor()
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        try:
+            self.close_cursor()
+        finally:
+            if self.conn:
+                if self._from_pool:
+                    get_pool().release(self.conn)
+                else:
+                    self.conn.close()
+                self.conn = None
 
     def open_cursor(self):
         """
-        Opens a cursor object to execute queries.
+        Opens a cursor object to execute queries. Its queries are timed
+        when the slow query log is enabled.
         """
         self.cursor = self.conn.cursor()
+        if slow_query_log.threshold > 0:
+            self.cursor = TimedCursor(self.cursor)
+
+    def execute_prepared(self, query: str, params: Sequence = ()) -> list:
+        """
+        Executes a query with a prepared statement of the connection,
+        which is reused by the next executions of the same query text
+        on this connection, also after it went back to the pool.
+
+        :param query: The query, with `%s` placeholders.
+        :param params: The parameters of the query.
+        :return: All the rows of the result.
+        """
+        if database_statement_cache_size <= 0:
+            cursor = self.conn.cursor()
+            try:
+                with slow_query_log.timed(query, params):
+                    cursor.execute(query, params)
+                    return cursor.fetchall()
+            finally:
+                cursor.close()
+
+        cache = getattr(self.conn, 'statement_cache', None)
+        if cache is None:
+            cache = self.conn.statement_cache = StatementCache(self.conn)
+        return cache.execute(query, params)
 
     def close_cursor(self):
         """
         Closes the cursor object.
         """
         if self.cursor:
-            self.cursor.close()
-            self.cursor = None
+            cursor, self.cursor = self.cursor, None
+            cursor.close()
@@ -1,43 +1,615 @@
-from datetime import datetime, date
+from bisect import bisect_right
+from datetime import datetime, date, timedelta
 from decimal import Decimal
-from typing import List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import base64
+import functools
+import gzip
+import hashlib
 import json
+import os
+import selectors
+import signal
+import socket
+import threading
+import time
+import zlib
 from urllib.parse import parse_qs, urlparse
-from mysql.connector.errors import Error
 
 # fmt: off
 import sys
 import os.path
 sys.path.append(
     os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
-from db_connection import DbConnection
-from financial_data import FinancialData, FinancialDataEncoder
+from db_connection import (DatabaseError, DbConnection, StatementCache, get_pool,
+                           storage_backend)
+from storage_backends import to_decimal
+from result_cache import ResultCache
+from column_store import ColumnFile, ColumnStore
+from cumulative_data import fetch_cumulative_totals
+from financial_metrics import compute_metrics, parse_metrics
+from financial_data import (FinancialDataBatch, dump_financial_data,
+                            dump_financial_data_lines)
 from avg_financial_data import AverageFinancialData, AverageFinancialDataEncoder
+from resampled_financial_data import (ResampledFinancialData,
+                                      ResampledFinancialDataEncoder)
+from metrics import RequestTimer, registry as metrics_registry, span
+from bulk_data import EXPORT_FORMATS, create_export_writer
+from prefork import PreforkSupervisor, create_listening_socket
+from migrations import DATE_COVERING_INDEX, DATE_INDEX, load_indexes
 # fmt: on
 
+# Load environment variables from .env file
+load_dotenv()
+
+# Access environment variables
+# read SERVER configurations
+server_port = int(os.getenv('SERVER_PORT', '5000'))
+server_mode = os.getenv('SERVER_MODE', 'threaded')
+server_workers = int(os.getenv('SERVER_WORKERS', '5'))
+server_processes = int(os.getenv('SERVER_PROCESSES', '0'))
+server_keepalive_timeout = float(os.getenv('SERVER_KEEPALIVE_TIMEOUT', '5'))
+server_stream_chunk_rows = int(os.getenv('SERVER_STREAM_CHUNK_ROWS', '500'))
+server_compression_min_size = int(os.getenv('SERVER_COMPRESSION_MIN_SIZE', '1024'))
+server_compression_level = int(os.getenv('SERVER_COMPRESSION_LEVEL', '6'))
+
+# read STATISTICS configurations
+statistics_source = os.getenv('STATISTICS_SOURCE', 'aggregate')
+
+# read COLUMN STORE configurations
+column_store_dir = os.getenv('COLUMN_STORE_DIR', '')
+
+# read CACHE configurations
+cache_max_entries = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+cache_ttl = float(os.getenv('CACHE_TTL', '60'))
+cache_version_check_interval = float(
+    os.getenv('CACHE_VERSION_CHECK_INTERVAL', '5'))
+
+# read METRICS configurations
+metrics_ingest_file = os.getenv('METRICS_INGEST_FILE', '')
+
+# Endpoints labelled in the metrics, other paths are labelled `other`
+API_ENDPOINTS = ('/api/financial_data', '/api/statistics', '/api/resampled_data',
+                 '/api/export', '/api/server_stats', '/metrics')
+
+
+def _load_data_versions() -> Dict[str, int]:
+    """
+    Loads the data version of each symbol, which get_raw_data.py
+    increments whenever it writes rows of the symbol.
+
+    Returns:
+        Dict[str, int]: The data version by symbol.
+    """
+
+    db = DbConnection(pooled=True)
+    try:
+        db.connect()
+        db.open_cursor()
+        db.cursor.execute(
+            "SELECT symbol, version FROM financial_data_version")
+        return dict(db.cursor.fetchall())
+    finally:
+        db.close_cursor()
+        db.disconnect()
+
+
+# Secondary indexes of financial_data and the time of their next load,
+# reloaded periodically to use the indexes added by migrations.py
+INDEXES_RELOAD_INTERVAL = 60.0
+_indexes = (frozenset(), 0.0)
+
+
+def _available_indexes() -> frozenset:
+    """
+    Returns the secondary indexes of financial_data, which decide
+    the access paths of the queries. The last known indexes are kept
+    when they can not be loaded.
+
+    Returns:
+        frozenset: The index names.
+    """
+
+    global _indexes
+    (indexes, next_load) = _indexes
+    if time.monotonic() < next_load:
+        return indexes
+    _indexes = (indexes, time.monotonic() + INDEXES_RELOAD_INTERVAL)
+
+    db = DbConnection(pooled=True)
+    try:
+        db.connect()
+        db.open_cursor()
+        indexes = load_indexes(db)
+        _indexes = (indexes, time.monotonic() + INDEXES_RELOAD_INTERVAL)
+    except DatabaseError:
+        pass
+    finally:
+        db.disconnect()
+    return indexes
+
+
+# Cache of API responses, shared by all request handlers
+result_cache = ResultCache(
+    load_versions=_load_data_versions,
+    max_entries=cache_max_entries,
+    ttl=cache_ttl,
+    version_check_interval=cache_version_check_interval)
+
+
+# Local column files of the symbols, read before the database
+column_store = ColumnStore(column_store_dir) if column_store_dir else None
+
+
+def _make_etag(cache_key: tuple, symbols: Optional[List[str]]) -> Optional[str]:
+    """
+    Returns the strong ETag of a response, derived from its normalized
+    query parameters and the data versions of the symbols it depends on.
+    It is computed before querying, so that a request whose response is
+    unchanged is answered without querying nor serializing anything.
+
+    Args:
+        cache_key (tuple): The normalized query parameters of the response.
+        symbols (List[str]): The symbols of the response,
+            None when it depends on every symbol.
+
+    Returns:
+        str: The quoted ETag, None while the data versions are unknown.
+    """
+
+    version_tag = result_cache.version_tag(symbols)
+    if version_tag is None:
+        return None
+    digest = hashlib.blake2b(
+        repr((cache_key, version_tag)).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """
+    Checks whether the `If-None-Match` header of a request matches an ETag,
+    in any of its content encodings.
+
+    Args:
+        if_none_match (str): The header value, None when missing.
+        etag (str): The quoted ETag of the response, None when unknown.
+
+    Returns:
+        bool: True when the client already has the response.
+    """
+
+    if not if_none_match or etag is None:
+        return False
+
+    digest = etag.strip('"')
+    for value in if_none_match.split(','):
+        value = value.strip()
+        if value == '*':
+            return True
+        # Compare the digest, without weak prefix nor encoding suffix
+        if value.startswith('W/'):
+            value = value[2:]
+        if value.strip('"').split('-', 1)[0] == digest:
+            return True
+    return False
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    """
+    Compresses a response body. The gzip header has no timestamp,
+    so that a body is always compressed to the same bytes.
+
+    Args:
+        body (bytes): The response body.
+        encoding (str): `gzip` or `deflate`.
+
+    Returns:
+        bytes: The compressed body.
+    """
+
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=server_compression_level, mtime=0)
+    return zlib.compress(body, server_compression_level)
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    """
+    Parses a date query parameter. Dates are parsed as soon as a request
+    is received, so that both supported formats share the same cache
+    entries and reach the database as the same parameters.
+
+    Args:
+        value (str): The date provided by the user, in `%Y/%m/%d`
+            or `%Y-%m-%d` format.
+
+    Returns:
+        date: The parsed date, None when the parameter is missing.
+
+    Raises:
+        ValueError: If the value is not a valid date.
+    """
+
+    if value is None:
+        return None
+    if '/' in value:
+        return datetime.strptime(value, '%Y/%m/%d').date()
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _dump_financial_data_response(
+        data: FinancialDataBatch,
+        pagination: dict) -> bytes:
+    """
+    Serializes the response of the financial data API, byte-identical
+    to `json.dumps` with FinancialDataEncoder but without going through
+    the encoder for each record.
+
+    Args:
+        data (FinancialDataBatch): The records of the response.
+        pagination (dict): The pagination info of the response.
+
+    Returns:
+        bytes: The JSON response.
+    """
+
+    info = {"error": 'No record found for given parameters.' if not data else ''}
+    return (b'{"data": ' + dump_financial_data(data)
+            + b', "pagination": ' + json.dumps(pagination).encode()
+            + b', "info": ' + json.dumps(info).encode() + b'}')
+
+
+def _get_column_file(symbol: Optional[str]) -> Optional[ColumnFile]:
+    """
+    Returns the local column file of a symbol.
+
+    Args:
+        symbol (str): The stock symbol, None for all symbols.
+
+    Returns:
+        ColumnFile: The mapped file, or None when the column store is
+        disabled, the request is not for a single symbol or the symbol
+        has no file.
+    """
+
+    if column_store is None or symbol is None:
+        return None
+    return column_store.get(symbol)
+
+
+def _fetch_data_from_column_file(
+        column_file: ColumnFile,
+        start_date: Optional[date],
+        end_date: Optional[date],
+        limit: Optional[int],
+        page: Optional[int],
+        after: Optional[Tuple[str, date]]) -> Tuple[FinancialDataBatch, int]:
+    """
+    Reads a page of the records of a symbol from its column file,
+    with the same results as the database queries.
+
+    Args:
+        column_file (ColumnFile): The column file of the symbol.
+        start_date (date): start date of the data to fetch
+        end_date (date): end date of the data to fetch
+        limit (int): maximum number of records to fetch per page
+        page (int): page number of the records to fetch
+        after (Tuple[str, date]): (symbol, date) key after which records
+            are fetched, used instead of the page number
+
+    Returns:
+        A tuple with the records and the total number of records
+        in the date range.
+    """
+
+    (start, end) = column_file.find(start_date, end_date)
+    count = end - start
+
+    # Skip the records up to the cursor or the previous pages
+    if after is not None:
+        start = max(start, bisect_right(column_file.dates, after[1].toordinal()))
+    elif limit and page is not None:
+        start += max(page - 1, 0) * limit
+    if limit:
+        end = min(end, start + limit)
+
+    return column_file.slice(start, max(start, end)), count
+
+
+# Symbol value requesting the statistics of all symbols
+ALL_SYMBOLS = '*'
+
+
+@functools.lru_cache(maxsize=None)
+def _data_queries(
+        with_symbol: bool,
+        with_start_date: bool,
+        with_end_date: bool,
+        with_after: bool,
+        with_limit: bool,
+        with_offset: bool,
+        indexes: frozenset = frozenset()) -> Tuple[str, str]:
+    """
+    Returns the counting and fetching queries of financial data for
+    a combination of query parameters. There is a small fixed number
+    of combinations, and each one always returns the same query texts.
+
+    The records of a symbol are read from the primary key. Across symbols,
+    rows are counted from the narrow date index when it exists. They are
+    fetched in primary key order, which keeps offset and keyset pages
+    consistent, so no index is forced: reading a date range from a date
+    index would sort the whole range to return a page, and the optimizer
+    chooses between this and reading the primary key in order.
+
+    Args:
+        with_symbol (bool): Whether the records of a symbol are fetched.
+        with_start_date (bool): Whether the records start at a date.
+        with_end_date (bool): Whether the records end at a date.
+        with_after (bool): Whether the records follow a (symbol, date) key.
+        with_limit (bool): Whether the number of records is limited.
+        with_offset (bool): Whether records of previous pages are skipped.
+        indexes (frozenset): The secondary indexes of financial_data.
+
+    Returns:
+        Tuple[str, str]: The counting query, whose parameters are the symbol
+        and the dates, and the fetching query, which adds the key (the date
+        with a symbol, else the symbol twice and the date), limit and offset
+        parameters.
+    """
+
+    conditions = []
+    if with_symbol:
+        conditions.append("symbol = %s")
+    if with_start_date:
+        conditions.append("date >= %s")
+    if with_end_date:
+        conditions.append("date <= %s")
+
+    query_count = "SELECT COUNT(*) FROM financial_data"
+    if not with_symbol and DATE_INDEX in indexes:
+        query_count += " " + storage_backend.index_hint(DATE_INDEX)
+    if conditions:
+        query_count += " WHERE " + " AND ".join(conditions)
+
+    # Row constructor comparisons are not reliably turned into primary
+    # key ranges by MySQL, so the key condition is expanded, with a
+    # leading bound on the symbol which both engines read as a range
+    if with_after and with_symbol:
+        conditions.append("date > %s")
+    elif with_after:
+        conditions.append("symbol >= %s AND (symbol > %s OR date > %s)")
+
+    query_get = "SELECT * FROM financial_data"
+    if conditions:
+        query_get += " WHERE " + " AND ".join(conditions)
+
+    # Pages are stable when rows follow the primary key order
+    query_get += " ORDER BY symbol, date"
+    if with_limit:
+        query_get += " LIMIT %s"
+        if with_offset:
+            query_get += " OFFSET %s"
+
+    return query_count, query_get
+
+
+# Sums of DECIMAL columns are exact, the averages are computed
+# from them in Python to keep the same Decimal rounding
+TOTALS_QUERY = ("SELECT COUNT(*), SUM(open_price), SUM(close_price), SUM(volume) "
+                "FROM financial_data "
+                "WHERE symbol = %s AND date >= %s AND date <= %s")
+
+
+def _totals_by_symbol_query(symbol_count: Optional[int], indexes: frozenset) -> str:
+    """
+    Returns the query aggregating the financial data of a date range by
+    symbol. All symbols are aggregated from the covering date index when
+    it exists, while a list of symbols is read from the primary key.
+
+    Args:
+        symbol_count (int): The number of symbol parameters, None for all symbols.
+        indexes (frozenset): The secondary indexes of financial_data.
+
+    Returns:
+        str: The query, whose parameters are the dates and the symbols.
+    """
+
+    query = "SELECT symbol, COUNT(*), SUM(open_price), SUM(close_price), SUM(volume) "
+    query += "FROM financial_data"
+    if symbol_count is None and DATE_COVERING_INDEX in indexes:
+        query += " " + storage_backend.index_hint(DATE_COVERING_INDEX)
+    query += " WHERE date >= %s AND date <= %s"
+    if symbol_count is not None:
+        query += " AND symbol IN (%s)" % ', '.join(['%s'] * symbol_count)
+    return query + " GROUP BY symbol"
+
+
+def _symbols_data_query(symbol_count: Optional[int], indexes: frozenset) -> str:
+    """
+    Returns the query fetching the financial data of a date range for
+    several symbols, with the same access paths as `_totals_by_symbol_query`.
+
+    Args:
+        symbol_count (int): The number of symbol parameters, None for all symbols.
+        indexes (frozenset): The secondary indexes of financial_data.
+
+    Returns:
+        str: The query, whose parameters are the dates and the symbols.
+    """
+
+    query = "SELECT * FROM financial_data"
+    if symbol_count is None and DATE_COVERING_INDEX in indexes:
+        query += " " + storage_backend.index_hint(DATE_COVERING_INDEX)
+    query += " WHERE date >= %s AND date <= %s"
+    if symbol_count is not None:
+        query += " AND symbol IN (%s)" % ', '.join(['%s'] * symbol_count)
+    return query + " ORDER BY symbol, date"
+
+
+@functools.lru_cache(maxsize=None)
+def _export_query(
+        symbol_count: Optional[int],
+        with_start_date: bool,
+        with_end_date: bool,
+        indexes: frozenset = frozenset()) -> str:
+    """
+    Returns the query exporting the financial data of symbols. A list of
+    symbols is read from the primary key, and a date range of all symbols
+    from the covering date index when it exists. Rows follow the order of
+    the index read, so that the server streams them without sorting.
+
+    Args:
+        symbol_count (int): The number of symbol parameters, None for all symbols.
+        with_start_date (bool): Whether the records start at a date.
+        with_end_date (bool): Whether the records end at a date.
+        indexes (frozenset): The secondary indexes of financial_data.
+
+    Returns:
+        str: The query, whose parameters are the symbols and the dates.
+    """
+
+    conditions = []
+    if symbol_count is not None:
+        conditions.append("symbol IN (%s)" % ', '.join(['%s'] * symbol_count))
+    if with_start_date:
+        conditions.append("date >= %s")
+    if with_end_date:
+        conditions.append("date <= %s")
+
+    with_date_index = (symbol_count is None and (with_start_date or with_end_date)
+                       and DATE_COVERING_INDEX in indexes)
+
+    query = "SELECT * FROM financial_data"
+    if with_date_index:
+        query += " " + storage_backend.index_hint(DATE_COVERING_INDEX)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query + (" ORDER BY date, symbol" if with_date_index else " ORDER BY symbol, date")
+
+
+# Supported resampling intervals
+RESAMPLE_INTERVALS = ('week', 'month', 'quarter')
+
+
+def _period_start(interval: str, day: date) -> date:
+    """
+    Returns the first calendar day of the week (starting on Monday),
+    month or quarter of a date.
+
+    Args:
+        interval (str): One of RESAMPLE_INTERVALS.
+        day (date): The date.
+
+    Returns:
+        date: The first day of the period.
+    """
+
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day.replace(month=day.month - (day.month - 1) % 3, day=1)
+
+
+# Cursor value requesting the first page of a cursor-based pagination
+FIRST_PAGE_CURSOR = 'first'
+
+
+def _encode_cursor(symbol: str, day: date) -> str:
+    """
+    Encodes the key of the last row of a page into an opaque cursor token.
+
+    Args:
+        symbol (str): The stock symbol of the last row.
+        day (date): The date of the last row.
+
+    Returns:
+        str: The URL-safe cursor token.
+    """
+
+    key = json.dumps([symbol, day.isoformat()], separators=(',', ':'))
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> Optional[Tuple[str, date]]:
+    """
+    Decodes a cursor token into the key of the last row of previous page.
+
+    Args:
+        cursor (str): The cursor token provided by the user.
+
+    Returns:
+        The (symbol, date) key, or None for the first page.
+
+    Raises:
+        ValueError: When the cursor is not a valid token.
+    """
+
+    if cursor == FIRST_PAGE_CURSOR:
+        return None
+
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        symbol, day = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        return str(symbol), date.fromisoformat(day)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
 
 class FinancialDataRequestHandler(BaseHTTPRequestHandler):
     """
     Request handler class for Financial APIs.
     """
 
+    # Keep connections alive between requests,
+    # closing them when idle for too long
+    protocol_version = 'HTTP/1.1'
+    timeout = server_keepalive_timeout
+
+    # Do not delay small responses written after their headers
+    disable_nagle_algorithm = True
+
     def do_GET(self):
         """
         Handle GET requests
         """
 
-        # Parse the URL and query parameter
-        url_parts = urlparse(self.path)
-        query_params = parse_qs(url_parts.query)
+        # Time the request and its spans by endpoint
+        with RequestTimer('other') as timer:
+            # Parse the URL and query parameter
+            with span('parse'):
+                url_parts = urlparse(self.path)
+                query_params = parse_qs(url_parts.query)
+            if url_parts.path in API_ENDPOINTS:
+                timer.endpoint = url_parts.path
+
+            # Check if requested endpoint is valid
+            if url_parts.path == '/api/financial_data':
+                self._handle_financial_data_api(query_params)
+            elif url_parts.path == '/api/statistics':
+                self._handle_statistics_api(query_params)
+            elif url_parts.path == '/api/resampled_data':
+                self._handle_resampled_data_api(query_params)
+            elif url_parts.path == '/api/export':
+                self._handle_export_api(query_params)
+            elif url_parts.path == '/api/server_stats':
+                self._handle_server_stats_api(query_params)
+            elif url_parts.path == '/metrics':
+                self._handle_metrics_api(query_params)
+            else:
+                self.send_error(404, message="Invalid API endpoint")
+
+    def send_response(self, code, message=None):
+        """
+        Sends the response status, recorded in the metrics of the request.
+        """
 
-        # Check if requested endpoint is valid
-        if url_parts.path == '/api/financial_data':
-            self._handle_financial_data_api(query_params)
-        elif url_parts.path == '/api/statistics':
-            self._handle_statistics_api(query_params)
-        else:
-            self.send_error(404, message="Invalid API endpoint")
+        timer = RequestTimer.current()
+        if timer is not None:
+            timer.status = code
+        super().send_response(code, message)
 
     def _handle_financial_data_api(self, query_params):
         """
@@ -57,7 +629,10 @@ class FinancialDataRequestHandler(BaseHTTPRequestHandler):
                             'end_date',
                             'symbol',
                             'limit',
-                            'page']
+                            'page',
+                            'cursor',
+                            'include_count',
+                            'format']
 
         # Check if all requested query parameters are supported
         for param in query_params.keys():
@@ -66,14 +641,56 @@ class FinancialDataRequestHandler(BaseHTTPRequestHandler):
                     400, message=f"Unsupported query parameter: {param}")
                 return
 
+        # Check if requested response format is supported
+        response_format = query_params.get('format', ['json'])[0]
+        if response_format == 'ndjson':
+            for param in ('page', 'cursor', 'include_count'):
+                if param in query_params:
+                    self.send_error(
+                        400, message=f"Query parameter {param} is not supported with format=ndjson")
+                    return
+            self._handle_financial_data_stream_api(query_params)
+            return
+        elif response_format != 'json':
+            self.send_error(
+                400, message=f"Unsupported format: {response_format}")
+            return
+
+        # Cursor-based pagination replaces the page number
+        if 'cursor' in query_params:
+            if 'page' in query_params:
+                self.send_error(
+                    400, message="Query parameters cursor and page can not be used together")
+                return
+            self._handle_financial_data_cursor_api(query_params)
+            return
+
         try:
             # Get the optional query parameters
-            start_date = query_params.get(supported_params[0], [None])[0]
-            end_date = query_params.get(supported_params[1], [None])[0]
+            start_date = _parse_date(query_params.get(supported_params[0], [None])[0])
+            end_date = _parse_date(query_params.get(supported_params[1], [None])[0])
             symbol = query_params.get(supported_params[2], [None])[0]
             limit = int(query_params.get(supported_params[3], [5])[0])
             page = int(query_params.get(supported_params[4], [1])[0])
 
+            if limit < 1:
+                raise ValueError(f"Invalid limit: {limit}")
+            if page < 1:
+                raise ValueError(f"Invalid page: {page}")
+
+            # Answer 304 when the client has the current response
+            cache_key = ('financial_data', symbol, start_date, end_date, limit, page)
+            etag = _make_etag(cache_key, [symbol] if symbol is not None else None)
+            if _etag_matches(self.headers.get('If-None-Match'), etag):
+                self._write_not_modified_response(etag)
+                return
+
+            # Send the cached response if any
+            cached_response = result_cache.get(cache_key)
+            if cached_response is not None:
+                self._write_success_response(cached_response, etag)
+                return
+
             # Fetch the data and total number of records from db
             (data, count) = self._fetch_data_from_db(
                 start_date=start_date,
@@ -85,6 +702,647 @@ class FinancialDataRequestHandler(BaseHTTPRequestHandler):
             # Calculate pagination info
             total_pages = (count + limit - 1) // limit
 
+            # Create the response
+            with span('serialization'):
+                response = _dump_financial_data_response(data, {
+                    "count": count,
+                    "page": page,
+                    "limit": limit,
+                    "pages": total_pages,
+                })
+
+            # Send the response and keep it for next requests
+            result_cache.put(cache_key, symbol, response)
+            self._write_success_response(response, etag)
+        # Handle exceptions if occurred
+        except DatabaseError as error:
+            self._write_error_response(500, str(error))
+        except ValueError as error:
+            self._write_error_response(400, str(error))
+        except Exception as error:
+            self._write_error_response(500, str(error))
+
+    def _handle_financial_data_cursor_api(self, query_params):
+        """
+        Handles the GET requests to the financial data API using
+        cursor-based (keyset) pagination. Each page starts right after
+        the (symbol, date) key encoded in the `cursor` parameter, so that
+        deep pages cost the same as the first one.
+
+        Args:
+            query_params (Dict[str, Any]): 
+            Query parameters provided by the user.
+
+        Returns:
+            None
+        """
+
+        try:
+            # Get the optional query parameters
+            start_date = _parse_date(query_params.get('start_date', [None])[0])
+            end_date = _parse_date(query_params.get('end_date', [None])[0])
+            symbol = query_params.get('symbol', [None])[0]
+            limit = int(query_params.get('limit', [5])[0])
+            after = _decode_cursor(query_params.get('cursor')[0])
+            include_count = query_params.get(
+                'include_count', ['false'])[0].lower() in ('1', 'true', 'yes')
+
+            if limit < 1:
+                raise ValueError(f"Invalid limit: {limit}")
+
+            # Answer 304 when the client has the current response
+            cache_key = ('financial_data_cursor', symbol, start_date,
+                         end_date, limit, after, include_count)
+            etag = _make_etag(cache_key, [symbol] if symbol is not None else None)
+            if _etag_matches(self.headers.get('If-None-Match'), etag):
+                self._write_not_modified_response(etag)
+                return
+
+            # Send the cached response if any
+            cached_response = result_cache.get(cache_key)
+            if cached_response is not None:
+                self._write_success_response(cached_response, etag)
+                return
+
+            # Fetch one more record than requested to know if there is a next page
+            (data, count) = self._fetch_data_from_db(
+                start_date=start_date,
+                end_date=end_date,
+                symbol=symbol,
+                limit=limit + 1,
+                after=after,
+                with_count=include_count)
+
+            next_cursor = None
+            if len(data) > limit:
+                data = data[:limit]
+                next_cursor = _encode_cursor(data[-1].symbol, data[-1].date)
+
+            # Calculate pagination info
+            pagination = {
+                "limit": limit,
+                "next_cursor": next_cursor,
+            }
+            if include_count:
+                pagination["count"] = count
+
+            # Create the response
+            with span('serialization'):
+                response = _dump_financial_data_response(data, pagination)
+
+            # Send the response and keep it for next requests
+            result_cache.put(cache_key, symbol, response)
+            self._write_success_response(response, etag)
+        # Handle exceptions if occurred
+        except DatabaseError as error:
+            self._write_error_response(500, str(error))
+        except ValueError as error:
+            self._write_error_response(400, str(error))
+        except Exception as error:
+            self._write_error_response(500, str(error))
+
+    def _handle_financial_data_stream_api(self, query_params):
+        """
+        Handles the GET requests to the financial data API with
+        `format=ndjson`. Records are streamed as newline delimited JSON
+        in chunks, as they are read from the database, so that memory use
+        does not depend on the number of records. All matching records
+        are returned unless `limit` is provided.
+
+        Args:
+            query_params (Dict[str, Any]): 
+            Query parameters provided by the user.
+
+        Returns:
+            None
+        """
+
+        try:
+            # Get the optional query parameters
+            start_date = _parse_date(query_params.get('start_date', [None])[0])
+            end_date = _parse_date(query_params.get('end_date', [None])[0])
+            symbol = query_params.get('symbol', [None])[0]
+            limit = query_params.get('limit', [None])[0]
+            limit = int(limit) if limit is not None else None
+            if limit is not None and limit < 1:
+                raise ValueError(f"Invalid limit: {limit}")
+
+            # Answer 304 when the client has the current response
+            etag = _make_etag(('financial_data_stream', symbol, start_date, end_date, limit),
+                              [symbol] if symbol is not None else None)
+            if _etag_matches(self.headers.get('If-None-Match'), etag):
+                self._write_not_modified_response(etag)
+                return
+
+            chunks = self._stream_data_from_db(
+                start_date=start_date,
+                end_date=end_date,
+                symbol=symbol,
+                limit=limit)
+
+            # Run the query before sending the headers,
+            # so that a failure can still be reported to the client
+            first_chunk = next(chunks, [])
+        # Handle exceptions if occurred
+        except DatabaseError as error:
+            self._write_error_response(500, str(error))
+            return
+        except ValueError as error:
+            self._write_error_response(400, str(error))
+            return
+        except Exception as error:
+            self._write_error_response(500, str(error))
+            return
+
+        # Chunked transfer encoding requires HTTP/1.1 on both sides,
+        # otherwise the end of the response is the end of the connection
+        chunked = (self.request_version == 'HTTP/1.1'
+                   and self.protocol_version == 'HTTP/1.1')
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson')
+        if etag is not None:
+            self.send_header('ETag', etag)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+
+        try:
+            chunk = first_chunk
+            while chunk:
+                with span('serialization'):
+                    body = dump_financial_data_lines(chunk)
+                self._write_body_chunk(body, chunked)
+                chunk = next(chunks, [])
+
+            # Terminate the chunked body
+            if chunked:
+                with span('write'):
+                    self.wfile.write(b"0\r\n\r\n")
+        except Exception as error:
+            # The status is already sent, the client notices
+            # the truncated body as the connection is closed
+            self.close_connection = True
+            self.log_error("Streaming response failed: %s", error)
+        finally:
+            chunks.close()
+
+    def _write_body_chunk(self, body: bytes, chunked: bool):
+        """
+        Write a part of a streamed response body to the client.
+
+        Args:
+        - body (bytes): the part of the body to send
+        - chunked (bool): whether chunked transfer encoding is used
+
+        Returns:
+        - None
+        """
+
+        with span('write'):
+            if chunked:
+                self.wfile.write(f"{len(body):X}\r\n".encode())
+                self.wfile.write(body)
+                self.wfile.write(b"\r\n")
+            else:
+                self.wfile.write(body)
+
+    def _handle_export_api(self, query_params):
+        """
+        Handles the GET requests to the export API. The financial data of
+        symbols (all of them by default) over an optional date range is
+        streamed as a CSV or Parquet file, as it is read from the database,
+        so that memory use does not depend on the number of records.
+
+        Args:
+            query_params (Dict[str, Any]): 
+            Query parameters provided by the user.
+
+        Returns:
+            None
+        """
+
+        # Define a list of supported query parameters
+        supported_params = ['start_date', 'end_date', 'symbol', 'format']
+
+        # Check if all requested query parameters are supported
+        for param in query_params.keys():
+            if param not in supported_params:
+                self.send_error(
+                    400, message=f"Unsupported query parameter: {param}")
+                return
+
+        try:
+            # Get the optional query parameters
+            start_date = _parse_date(query_params.get('start_date', [None])[0])
+            end_date = _parse_date(query_params.get('end_date', [None])[0])
+            file_format = query_params.get('format', ['csv'])[0]
+            if file_format not in EXPORT_FORMATS:
+                raise ValueError(f"Unsupported format: {file_format}")
+
+            # Several symbols can be requested as a comma separated list
+            # or by repeating the parameter, and all of them with `*`
+            symbols = [symbol
+                       for value in query_params.get('symbol', [ALL_SYMBOLS])
+                       for symbol in value.split(',') if symbol]
+            if ALL_SYMBOLS in symbols:
+                if len(symbols) > 1:
+                    raise ValueError(
+                        f"Symbol {ALL_SYMBOLS} cannot be combined with other symbols")
+                symbols = None
+            elif not symbols:
+                raise ValueError("Missing symbol")
+            else:
+                # Symbols are matched case-insensitively, as by the database
+                symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+
+            # Answer 304 when the client has the current file
+            etag = _make_etag(('export', tuple(symbols) if symbols else ALL_SYMBOLS,
+                               start_date, end_date, file_format), symbols)
+            if _etag_matches(self.headers.get('If-None-Match'), etag):
+                self._write_not_modified_response(etag)
+                return
+
+            # Fails before the headers when Parquet is not available
+            writer = create_export_writer(file_format)
+
+            query = _export_query(len(symbols) if symbols else None,
+                                  start_date is not None, end_date is not None,
+                                  _available_indexes())
+            params = (symbols or []) + [value for value in (start_date, end_date)
+                                        if value is not None]
+            batches = self._stream_query_from_db(query, params)
+
+            # Run the query before sending the headers,
+            # so that a failure can still be reported to the client
+            first_batch = next(batches, None)
+        # Handle exceptions if occurred
+        except DatabaseError as error:
+            self._write_error_response(500, str(error))
+            return
+        except ValueError as error:
+            self._write_error_response(400, str(error))
+            return
+        except Exception as error:
+            self._write_error_response(500, str(error))
+            return
+
+        # Chunked transfer encoding requires HTTP/1.1 on both sides,
+        # otherwise the end of the response is the end of the connection
+        chunked = (self.request_version == 'HTTP/1.1'
+                   and self.protocol_version == 'HTTP/1.1')
+
+        self.send_response(200)
+        self.send_header('Content-type', EXPORT_FORMATS[file_format])
+        self.send_header('Content-Disposition',
+                         f'attachment; filename="financial_data.{file_format}"')
+        if etag is not None:
+            self.send_header('ETag', etag)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+
+        try:
+            batch = first_batch
+            while batch is not None:
+                with span('serialization'):
+                    body = writer.write(batch)
+                if body:
+                    self._write_body_chunk(body, chunked)
+                batch = next(batches, None)
+
+            # Complete the file
+            with span('serialization'):
+                body = writer.close()
+            if body:
+                self._write_body_chunk(body, chunked)
+
+            # Terminate the chunked body
+            if chunked:
+                with span('write'):
+                    self.wfile.write(b"0\r\n\r\n")
+        except Exception as error:
+            # The status is already sent, the client notices
+            # the truncated body as the connection is closed
+            self.close_connection = True
+            self.log_error("Streaming export failed: %s", error)
+        finally:
+            batches.close()
+
+    def _handle_statistics_api(self, query_params):
+        """
+        Handles API requests to retrieve statistics 
+        about the financial data.
+
+        Args:
+            query_params (Dict[str, Any]): 
+            Query parameters provided by the user.
+
+        Returns:
+            None
+        """
+
+        # Define a list of supported query parameters
+        required_params = ['start_date',
+                           'end_date',
+                           'symbol']
+        supported_params = required_params + ['metrics']
+
+        # Check if all requested query parameters are supported
+        for param in query_params.keys():
+            if param not in supported_params:
+                self.send_error(
+                    400, message=f"Unsupported query parameter: {param}")
+                return
+
+        # Check if there is no missing required parameter
+        missing_params = []
+        for param in required_params:
+            if param not in query_params:
+                missing_params.append(param)
+        if len(missing_params) > 0:
+            self.send_error(
+                400, message=f"Missing required parameters: {', '.join(missing_params)}")
+            return
+
+        try:
+            # Get the required query parameters
+            start_date = _parse_date(query_params.get(supported_params[0])[0])
+            end_date = _parse_date(query_params.get(supported_params[1])[0])
+
+            # Several symbols can be requested as a comma separated list
+            # or by repeating the parameter, and all of them with `*`
+            symbols = [symbol
+                       for value in query_params.get(supported_params[2])
+                       for symbol in value.split(',') if symbol]
+            if not symbols:
+                raise ValueError("Missing symbol")
+
+            # Get the optional metrics to compute besides the averages
+            metrics = None
+            if 'metrics' in query_params:
+                metrics = parse_metrics(query_params.get('metrics')[0])
+
+            if len(symbols) > 1 or symbols[0] == ALL_SYMBOLS:
+                self._handle_statistics_batch(
+                    start_date, end_date, symbols, metrics)
+                return
+            symbol = symbols[0]
+
+            # Answer 304 when the client has the current response
+            cache_key = ('statistics', symbol, start_date, end_date,
+                         tuple(metrics) if metrics else None)
+            etag = _make_etag(cache_key, [symbol])
+            if _etag_matches(self.headers.get('If-None-Match'), etag):
+                self._write_not_modified_response(etag)
+                return
+
+            # Send the cached response if any
+            cached_response = result_cache.get(cache_key)
+            if cached_response is not None:
+                self._write_success_response(cached_response, etag)
+                return
+
+            if metrics:
+                # Load the columns of the date range with a single query,
+                # the totals and the metrics are computed from them
+                (data, _) = self._fetch_data_from_db(
+                    start_date=start_date,
+                    end_date=end_date,
+                    symbol=symbol,
+                    with_count=False)
+                totals = data.totals()
+            else:
+                # Aggregate the financial data in db
+                totals = self._fetch_totals_from_db(
+                    start_date=start_date,
+                    end_date=end_date,
+                    symbol=symbol)
+
+            # Calculate the avergae of financial data
+            average_data = self._calculate_average(
+                start_date=start_date,
+                end_date=end_date,
+                symbol=symbol,
+                totals=totals
+            )
+
+            # Create the response object
+            response = {
+                "data": average_data,
+                "info":  {
+                    "error": 'No record found for given parameters.' if not totals[0] else ''}
+            }
+            if metrics:
+                response["metrics"] = compute_metrics(data, metrics)
+
+            # Send the response and keep it for next requests
+            with span('serialization'):
+                response = json.dumps(response, cls=AverageFinancialDataEncoder)
+            result_cache.put(cache_key, symbol, response)
+            self._write_success_response(response, etag)
+        # Handle exceptions if occurred
+        except DatabaseError as error:
+            self._write_error_response(500, str(error))
+        except ValueError as error:
+            self._write_error_response(400, str(error))
+        except Exception as error:
+            self._write_error_response(500, str(error))
+
+    def _handle_statistics_batch(
+            self,
+            start_date: date,
+            end_date: date,
+            symbols: List[str],
+            metrics: Optional[List[Tuple[str, Optional[int]]]]):
+        """
+        Handles a statistics request for several symbols, aggregating all
+        of them with a single grouped query. A symbol without records
+        is reported in the errors of the response instead of failing
+        the whole request.
+
+        Args:
+        - start_date (date): start date of the statistics
+        - end_date (date): end date of the statistics
+        - symbols (List[str]): the requested symbols, or `*` for all symbols
+        - metrics (List[Tuple[str, int]]): the metrics to compute, if any
+
+        Returns:
+        - None
+        """
+
+        all_symbols = ALL_SYMBOLS in symbols
+        if all_symbols and len(symbols) > 1:
+            raise ValueError(
+                f"Symbol {ALL_SYMBOLS} cannot be combined with other symbols")
+
+        # Symbols are matched case-insensitively, as by the database
+        requested = None
+        if not all_symbols:
+            requested = list(dict.fromkeys(
+                symbol.upper() for symbol in symbols))
+
+        # Answer 304 when the client has the current response
+        cache_key = ('statistics', tuple(requested) if requested else ALL_SYMBOLS,
+                     start_date, end_date,
+                     tuple(metrics) if metrics else None)
+        etag = _make_etag(cache_key, requested)
+        if _etag_matches(self.headers.get('If-None-Match'), etag):
+            self._write_not_modified_response(etag)
+            return
+
+        # Send the cached response if any
+        cached_response = result_cache.get(cache_key)
+        if cached_response is not None:
+            self._write_success_response(cached_response, etag)
+            return
+
+        if metrics:
+            # Load the columns of all symbols with a single query,
+            # the totals and the metrics are computed from them
+            groups = self._fetch_symbols_data_from_db(
+                start_date=start_date,
+                end_date=end_date,
+                symbols=requested).group_by_symbol()
+            totals_by_symbol = {symbol: data.totals()
+                                for (symbol, data) in groups.items()}
+        else:
+            # Aggregate the financial data of all symbols in db
+            totals_by_symbol = self._fetch_totals_by_symbol_from_db(
+                start_date=start_date,
+                end_date=end_date,
+                symbols=requested)
+
+        # Report the symbols in the order they were requested,
+        # with the spelling of the database when they have records
+        stored_symbols = {symbol.upper(): symbol for symbol in totals_by_symbol}
+        if requested is None:
+            requested = list(stored_symbols)
+
+        average_data = []
+        metrics_by_symbol = {}
+        errors = {}
+        for requested_symbol in requested:
+            symbol = stored_symbols.get(requested_symbol, requested_symbol)
+            try:
+                totals = totals_by_symbol.get(
+                    symbol, (0, Decimal(0.00), Decimal(0.00), 0))
+                if not totals[0]:
+                    errors[symbol] = 'No record found for given parameters.'
+                    continue
+
+                average = self._calculate_average(
+                    start_date=start_date,
+                    end_date=end_date,
+                    symbol=symbol,
+                    totals=totals)
+                if metrics:
+                    metrics_by_symbol[symbol] = compute_metrics(
+                        groups[symbol], metrics)
+                average_data.append(average)
+            except Exception as error:
+                errors[symbol] = str(error)
+
+        # Create the response object
+        response = {
+            "data": average_data,
+            "info":  {
+                "error": 'No record found for given parameters.' if not average_data else '',
+                "errors": errors}
+        }
+        if metrics:
+            response["metrics"] = metrics_by_symbol
+
+        # Send the response and keep it for next requests
+        with span('serialization'):
+            response = json.dumps(response, cls=AverageFinancialDataEncoder)
+        result_cache.put(cache_key, None, response)
+        self._write_success_response(response, etag)
+
+    def _handle_resampled_data_api(self, query_params):
+        """
+        Handles API requests to retrieve the financial data resampled
+        to weekly, monthly or quarterly bars: the first open price,
+        the last close price and the total volume of each period.
+
+        Args:
+            query_params (Dict[str, Any]): 
+            Query parameters provided by the user.
+
+        Returns:
+            None
+        """
+
+        # Define a list of supported query parameters
+        required_params = ['interval']
+        supported_params = required_params + ['start_date',
+                                              'end_date',
+                                              'symbol',
+                                              'limit',
+                                              'page']
+
+        # Check if all requested query parameters are supported
+        for param in query_params.keys():
+            if param not in supported_params:
+                self.send_error(
+                    400, message=f"Unsupported query parameter: {param}")
+                return
+
+        # Check if there is no missing required parameter
+        missing_params = []
+        for param in required_params:
+            if param not in query_params:
+                missing_params.append(param)
+        if len(missing_params) > 0:
+            self.send_error(
+                400, message=f"Missing required parameters: {', '.join(missing_params)}")
+            return
+
+        try:
+            # Get the query parameters
+            interval = query_params.get('interval')[0]
+            start_date = _parse_date(query_params.get('start_date', [None])[0])
+            end_date = _parse_date(query_params.get('end_date', [None])[0])
+            symbol = query_params.get('symbol', [None])[0]
+            limit = int(query_params.get('limit', [5])[0])
+            page = int(query_params.get('page', [1])[0])
+
+            if interval not in RESAMPLE_INTERVALS:
+                raise ValueError(f"Unsupported interval: {interval}")
+            if limit < 1:
+                raise ValueError(f"Invalid limit: {limit}")
+            if page < 1:
+                raise ValueError(f"Invalid page: {page}")
+
+            # Answer 304 when the client has the current response
+            cache_key = ('resampled_data', interval, symbol,
+                         start_date, end_date, limit, page)
+            etag = _make_etag(cache_key, [symbol] if symbol is not None else None)
+            if _etag_matches(self.headers.get('If-None-Match'), etag):
+                self._write_not_modified_response(etag)
+                return
+
+            # Send the cached response if any
+            cached_response = result_cache.get(cache_key)
+            if cached_response is not None:
+                self._write_success_response(cached_response, etag)
+                return
+
+            # Fetch the bars and total number of bars from db
+            (data, count) = self._fetch_resampled_data_from_db(
+                interval=interval,
+                start_date=start_date,
+                end_date=end_date,
+                symbol=symbol,
+                limit=limit,
+                page=page)
+
             # Create the response object
             response = {
                 "data": data,
@@ -92,168 +1350,405 @@ class FinancialDataRequestHandler(BaseHTTPRequestHandler):
                     "count": count,
                     "page": page,
                     "limit": limit,
-                    "pages": total_pages,
+                    "pages": (count + limit - 1) // limit,
                 },
                 "info":  {
                     "error": 'No record found for given parameters.' if not data else ''}
             }
 
-            # Send the response
-            self._write_success_response(json.dumps(
-                response,
-                cls=FinancialDataEncoder))
-        # Handle exceptions if occurred
-        except Error as error:
-            self._write_error_response(500, str(error))
-        except ValueError as error:
-            self._write_error_response(400, str(error))
-        except Exception as error:
-            self._write_error_response(500, str(error))
+            # Send the response and keep it for next requests
+            with span('serialization'):
+                response = json.dumps(response, cls=ResampledFinancialDataEncoder)
+            result_cache.put(cache_key, symbol, response)
+            self._write_success_response(response, etag)
+        # Handle exceptions if occurred
+        except DatabaseError as error:
+            self._write_error_response(500, str(error))
+        except ValueError as error:
+            self._write_error_response(400, str(error))
+        except Exception as error:
+            self._write_error_response(500, str(error))
+
+    def _handle_server_stats_api(self, query_params):
+        """
+        Handles API requests to retrieve usage statistics of the server,
+        such as database connection pool and result cache counters.
+
+        In `prefork` mode, the statistics are the ones of the worker process
+        which accepted the connection, whose process id is given in `worker`.
+
+        Args:
+            query_params (Dict[str, Any]): 
+            Query parameters provided by the user.
+
+        Returns:
+            None
+        """
+
+        # This API does not support any query parameter
+        for param in query_params.keys():
+            self.send_error(
+                400, message=f"Unsupported query parameter: {param}")
+            return
+
+        # Create the response object
+        response = {
+            "data": {
+                "db_pool": get_pool().stats(),
+                "statement_cache": StatementCache.stats(),
+                "result_cache": result_cache.stats(),
+                "column_store": column_store.stats() if column_store else None,
+                "worker": os.getpid() if server_mode == 'prefork' else None,
+            },
+            "info":  {
+                "error": ''}
+        }
+
+        # Send the response
+        self._write_success_response(json.dumps(response))
+
+    def _handle_metrics_api(self, query_params):
+        """
+        Handles the requests of the metrics in the Prometheus text format:
+        the durations of the API requests and of their spans by endpoint,
+        followed by the metrics of the last ingestion run when
+        METRICS_INGEST_FILE is set.
+
+        In `prefork` mode, each worker process records its own metrics and
+        the response only has the ones of the worker which accepted the
+        connection. Their samples are labelled with `worker`, the process
+        id, so that the series of the workers are told apart and can be
+        summed across the scrapes, eg: `sum without (worker) (...)`. The
+        ingestion metrics are the same in every worker and not labelled.
+
+        Args:
+            query_params (Dict[str, Any]): 
+            Query parameters provided by the user.
+
+        Returns:
+            None
+        """
+
+        # This API does not support any query parameter
+        for param in query_params.keys():
+            self.send_error(
+                400, message=f"Unsupported query parameter: {param}")
+            return
+
+        # Label the samples with the worker process which recorded them
+        labels = {'worker': str(os.getpid())} if server_mode == 'prefork' else None
+        response = metrics_registry.render(labels)
+
+        # Append the metrics written by get_raw_data.py, if any
+        if metrics_ingest_file:
+            try:
+                with open(metrics_ingest_file) as file:
+                    response += file.read()
+            except OSError:
+                pass
+
+        # Send the response
+        self._write_response(200, response,
+                             content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    def _fetch_data_from_db(
+            self,
+            start_date: date = None,
+            end_date: date = None,
+            symbol: str = None,
+            limit: int = None,
+            page: int = None,
+            after: Tuple[str, date] = None,
+            with_count: bool = True) -> Tuple[FinancialDataBatch, int]:
+        """
+        Fetches financial data from the database based on the query parameters
+
+        Args:
+        - self: the instance of the object calling this method
+        - start_date (date): start date of the data to fetch
+        - end_date (date): end date of the data to fetch
+        - symbol (str): the stock symbol of the data to fetch
+        - limit (int): maximum number of records to fetch per page
+        - page (int): page number of the records to fetch
+        - after (Tuple[str, date]): (symbol, date) key after which records
+          are fetched, used instead of the page number
+        - with_count (bool): whether the total number of records is counted
+
+        Returns:
+        A tuple with:
+        - data (FinancialDataBatch): the financial data fetched from the database
+        - count (int): total number of records fetched from the database
+          (None when not counted)
+        """
+
+        # Read the records of a symbol from its column file if any
+        column_file = _get_column_file(symbol)
+        if column_file is not None and (after is None or after[0] == column_file.symbol):
+            with span('materialization'):
+                return _fetch_data_from_column_file(
+                    column_file, start_date, end_date, limit, page, after)
+
+       # Get a connection to mysql db from the pool
+        db = DbConnection(pooled=True)
+
+        try:
+            # Construct the SQL query based on the query parameters
+            (query_count, count_params, query_get, params) = self._build_data_queries(
+                start_date=start_date,
+                end_date=end_date,
+                symbol=symbol,
+                limit=limit,
+                page=page,
+                after=after)
+
+            # Open database connection
+            db.connect()
+
+            count = None
+            if with_count:
+                # Execute the count query and fetch the result
+                with span('count_query'):
+                    count = db.execute_prepared(query_count, count_params)[0][0]
+
+            # Execute the data query and fetch the results into columns
+            with span('data_query'):
+                rows = db.execute_prepared(query_get, params)
+            with span('materialization'):
+                data = FinancialDataBatch.from_rows(rows)
+
+            return data, count
+
+        # Return the database connection to the pool
+        finally:
+            db.disconnect()
+
+    def _stream_data_from_db(
+            self,
+            start_date: date = None,
+            end_date: date = None,
+            symbol: str = None,
+            limit: int = None) -> Iterator[FinancialDataBatch]:
+        """
+        Streams financial data from the database based on the query
+        parameters, reading the rows from the server in chunks.
+
+        Args:
+        - start_date (date): start date of the data to fetch
+        - end_date (date): end date of the data to fetch
+        - symbol (str): the stock symbol of the data to fetch
+        - limit (int): maximum number of records to fetch
+
+        Returns:
+        An iterator of FinancialDataBatch of at most
+        SERVER_STREAM_CHUNK_ROWS records.
+        """
+
+        # Construct the SQL query based on the query parameters
+        (_, _, query_get, params) = self._build_data_queries(
+            start_date=start_date,
+            end_date=end_date,
+            symbol=symbol,
+            limit=limit)
+
+        return self._stream_query_from_db(query_get, params)
 
-    def _handle_statistics_api(self, query_params):
+    def _stream_query_from_db(
+            self,
+            query: str,
+            params: list) -> Iterator[FinancialDataBatch]:
         """
-        Handles API requests to retrieve statistics 
-        about the financial data.
+        Streams the financial data rows selected by a query,
+        reading them from the server in chunks.
 
         Args:
-            query_params (Dict[str, Any]): 
-            Query parameters provided by the user.
+        - query (str): the query selecting financial data rows
+        - params (list): the parameters of the query
 
         Returns:
-            None
+        An iterator of FinancialDataBatch of at most
+        SERVER_STREAM_CHUNK_ROWS records.
         """
 
-        # Define a list of supported query parameters
-        supported_params = ['start_date',
-                            'end_date',
-                            'symbol']
-
-        # Check if all requested query parameters are supported
-        for param in query_params.keys():
-            if param not in supported_params:
-                self.send_error(
-                    400, message=f"Unsupported query parameter: {param}")
-                return
-
-        # Check if there is no missing required parameter
-        missing_params = []
-        for param in supported_params:
-            if param not in query_params:
-                missing_params.append(param)
-        if len(missing_params) > 0:
-            self.send_error(
-                400, message=f"Missing required parameters: {', '.join(missing_params)}")
-            return
+        # Get a connection to mysql db from the pool
+        db = DbConnection(pooled=True)
 
         try:
-            # Get the required query parameters
-            start_date = query_params.get(supported_params[0])[0]
-            end_date = query_params.get(supported_params[1])[0]
-            symbol = query_params.get(supported_params[2])[0]
+            # Open database connection and an unbuffered cursor,
+            # which reads rows from the server only when fetched
+            db.connect()
+            db.open_cursor()
 
-            # Fetch the financial data from db
-            (data, _) = self._fetch_data_from_db(
-                start_date=start_date,
-                end_date=end_date,
-                symbol=symbol)
+            # Execute the data query
+            with span('data_query'):
+                db.cursor.execute(query, params)
 
-            # Calculate the avergae of financial data
-            average_data = self._calculate_average(
-                start_date=start_date,
-                end_date=end_date,
-                symbol=symbol,
-                data=data
-            )
+            while True:
+                # Fetch the next chunk of results
+                with span('data_query'):
+                    results = db.cursor.fetchmany(server_stream_chunk_rows)
+                if not results:
+                    break
 
-            # Create the response object
-            response = {
-                "data": average_data,
-                "info":  {
-                    "error": 'No record found for given parameters.' if not data else ''}
-            }
+                # Convert the data to a FinancialDataBatch
+                with span('materialization'):
+                    data = FinancialDataBatch.from_rows(results)
+                yield data
 
-            # Send the response
-            self._write_success_response(json.dumps(
-                response,
-                cls=AverageFinancialDataEncoder))
-        # Handle exceptions if occurred
-        except Error as error:
-            self._write_error_response(500, str(error))
-        except ValueError as error:
-            self._write_error_response(400, str(error))
-        except Exception as error:
-            self._write_error_response(500, str(error))
+        # Close the cursor and the database connection
+        finally:
+            db.close_cursor()
+            db.disconnect()
 
-    def _fetch_data_from_db(
+    def _build_data_queries(
             self,
             start_date: date = None,
             end_date: date = None,
             symbol: str = None,
             limit: int = None,
-            page: int = None) -> Tuple[List[FinancialData], int]:
+            page: int = None,
+            after: Tuple[str, date] = None) -> Tuple[str, list, str, list]:
         """
-        Fetches financial data from the database based on the query parameters
+        Constructs the parameterized SQL queries fetching financial data
+        based on the query parameters. The text of the queries only
+        depends on which parameters are provided, so that their
+        prepared statements are reused by the next requests.
 
         Args:
-        - self: the instance of the object calling this method
         - start_date (date): start date of the data to fetch
         - end_date (date): end date of the data to fetch
         - symbol (str): the stock symbol of the data to fetch
         - limit (int): maximum number of records to fetch per page
         - page (int): page number of the records to fetch
+        - after (Tuple[str, date]): (symbol, date) key after which records
+          are fetched, used instead of the page number
 
         Returns:
         A tuple with:
-        - data (List[FinancialData]): a list of FinancialData objects fetched from the database
-        - count (int): total number of records fetched from the database
+        - query_count (str): the query counting all matching records
+        - count_params (list): the parameters of the counting query
+        - query_get (str): the query fetching the requested records
+        - params (list): the parameters of the fetching query
         """
 
-       # Connect to mysql db
-        db = DbConnection()
+        count_params = [value for value in (symbol, start_date, end_date)
+                        if value is not None]
+        params = list(count_params)
 
-        try:
-            # Construct the SQL query based on the query parameters
-            query_count = "SELECT COUNT(*) FROM financial_data"
-            query_get = "SELECT * FROM financial_data"
+        # Seek directly to the primary key following the previous page,
+        # which is the next date when the symbol is fixed
+        if after is not None:
+            if symbol is not None:
+                params.append(after[1])
+            else:
+                params.extend((after[0], after[0], after[1]))
+
+        with_offset = bool(limit) and page is not None
+        if limit:
+            params.append(int(limit))
+            if with_offset:
+                params.append((page - 1) * int(limit))
+
+        (query_count, query_get) = _data_queries(
+            symbol is not None, start_date is not None, end_date is not None,
+            after is not None, bool(limit), with_offset, _available_indexes())
+        return query_count, count_params, query_get, params
+
+    def _fetch_resampled_data_from_db(
+            self,
+            interval: str,
+            start_date: date = None,
+            end_date: date = None,
+            symbol: str = None,
+            limit: int = None,
+            page: int = None) -> Tuple[List[ResampledFinancialData], int]:
+        """
+        Resamples the financial data in the database to one bar per symbol
+        and period, with a single grouped query. The open and close prices
+        of each bar are read back from the primary key of its first and
+        last trading dates.
+
+        Args:
+        - interval (str): the resampling interval, one of RESAMPLE_INTERVALS
+        - start_date (date): start date of the data to resample
+        - end_date (date): end date of the data to resample
+        - symbol (str): the stock symbol of the data to resample
+        - limit (int): maximum number of bars to fetch per page
+        - page (int): page number of the bars to fetch
+
+        Returns:
+        A tuple with:
+        - data (List[ResampledFinancialData]): the bars, ordered by symbol and period
+        - count (int): total number of bars
+        """
+
+        # Get a connection to mysql db from the pool
+        db = DbConnection(pooled=True)
 
+        try:
             conditions = []
+            params = []
             if symbol is not None:
-                conditions.append(f"symbol = '{symbol}'")
+                conditions.append("symbol = %s")
+                params.append(symbol)
 
             if start_date is not None:
-                conditions.append(f"date >= '{start_date}'")
+                conditions.append("date >= %s")
+                params.append(start_date)
 
             if end_date is not None:
-                conditions.append(f"date <= '{end_date}'")
-
-            if conditions:
-                query_get += " WHERE " + " AND ".join(conditions)
-                query_count += " WHERE " + " AND ".join(conditions)
-
+                conditions.append("date <= %s")
+                params.append(end_date)
+
+            where = " WHERE " + " AND ".join(conditions) if conditions else ""
+            buckets = (f"SELECT symbol, {storage_backend.period_expression(interval)} AS period, "
+                       "MIN(date) AS start_date, MAX(date) AS end_date, "
+                       "SUM(volume) AS volume "
+                       f"FROM financial_data{where} GROUP BY symbol, period")
+
+            query_count = f"SELECT COUNT(*) FROM ({buckets}) AS bar"
+            query_get = ("SELECT bar.symbol, opening.date, closing.date, "
+                         "opening.open_price, closing.close_price, bar.volume "
+                         f"FROM ({buckets}) AS bar "
+                         "JOIN financial_data AS opening "
+                         "ON opening.symbol = bar.symbol AND opening.date = bar.start_date "
+                         "JOIN financial_data AS closing "
+                         "ON closing.symbol = bar.symbol AND closing.date = bar.end_date "
+                         "ORDER BY bar.symbol, bar.period")
+            get_params = list(params)
             if limit:
-                offset = (page - 1) * limit
-                query_get += f" LIMIT {limit} OFFSET {offset}"
+                query_get += " LIMIT %s"
+                get_params.append(int(limit))
+                if page is not None:
+                    query_get += " OFFSET %s"
+                    get_params.append((page - 1) * int(limit))
 
             # Open database connection and cursor to execute queries
             db.connect()
             db.open_cursor()
 
             # Execute the count query
-            db.cursor.execute(query_count)
-            # Fetch the result
-            count = db.cursor.fetchone()[0]
+            with span('count_query'):
+                db.cursor.execute(query_count, params)
+                # Fetch the result
+                count = db.cursor.fetchone()[0]
 
             # Execute the data query
-            db.cursor.execute(query_get)
-            # Fetch the results
-            results = db.cursor.fetchall()
-
-            # Convert the data to a list of FinancialData
-            data = []
-            for row in results:
-                item = FinancialData(
-                    row[0], row[1], row[2], row[3], row[4])
-                data.append(item)
+            with span('data_query'):
+                db.cursor.execute(query_get, get_params)
+                rows = db.cursor.fetchall()
+
+            # Convert the results to ResampledFinancialData objects
+            with span('materialization'):
+                data = [ResampledFinancialData(
+                            symbol=symbol,
+                            period=_period_start(interval, first_date),
+                            start_date=first_date,
+                            end_date=last_date,
+                            open_price=open_price,
+                            close_price=close_price,
+                            volume=int(volume))
+                        for (symbol, first_date, last_date,
+                             open_price, close_price, volume) in rows]
 
             return data, count
 
@@ -262,55 +1757,201 @@ class FinancialDataRequestHandler(BaseHTTPRequestHandler):
             db.close_cursor()
             db.disconnect()
 
+    def _fetch_totals_from_db(
+            self,
+            start_date: date,
+            end_date: date,
+            symbol: str) -> Tuple[int, Decimal, Decimal, int]:
+        """
+        Aggregates the financial data of a symbol for a date range
+        in the database with a single query, or with two lookups of
+        the running totals when STATISTICS_SOURCE is `cumulative`.
+
+        Args:
+        - start_date (date): start date of the data to aggregate
+        - end_date (date): end date of the data to aggregate
+        - symbol (str): the stock symbol of the data to aggregate
+
+        Returns:
+        A tuple with:
+        - count (int): number of records in the date range
+        - total_open_price (Decimal): sum of the open prices
+        - total_close_price (Decimal): sum of the close prices
+        - total_volume (int): sum of the volumes
+        """
+
+        # Sum the records of a symbol from its column file if any
+        column_file = _get_column_file(symbol)
+        if column_file is not None:
+            with span('data_query'):
+                return column_file.totals(*column_file.find(start_date, end_date))
+
+        # Get a connection to mysql db from the pool
+        db = DbConnection(pooled=True)
+
+        try:
+            if statistics_source == 'cumulative':
+                db.connect()
+                db.open_cursor()
+                with span('data_query'):
+                    return fetch_cumulative_totals(db, symbol, start_date, end_date)
+
+            # Open database connection
+            db.connect()
+
+            # Execute the aggregation query and fetch the result
+            with span('data_query'):
+                (count, total_open_price, total_close_price,
+                 total_volume) = db.execute_prepared(
+                    TOTALS_QUERY, (symbol, start_date, end_date))[0]
+
+            if not count:
+                return 0, Decimal(0.00), Decimal(0.00), 0
+
+            return (count, to_decimal(total_open_price),
+                    to_decimal(total_close_price), int(total_volume))
+
+        # Close the cursor and the database connection
+        finally:
+            db.close_cursor()
+            db.disconnect()
+
+    def _fetch_totals_by_symbol_from_db(
+            self,
+            start_date: date,
+            end_date: date,
+            symbols: Optional[List[str]]) -> Dict[str, Tuple[int, Decimal, Decimal, int]]:
+        """
+        Aggregates the financial data of several symbols for a date range
+        with a single grouped query, or with the running totals of each
+        symbol on one connection when STATISTICS_SOURCE is `cumulative`.
+
+        Args:
+        - start_date (date): start date of the data to aggregate
+        - end_date (date): end date of the data to aggregate
+        - symbols (List[str]): the stock symbols of the data to aggregate,
+          all symbols when None
+
+        Returns:
+        A dict of (count, total_open_price, total_close_price, total_volume)
+        tuples by symbol, for the symbols having records in the date range.
+        """
+
+        # Get a connection to mysql db from the pool
+        db = DbConnection(pooled=True)
+
+        try:
+            # Open database connection and cursor to execute queries
+            db.connect()
+            db.open_cursor()
+
+            if statistics_source == 'cumulative':
+                with span('data_query'):
+                    if symbols is None:
+                        db.cursor.execute(
+                            "SELECT DISTINCT symbol FROM financial_data_cumulative")
+                        symbols = [symbol for (symbol,) in db.cursor.fetchall()]
+                    totals_by_symbol = {}
+                    for symbol in symbols:
+                        totals = fetch_cumulative_totals(
+                            db, symbol, start_date, end_date)
+                        if totals[0]:
+                            totals_by_symbol[symbol] = totals
+                return totals_by_symbol
+
+            query = _totals_by_symbol_query(
+                len(symbols) if symbols is not None else None, _available_indexes())
+            params = [start_date, end_date] + (symbols or [])
+
+            # Execute the aggregation query
+            with span('data_query'):
+                db.cursor.execute(query, params)
+                rows = db.cursor.fetchall()
+
+            with span('materialization'):
+                return {symbol: (count, to_decimal(total_open_price),
+                                 to_decimal(total_close_price), int(total_volume))
+                        for (symbol, count, total_open_price, total_close_price,
+                             total_volume) in rows}
+
+        # Close the cursor and the database connection
+        finally:
+            db.close_cursor()
+            db.disconnect()
+
+    def _fetch_symbols_data_from_db(
+            self,
+            start_date: date,
+            end_date: date,
+            symbols: Optional[List[str]]) -> FinancialDataBatch:
+        """
+        Fetches the financial data of several symbols for a date range
+        with a single query.
+
+        Args:
+        - start_date (date): start date of the data to fetch
+        - end_date (date): end date of the data to fetch
+        - symbols (List[str]): the stock symbols of the data to fetch,
+          all symbols when None
+
+        Returns:
+        FinancialDataBatch: the records, ordered by symbol and date.
+        """
+
+        # Get a connection to mysql db from the pool
+        db = DbConnection(pooled=True)
+
+        try:
+            query = _symbols_data_query(
+                len(symbols) if symbols is not None else None, _available_indexes())
+            params = [start_date, end_date] + (symbols or [])
+
+            # Open database connection and cursor to execute queries
+            db.connect()
+            db.open_cursor()
+
+            # Execute the data query
+            with span('data_query'):
+                db.cursor.execute(query, params)
+
+            # Fetch the results into columns as they are read
+            with span('materialization'):
+                return FinancialDataBatch.from_rows(db.cursor)
+
+        # Close the cursor and the database connection
+        finally:
+            db.close_cursor()
+            db.disconnect()
+
     def _calculate_average(
             self,
             start_date: date,
             end_date: date,
             symbol: str,
-            data: List[FinancialData]) -> AverageFinancialData:
+            totals: Tuple[int, Decimal, Decimal, int]) -> AverageFinancialData:
         """
         Calculate the average open price, 
-        close price, and volume for a list of FinancialData objects.
+        close price, and volume from the totals of the financial data.
 
         Args:
             start_date (date): Start date of the time period.
             end_date (date): End date of the time period.
             symbol (str): The symbol associated with the financial data.
-            data (List[FinancialData]): A list of FinancialData objects to calculate the averages for.
+            totals (Tuple[int, Decimal, Decimal, int]): Number of records and
+            sums of open price, close price and volume to calculate the averages for.
 
         Returns:
             AverageFinancialData: An object containing the calculated average values.
         """
 
-        if '/' in start_date:
-            start_date = datetime.strptime(start_date, '%Y/%m/%d').date()
-        else:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-
-        if '/' in end_date:
-            end_date = datetime.strptime(end_date, '%Y/%m/%d').date()
-        else:
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-
-        # Check if the list is empty
-        length = len(data)
+        # Check if there is no record
+        (length, total_open_price, total_close_price, total_volume) = totals
         if length == 0:
             return AverageFinancialData(
                 start_date=start_date,
                 end_date=end_date,
                 symbol=symbol)
 
-        # Initialize variables to store total values
-        total_open_price = Decimal(0.00)
-        total_close_price = Decimal(0.00)
-        total_volume = 0
-
-        # Calculate the total values
-        for item in data:
-            total_open_price += item.open_price
-            total_close_price += item.close_price
-            total_volume += item.volume
-
         # Calculate the averages
         avg_open_price = total_open_price / length
         avg_close_price = total_close_price / length
@@ -325,18 +1966,52 @@ class FinancialDataRequestHandler(BaseHTTPRequestHandler):
             average_daily_close_price=avg_close_price,
             average_daily_volume=avg_volume)
 
-    def _write_success_response(self, response: dict):
+    def _write_success_response(self, response: Union[str, bytes], etag: str = None):
         """
         Write success response to the client.
 
         Args:
-        - response (dict): the JSON response to send to the client
+        - response (Union[str, bytes]): the serialized JSON response to send to the client
+        - etag (str): the ETag of the response, if any
+
+        Returns:
+        - None
+        """
+
+        self._write_response(200, response, etag=etag)
+
+    def _write_not_modified_response(self, etag: str):
+        """
+        Tell the client that its copy of the response is still valid,
+        without sending the response again.
+
+        Args:
+        - etag (str): the ETag of the response
 
         Returns:
         - None
         """
 
-        self._write_response(200, response)
+        # Send the ETag of the representation the client has, which has the
+        # suffix of its encoding when the response was compressed. The
+        # uncompressed responses, smaller than SERVER_COMPRESSION_MIN_SIZE,
+        # had the bare ETag
+        encoding = self._accepted_encoding() if server_compression_min_size > 0 else None
+        if encoding is not None:
+            encoded_etag = f'{etag[:-1]}-{encoding}"'
+            if encoded_etag in self.headers.get('If-None-Match', ''):
+                etag = encoded_etag
+
+        with span('write'):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            if server_compression_min_size > 0:
+                self.send_header('Vary', 'Accept-Encoding')
+            if getattr(self.server, 'draining', False):
+                # Let the client reconnect elsewhere while shutting down
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+            self.end_headers()
 
     def _write_error_response(self, status: int, error: str):
         """
@@ -357,47 +2032,401 @@ class FinancialDataRequestHandler(BaseHTTPRequestHandler):
         }
         self._write_response(status, json.dumps(response))
 
-    def _write_response(self, status: int, response: dict):
+    def _write_response(self, status: int, response: Union[str, bytes],
+                        content_type: str = 'application/json', etag: str = None):
         """
-        Write response to the client.
+        Write response to the client, compressed when the client accepts
+        it and the body is at least SERVER_COMPRESSION_MIN_SIZE bytes.
 
         Args:
         - status (int): the HTTP status code to send to the client
-        - response (dict): the JSON response to send to the client
+        - response (Union[str, bytes]): the serialized response to send to the client
+        - content_type (str): the media type of the response
+        - etag (str): the ETag of the response, if any
 
         Returns:
         - None
         """
 
-        self.send_response(status)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(response.encode())
+        body = response if isinstance(response, bytes) else response.encode()
+
+        # Compress the body with the encoding preferred by the client
+        encoding = None
+        if 0 < server_compression_min_size <= len(body):
+            encoding = self._accepted_encoding()
+            if encoding is not None:
+                with span('compression'):
+                    body = _compress(body, encoding)
+
+        with span('write'):
+            self.send_response(status)
+            self.send_header('Content-type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            if server_compression_min_size > 0:
+                self.send_header('Vary', 'Accept-Encoding')
+            if encoding is not None:
+                self.send_header('Content-Encoding', encoding)
+            if etag is not None:
+                # Each encoding of the response is a different representation
+                self.send_header(
+                    'ETag', etag if encoding is None else f'{etag[:-1]}-{encoding}"')
+            if getattr(self.server, 'draining', False):
+                # Let the client reconnect elsewhere while shutting down
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+            self.end_headers()
+            self.wfile.write(body)
+
+    def _accepted_encoding(self) -> Optional[str]:
+        """
+        Negotiate the content encoding of the response
+        from the `Accept-Encoding` header of the request.
 
+        Returns:
+        - str: `gzip` or `deflate`, None when the client accepts neither
+        """
 
-def main():
+        # Quality value of each accepted encoding
+        accepted = {}
+        for part in self.headers.get('Accept-Encoding', '').split(','):
+            (coding, _, parameters) = part.partition(';')
+            quality = 1.0
+            parameters = parameters.strip()
+            if parameters.startswith('q='):
+                try:
+                    quality = float(parameters[2:])
+                except ValueError:
+                    quality = 0.0
+            if coding.strip():
+                accepted[coding.strip().lower()] = quality
+
+        # Prefer gzip when both are accepted with the same quality
+        default = accepted.get('*', 0.0)
+        (quality, encoding) = max((accepted.get('gzip', default), 'gzip'),
+                                  (accepted.get('deflate', default), 'deflate'),
+                                  key=lambda choice: choice[0])
+        return encoding if quality > 0 else None
+
+
+class SingleRequestHandler(FinancialDataRequestHandler):
+    """
+    Request handler of the `single` mode, which closes each connection
+    after its request, as a keep-alive connection would block every
+    other client.
     """
-    Starts a HTTP server on port 5000 and serves requests indefinitely.
 
-    Raises:
-        KeyboardInterrupt: When user interrupts the process using `Ctrl-C`.
+    protocol_version = 'HTTP/1.0'
+
+
+class PooledHTTPServer(HTTPServer):
     """
+    HTTP server handling each request in a bounded pool of worker threads.
 
-    try:
-        # Define the server address and port
-        server_address = ('', 5000)
+    Between two requests, keep-alive connections are parked in a selector
+    instead of holding a worker thread: a connection is handed over to a
+    worker again only when its next request arrives, and closed when it
+    stays idle longer than the handler timeout.
+    """
+
+    def __init__(self, server_address, RequestHandlerClass, workers: int,
+                 bind_and_activate: bool = True):
+        """
+        Initialize a PooledHTTPServer instance.
 
-        # Create a new instance of HTTPServer
-        httpd = HTTPServer(server_address, FinancialDataRequestHandler)
-        print('Server started on port 5000...')
+        Args:
+            server_address (Tuple[str, int]): The address to listen on.
+            RequestHandlerClass (type): The request handler class.
+            workers (int): Maximum number of requests handled concurrently.
+            bind_and_activate (bool): Whether to listen on the address
+                right away.
+        """
 
-        # Start serving the requests indefinitely
-        httpd.serve_forever()
+        super().__init__(server_address, RequestHandlerClass, bind_and_activate)
+        self.draining = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix='http-worker')
+
+        # Connections waiting for their next request, registered by the
+        # poller thread, which worker threads wake up to park connections
+        self._parked_selector = selectors.DefaultSelector()
+        self._parked_lock = threading.Lock()
+        self._pending_parked = []
+        (self._wakeup_reader, self._wakeup_writer) = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._parked_selector.register(self._wakeup_reader, selectors.EVENT_READ)
+        self._poller = threading.Thread(
+            target=self._poll_parked_connections, name='http-keepalive', daemon=True)
+        self._poller.start()
+
+    def process_request(self, request, client_address):
+        """
+        Hands the first request of an accepted connection over to a worker thread.
+        """
+
+        # The handler is set up by the worker and kept for the next requests
+        handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+        handler.request = request
+        handler.client_address = client_address
+        handler.server = self
+        self._submit(handler)
+
+    def _submit(self, handler):
+        """
+        Hands the next request of a connection over to a worker thread.
+        """
+
+        try:
+            self._executor.submit(self._handle_requests_thread, handler)
+        except RuntimeError:
+            # The pool is shut down, the server is closing
+            self._close_connection(handler)
+
+    def _handle_requests_thread(self, handler):
+        """
+        Handles the requests of a connection in a worker thread, as long as
+        they are already received, then parks the connection.
+        """
+
+        try:
+            if not hasattr(handler, 'rfile'):
+                handler.setup()
+            while True:
+                handler.close_connection = True
+                handler.handle_one_request()
+                if handler.close_connection or self.draining:
+                    break
+                if not self._has_buffered_request(handler):
+                    self._park(handler)
+                    return
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+        self._close_connection(handler)
+
+    def _has_buffered_request(self, handler) -> bool:
+        """
+        Returns whether the next request of a connection is already
+        received, without waiting for it.
+        """
+
+        try:
+            handler.connection.settimeout(0)
+            try:
+                return bool(handler.rfile.peek(1))
+            finally:
+                handler.connection.settimeout(handler.timeout)
+        except OSError:
+            # The error is reported when the request is read
+            return True
+
+    def _park(self, handler):
+        """
+        Waits for the next request of a connection without a worker thread.
+        """
+
+        with self._parked_lock:
+            if not self.draining:
+                self._pending_parked.append(handler)
+                handler = None
+        if handler is not None:
+            self._close_connection(handler)
+            return
+        self._wakeup_writer.send(b'\0')
+
+    def _poll_parked_connections(self):
+        """
+        Hands parked connections over to worker threads when their next
+        request arrives, and closes the ones idle for too long.
+        """
+
+        selector = self._parked_selector
+        while True:
+            with self._parked_lock:
+                (pending, self._pending_parked) = (self._pending_parked, [])
+                draining = self.draining
+            now = time.monotonic()
+            for handler in pending:
+                selector.register(handler.connection, selectors.EVENT_READ, (handler, now))
+
+            if draining:
+                break
+
+            for (key, _) in selector.select(timeout=1.0):
+                if key.fileobj is self._wakeup_reader:
+                    try:
+                        self._wakeup_reader.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                selector.unregister(key.fileobj)
+                self._submit(key.data[0])
+
+            # Close the connections idle for longer than the handler timeout
+            now = time.monotonic()
+            for key in list(selector.get_map().values()):
+                if key.data is None:
+                    continue
+                (handler, parked_at) = key.data
+                if handler.timeout is not None and now - parked_at > handler.timeout:
+                    selector.unregister(key.fileobj)
+                    self._close_connection(handler)
+
+        # Close the parked connections on shutdown
+        for key in list(selector.get_map().values()):
+            if key.data is not None:
+                selector.unregister(key.fileobj)
+                self._close_connection(key.data[0])
+
+    def _close_connection(self, handler):
+        """
+        Flushes and closes a connection.
+        """
+
+        try:
+            if hasattr(handler, 'rfile'):
+                handler.finish()
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(handler.request)
+
+    def server_close(self):
+        """
+        Stops listening, closes idle keep-alive connections
+        and waits for in-flight requests to complete.
+        """
+
+        with self._parked_lock:
+            self.draining = True
+        self._wakeup_writer.send(b'\0')
+        self._poller.join()
+        super().server_close()
+        self._executor.shutdown(wait=True)
+        self._parked_selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+
+
+def create_server(mode: str = server_mode,
+                  port: int = server_port,
+                  workers: int = server_workers,
+                  listen_socket: socket.socket = None) -> HTTPServer:
+    """
+    Creates the HTTP server for the requested serving mode.
+
+    Args:
+        mode (str): `single` to handle one request at a time,
+            or `threaded` to handle connections in a pool of threads.
+        port (int): The port to listen on.
+        workers (int): Number of worker threads of the `threaded` mode.
+        listen_socket (socket.socket): An already listening socket to
+            serve from instead of listening on `port`, eg: the socket
+            shared by the worker processes of the `prefork` mode.
+
+    Returns:
+        HTTPServer: The server instance, not yet serving.
+    """
+
+    server_address = ('', port)
+    bind_and_activate = listen_socket is None
+
+    if mode == 'single':
+        httpd = HTTPServer(server_address, SingleRequestHandler,
+                           bind_and_activate)
+    elif mode == 'threaded':
+        httpd = PooledHTTPServer(
+            server_address, FinancialDataRequestHandler, workers,
+            bind_and_activate)
+    else:
+        raise ValueError(f"Unsupported server mode: {mode}")
+
+    if listen_socket is not None:
+        # Serve from the given socket instead of the unbound one
+        httpd.socket.close()
+        httpd.socket = listen_socket
+        (host, httpd.server_port) = listen_socket.getsockname()[:2]
+        httpd.server_address = (host, httpd.server_port)
+        httpd.server_name = socket.getfqdn(host)
+    return httpd
+
+
+def _serve_until_shutdown(httpd: HTTPServer):
+    """
+    Serves requests until `Ctrl-C` or SIGTERM, then stops accepting new
+    connections and drains in-flight requests.
+
+    Args:
+        httpd (HTTPServer): The server to run.
+
+    Returns:
+        None
+    """
+
+    def request_shutdown(signum, frame):
+        # shutdown() waits for serve_forever() to return,
+        # so it can not be called from the serving thread
+        threading.Thread(target=httpd.shutdown).start()
 
+    signal.signal(signal.SIGTERM, request_shutdown)
+
+    try:
+        # Start serving the requests until shutdown is requested
+        httpd.serve_forever()
     except KeyboardInterrupt:
-        # Stop the server on Ctrl-C
+        pass
+    finally:
+        # Stop the server and drain in-flight requests
         httpd.server_close()
+
+
+def _serve_worker(listen_socket: socket.socket):
+    """
+    Serves requests in a worker process of the `prefork` mode,
+    with a pool of threads of its own.
+
+    Args:
+        listen_socket (socket.socket): The socket shared by the workers.
+
+    Returns:
+        None
+    """
+
+    _serve_until_shutdown(create_server(
+        'threaded', workers=server_workers, listen_socket=listen_socket))
+
+
+def main():
+    """
+    Starts a HTTP server on SERVER_PORT (default to 5000)
+    and serves requests indefinitely. On `Ctrl-C` or SIGTERM, the server stops accepting new connections
+    and drains in-flight requests before exiting.
+
+    In `prefork` mode, SERVER_PROCESSES worker processes (default to the
+    number of CPUs) serve from the same socket, each with SERVER_WORKERS
+    threads and its own database connection pool.
+
+    Raises:
+        KeyboardInterrupt: When user interrupts the process using `Ctrl-C`.
+    """
+
+    if server_mode == 'prefork':
+        processes = server_processes or os.cpu_count() or 1
+        supervisor = PreforkSupervisor(
+            create_listening_socket(server_port), processes, _serve_worker)
+        print(f'Server started on port {server_port} '
+              f'(prefork mode, {processes} processes of {server_workers} workers)...',
+              flush=True)
+        supervisor.run()
         print('Server stopped.')
+        return
+
+    # Create a new instance of HTTP server for the configured mode
+    httpd = create_server()
+    print(f'Server started on port {server_port} '
+          f'({server_mode} mode, {server_workers} workers)...')
+
+    _serve_until_shutdown(httpd)
+    print('Server stopped.')
 
 
 if __name__ == '__main__':
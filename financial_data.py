@@ -1,5 +1,7 @@
+from array import array
 from datetime import date
 from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Tuple
 import json
 
 
@@ -9,6 +11,9 @@ class FinancialData:
       given stock symbol on a specific date.
       """
 
+    # No per-instance __dict__, as many of them are created per request
+    __slots__ = ('symbol', 'date', 'open_price', 'close_price', 'volume')
+
     def __init__(
             self,
             symbol: str,
@@ -33,6 +38,223 @@ class FinancialData:
         self.volume = volume
 
 
+class FinancialDataBatch:
+    """
+    Represents a list of financial data in a columnar layout: one compact
+    array per field instead of one object per row. Dates are stored as
+    ordinals and prices as integer cents, which is exact for the
+    2 decimal places stored in database.
+    """
+
+    __slots__ = ('symbols', 'dates', 'open_prices', 'close_prices', 'volumes')
+
+    def __init__(self):
+        """
+        Initializes a new empty instance of the FinancialDataBatch class.
+        """
+        self.symbols = []
+        self.dates = array('i')
+        self.open_prices = array('q')
+        self.close_prices = array('q')
+        self.volumes = array('q')
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> 'FinancialDataBatch':
+        """
+        Creates a batch from (symbol, date, open_price, close_price, volume)
+        rows, such as the rows of a database cursor.
+
+        :param rows: The rows to store in the batch.
+        :return: The FinancialDataBatch instance.
+        """
+        batch = cls()
+        for row in rows:
+            batch.append(row[0], row[1], row[2], row[3], row[4])
+        return batch
+
+    def append(
+            self,
+            symbol: str,
+            date: date,
+            open_price: Decimal,
+            close_price: Decimal,
+            volume: int):
+        """
+        Appends the financial data of a symbol on a date to the batch.
+        """
+        # Consecutive rows usually share the same symbol object
+        if self.symbols and self.symbols[-1] == symbol:
+            symbol = self.symbols[-1]
+        self.symbols.append(symbol)
+        self.dates.append(date.toordinal())
+        self.open_prices.append(int(open_price * 100))
+        self.close_prices.append(int(close_price * 100))
+        self.volumes.append(int(volume))
+
+    def totals(self) -> Tuple[int, Decimal, Decimal, int]:
+        """
+        Sums the columns of the batch.
+
+        :return: A tuple with the number of rows and the sums of
+            open prices, close prices and volumes.
+        """
+        return (len(self.dates),
+                Decimal(sum(self.open_prices)).scaleb(-2),
+                Decimal(sum(self.close_prices)).scaleb(-2),
+                sum(self.volumes))
+
+    def group_by_symbol(self) -> Dict[str, 'FinancialDataBatch']:
+        """
+        Splits a batch ordered by symbol into one batch per symbol.
+
+        :return: The batches keyed by symbol, in the order of the rows.
+        """
+        groups = {}
+        start = 0
+        for index in range(1, len(self.symbols) + 1):
+            if index == len(self.symbols) or self.symbols[index] != self.symbols[start]:
+                groups[self.symbols[start]] = self[start:index]
+                start = index
+        return groups
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __getitem__(self, index):
+        """
+        Returns the FinancialData at an index,
+        or a new batch for a slice.
+        """
+        if isinstance(index, slice):
+            batch = FinancialDataBatch()
+            batch.symbols = self.symbols[index]
+            batch.dates = self.dates[index]
+            batch.open_prices = self.open_prices[index]
+            batch.close_prices = self.close_prices[index]
+            batch.volumes = self.volumes[index]
+            return batch
+
+        return FinancialData(
+            self.symbols[index],
+            date.fromordinal(self.dates[index]),
+            Decimal(self.open_prices[index]).scaleb(-2),
+            Decimal(self.close_prices[index]).scaleb(-2),
+            self.volumes[index])
+
+    def __iter__(self) -> Iterator[FinancialData]:
+        for index in range(len(self.dates)):
+            yield self[index]
+
+
+def _format_cents(cents: int) -> str:
+    """
+    Formats an amount of cents as a decimal string with 2 places,
+    like str() of the Decimal read from database.
+    """
+    return f"{cents // 100}.{cents % 100:02d}" if cents >= 0 else f"-{_format_cents(-cents)}"
+
+
+# JSON object of a row, with the separators used by json.dumps
+_JSON_ROW_TEMPLATE = ('{"symbol": %s, "date": "%s", "open_price": "%s", '
+                      '"close_price": "%s", "volume": %d}')
+_JSON_ROW_TEMPLATE_CENTS = ('{"symbol": %s, "date": "%s", "open_price": "%d.%02d", '
+                            '"close_price": "%d.%02d", "volume": %d}')
+
+
+def _json_rows(batch: FinancialDataBatch) -> List[str]:
+    """
+    Returns the JSON object of each row of a batch, formatted exactly
+    like FinancialDataEncoder does, without intermediate dictionaries.
+    """
+    rows = []
+    append = rows.append
+    symbols_json = {}
+    dates_json = {}
+    for symbol, day, open_price, close_price, volume in zip(
+            batch.symbols, batch.dates, batch.open_prices,
+            batch.close_prices, batch.volumes):
+        symbol_json = symbols_json.get(symbol)
+        if symbol_json is None:
+            symbol_json = symbols_json[symbol] = json.dumps(symbol)
+        date_json = dates_json.get(day)
+        if date_json is None:
+            date_json = dates_json[day] = date.fromordinal(day).isoformat()
+
+        if open_price >= 0 and close_price >= 0:
+            append(_JSON_ROW_TEMPLATE_CENTS % (
+                symbol_json, date_json,
+                open_price // 100, open_price % 100,
+                close_price // 100, close_price % 100,
+                volume))
+        else:
+            append(_JSON_ROW_TEMPLATE % (
+                symbol_json, date_json,
+                _format_cents(open_price), _format_cents(close_price),
+                volume))
+    return rows
+
+
+def dump_financial_data(batch: FinancialDataBatch) -> bytes:
+    """
+    Serializes a batch to a JSON array, byte-identical to
+    `json.dumps(list(batch), cls=FinancialDataEncoder).encode()`.
+
+    :param batch: The financial data to serialize.
+    :return: The JSON array as bytes.
+    """
+    return ("[" + ", ".join(_json_rows(batch)) + "]").encode()
+
+
+def dump_financial_data_lines(batch: FinancialDataBatch) -> bytes:
+    """
+    Serializes a batch to newline delimited JSON, one object per row.
+
+    :param batch: The financial data to serialize.
+    :return: The JSON lines as bytes.
+    """
+    return "".join([row + "\n" for row in _json_rows(batch)]).encode()
+
+
+# Header row of the CSV serialization
+FINANCIAL_DATA_CSV_HEADER = b"symbol,date,open_price,close_price,volume\n"
+
+
+def _csv_field(value: str) -> str:
+    """
+    Quotes a CSV field when it contains a separator, quote or line break.
+    """
+    if any(char in value for char in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def dump_financial_data_csv(batch: FinancialDataBatch) -> bytes:
+    """
+    Serializes a batch to CSV rows, without header row,
+    in the columns of FINANCIAL_DATA_CSV_HEADER.
+
+    :param batch: The financial data to serialize.
+    :return: The CSV rows as bytes.
+    """
+    rows = []
+    append = rows.append
+    symbols_csv = {}
+    dates_csv = {}
+    for symbol, day, open_price, close_price, volume in zip(
+            batch.symbols, batch.dates, batch.open_prices,
+            batch.close_prices, batch.volumes):
+        symbol_csv = symbols_csv.get(symbol)
+        if symbol_csv is None:
+            symbol_csv = symbols_csv[symbol] = _csv_field(symbol)
+        date_csv = dates_csv.get(day)
+        if date_csv is None:
+            date_csv = dates_csv[day] = date.fromordinal(day).isoformat()
+
+        append(f"{symbol_csv},{date_csv},{_format_cents(open_price)},"
+               f"{_format_cents(close_price)},{volume}\n")
+    return "".join(rows).encode()
+
+
 class FinancialDataEncoder(json.JSONEncoder):
     """
     A custom JSON encoder that serializes FinancialData objects to JSON.
@@ -58,6 +280,22 @@ class FinancialDataEncoder(json.JSONEncoder):
                 "close_price": str(obj.close_price),
                 "volume": int(obj.volume),
             }
+        elif isinstance(obj, FinancialDataBatch):
+            # Serialize the batch like a list of FinancialData,
+            # straight from its columns
+            fromordinal = date.fromordinal
+            return [
+                {
+                    "symbol": symbol,
+                    "date": fromordinal(day).isoformat(),
+                    "open_price": _format_cents(open_price),
+                    "close_price": _format_cents(close_price),
+                    "volume": volume,
+                }
+                for symbol, day, open_price, close_price, volume in zip(
+                    obj.symbols, obj.dates, obj.open_prices,
+                    obj.close_prices, obj.volumes)
+            ]
         elif isinstance(obj, Decimal):
             # Serialize Decimal objects to strings
             return str(obj)
@@ -0,0 +1,213 @@
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional, Tuple
+import math
+import numpy as np
+from financial_data import FinancialDataBatch, _format_cents
+
+# Metrics which can be requested, with the ones accepting a window
+SUPPORTED_METRICS = ('min', 'max', 'stddev', 'vwap',
+                     'returns', 'volatility', 'sma', 'ema')
+WINDOWED_METRICS = ('sma', 'ema')
+DEFAULT_WINDOW = 20
+
+# Number of trading days used to annualize the volatility
+TRADING_DAYS_PER_YEAR = 252
+
+# Number of decimal places of the floating point metrics
+FLOAT_DIGITS = 6
+
+
+def parse_metrics(value: str) -> List[Tuple[str, Optional[int]]]:
+    """
+    Parses the `metrics` query parameter, a comma separated list of
+    metric names where moving averages accept a window, eg: `min,max,sma:20`.
+
+    Args:
+        value (str): The metrics requested by the user.
+
+    Returns:
+        A list of (name, window) tuples, window being None
+        for metrics without window.
+
+    Raises:
+        ValueError: When a metric or a window is not supported.
+    """
+
+    metrics = []
+    for spec in value.split(','):
+        name, _, window = spec.strip().partition(':')
+        if name not in SUPPORTED_METRICS:
+            raise ValueError(f"Unsupported metric: {name}")
+
+        if name in WINDOWED_METRICS:
+            window = int(window) if window else DEFAULT_WINDOW
+            if window < 1:
+                raise ValueError(f"Invalid window for metric {name}: {window}")
+        elif window:
+            raise ValueError(f"Metric {name} does not accept a window")
+        else:
+            window = None
+
+        if (name, window) not in metrics:
+            metrics.append((name, window))
+    return metrics
+
+
+def compute_metrics(
+        batch: FinancialDataBatch,
+        metrics: List[Tuple[str, Optional[int]]]) -> dict:
+    """
+    Computes the requested metrics over the financial data of a symbol,
+    ordered by date. Floating point metrics are vectorized with NumPy
+    over the columns of the batch, while prices which must be exact
+    (min, max and VWAP) are computed with integers and Decimal.
+
+    Args:
+        batch (FinancialDataBatch): The financial data of a single symbol.
+        metrics (List[Tuple[str, Optional[int]]]): The metrics to compute,
+            as returned by parse_metrics().
+
+    Returns:
+        dict: The value of each metric, keyed by metric name
+        (suffixed by the window for moving averages).
+    """
+
+    # Zero-copy views of the columns
+    open_prices = np.frombuffer(batch.open_prices, dtype=np.int64)
+    close_prices = np.frombuffer(batch.close_prices, dtype=np.int64)
+    volumes = np.frombuffer(batch.volumes, dtype=np.int64)
+    dates = [date.fromordinal(day).isoformat() for day in batch.dates]
+
+    results = {}
+    for (name, window) in metrics:
+        if name == 'min':
+            results[name] = _extremes(batch, min)
+        elif name == 'max':
+            results[name] = _extremes(batch, max)
+        elif name == 'stddev':
+            results[name] = _stddev(open_prices, close_prices, volumes)
+        elif name == 'vwap':
+            results[name] = _vwap(batch)
+        elif name == 'returns':
+            returns = _daily_returns(close_prices)
+            results[name] = [{"date": day, "return": _round(value)}
+                             for day, value in zip(dates[1:], returns.tolist())]
+        elif name == 'volatility':
+            results[name] = _volatility(_daily_returns(close_prices))
+        elif name == 'sma':
+            values = _simple_moving_average(close_prices / 100, window)
+            results[f"sma_{window}"] = [
+                {"date": day, "value": _round(value)}
+                for day, value in zip(dates[window - 1:], values.tolist())]
+        elif name == 'ema':
+            values = _exponential_moving_average(close_prices / 100, window)
+            results[f"ema_{window}"] = [
+                {"date": day, "value": _round(value)}
+                for day, value in zip(dates, values)]
+
+    return results
+
+
+def _round(value: float) -> Optional[float]:
+    """
+    Rounds a floating point metric, mapping NaN and infinity to None (JSON null).
+    """
+
+    return round(value, FLOAT_DIGITS) if math.isfinite(value) else None
+
+
+def _extremes(batch: FinancialDataBatch, function) -> Optional[dict]:
+    """
+    Computes the minimum or maximum of prices and volume, exactly.
+    """
+
+    if not len(batch):
+        return None
+    return {
+        "open_price": _format_cents(function(batch.open_prices)),
+        "close_price": _format_cents(function(batch.close_prices)),
+        "volume": function(batch.volumes),
+    }
+
+
+def _stddev(open_prices: np.ndarray,
+            close_prices: np.ndarray,
+            volumes: np.ndarray) -> Optional[dict]:
+    """
+    Computes the population standard deviation of prices and volume.
+    """
+
+    if not len(close_prices):
+        return None
+    return {
+        "open_price": _round(float(np.std(open_prices / 100))),
+        "close_price": _round(float(np.std(close_prices / 100))),
+        "volume": _round(float(np.std(volumes.astype(np.float64)))),
+    }
+
+
+def _vwap(batch: FinancialDataBatch) -> Optional[str]:
+    """
+    Computes the volume weighted average close price. Products are summed
+    with Python integers, which can not overflow unlike int64, and the
+    division is done with Decimal.
+    """
+
+    total_volume = sum(batch.volumes)
+    if not total_volume:
+        return None
+    total_value = sum(map(int.__mul__, batch.close_prices, batch.volumes))
+    return _format_cents(int((Decimal(total_value) / total_volume).to_integral_value()))
+
+
+def _daily_returns(close_prices: np.ndarray) -> np.ndarray:
+    """
+    Computes the simple returns between consecutive close prices.
+    """
+
+    if len(close_prices) < 2:
+        return np.empty(0)
+    return close_prices[1:] / close_prices[:-1] - 1
+
+
+def _volatility(returns: np.ndarray) -> Optional[dict]:
+    """
+    Computes the sample standard deviation of daily returns,
+    and its annualized value.
+    """
+
+    if len(returns) < 2:
+        return None
+    daily = float(np.std(returns, ddof=1))
+    return {
+        "daily": _round(daily),
+        "annualized": _round(daily * math.sqrt(TRADING_DAYS_PER_YEAR)),
+    }
+
+
+def _simple_moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Computes the moving average of each full window, from cumulative sums.
+    """
+
+    if len(values) < window:
+        return np.empty(0)
+    sums = np.cumsum(np.insert(values, 0, 0.0))
+    return (sums[window:] - sums[:-window]) / window
+
+
+def _exponential_moving_average(values: np.ndarray, window: int) -> List[float]:
+    """
+    Computes the exponential moving average with a smoothing factor of
+    2 / (window + 1), seeded with the first value. Each value depends on
+    the previous one, so it is computed sequentially.
+    """
+
+    alpha = 2 / (window + 1)
+    averages = []
+    average = None
+    for value in values.tolist():
+        average = value if average is None else average + alpha * (value - average)
+        averages.append(average)
+    return averages
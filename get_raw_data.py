@@ -1,13 +1,24 @@
-from typing import List
+from typing import Dict, List, Tuple
 import sys
 from dotenv import load_dotenv
 import os
 import requests
 import json
-from datetime import datetime, date, timedelta
-import mysql.connector
-from db_connection import DbConnection
+import csv
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from db_connection import DatabaseError, DbConnection, get_pool, storage_backend
+from cumulative_data import update_cumulative_data
+from column_store import export_column_files
 from financial_data import FinancialData
+from timeseries_stream import TimeSeriesStream
+from metrics import (ingest_batch_duration, ingest_fetch_duration, ingest_last_run,
+                     ingest_registry, ingest_rows_upserted)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,6 +32,33 @@ api_symbols = os.getenv('API_SYMBOLS')
 api_open_price_keyname = os.getenv('API_OPEN_PRICE_KEYNAME')
 api_close_price_keyname = os.getenv('API_CLOSE_PRICE_KEYNAME')
 api_volume_keyname = os.getenv('API_VOLUME_KEYNAME')
+api_workers = int(os.getenv('API_WORKERS', '1'))
+api_max_requests_per_minute = int(
+    os.getenv('API_MAX_REQUESTS_PER_MINUTE', '5'))
+api_incremental = os.getenv('API_INCREMENTAL', 'false').lower() in ('1', 'true', 'yes')
+api_compact_max_days = int(os.getenv('API_COMPACT_MAX_DAYS', '100'))
+
+# read DATABASE write configurations
+database_insert_batch_size = int(
+    os.getenv('DATABASE_INSERT_BATCH_SIZE', '1000'))
+database_load_data_min_rows = int(
+    os.getenv('DATABASE_LOAD_DATA_MIN_ROWS', '0'))
+
+# read STATISTICS configurations, the running totals are only
+# maintained when the API reads them
+statistics_source = os.getenv('STATISTICS_SOURCE', 'aggregate')
+
+# read COLUMN STORE configurations
+column_store_dir = os.getenv('COLUMN_STORE_DIR', '')
+
+# read METRICS configurations
+metrics_ingest_file = os.getenv('METRICS_INGEST_FILE', '')
+
+# Size of the chunks the API responses are read and parsed by
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+# FinancialData fields by value key of the API responses, see _value_field
+_value_fields: Dict[str, str] = {}
 
 # Set start and end date to retrieve data from external api
 today_date = date.today()
@@ -28,79 +66,452 @@ start_date = today_date - timedelta(days=int(api_load_period))
 end_date = today_date
 
 
+class RateLimiter:
+    """
+    Thread-safe sliding window rate limiter used to stay
+    within the request quota of the external API.
+    """
+
+    def __init__(self, max_calls: int, period: float = 60.0):
+        """
+        Initialize a RateLimiter instance.
+
+        :param max_calls: Maximum number of calls allowed within the period.
+            A value lower than 1 disables the limiter.
+        :param period: Length of the sliding window in seconds.
+        """
+
+        self.max_calls = max_calls
+        self.period = period
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a call is allowed by the rate limit
+        and then records it.
+        """
+
+        if self.max_calls < 1:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+
+                # Forget the calls which are out of the sliding window
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+
+                wait = self.period - (now - self._calls[0])
+
+            time.sleep(wait)
+
+
+rate_limiter = RateLimiter(api_max_requests_per_minute)
+
+
 def main():
     """
     This function retrieves stock market data using an external API,
     processes the data,
     and saves the processed data into a MySQL database.
+
+    When API_WORKERS is greater than 1, the symbols are fetched
+    concurrently by a pool of worker threads while the main thread
+    saves the already processed symbols into database.
     """
 
     symbols = api_symbols.split(",")
 
-    for symbol in symbols:
-        # Create url for API request for given stock symbol
-        url = f'{api_url}&symbol={symbol}&apikey={api_key}'
+    if api_workers > 1:
+        _ingest_concurrently(symbols, api_workers)
+    else:
+        for symbol in symbols:
+            # Get and process timeseries data for given stock symbol
+            processed_data = _fetch_symbol_data(symbol)
+
+            # Save processed items into mysql db
+            _save_items_into_db(processed_data)
+
+    print("Database connection pool:", get_pool().stats())
+
+    # Publish the metrics of this run for the API /metrics endpoint
+    if metrics_ingest_file:
+        ingest_last_run.set(time.time())
+        ingest_registry.write(metrics_ingest_file)
+
+
+def _ingest_concurrently(symbols: List[str], workers: int):
+    """
+    Fetches symbols in parallel and saves each of them into
+    database as soon as its data is available, so that
+    HTTP requests overlap with database writes.
+
+    Args:
+        symbols (List[str]): The stock symbols to ingest.
+        workers (int): Number of worker threads fetching data.
+
+    Returns:
+        None.
+    """
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_fetch_symbol_data, symbol)
+                   for symbol in symbols]
+
+        try:
+            for future in as_completed(futures):
+                # Save processed items into mysql db
+                # (re-raises any error occurred in worker thread)
+                _save_items_into_db(future.result())
+        except BaseException:
+            # Do not start pending requests when ingestion failed
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def _fetch_symbol_data(symbol: str) -> List:
+    """
+    Requests external API for given stock symbol
+    and processes its timeseries data.
+
+    In incremental mode, only the rows which are new or differ
+    from the ones already stored in database are returned.
+
+    Args:
+        symbol (str): The stock symbol to fetch.
+
+    Returns:
+        A list of financial data objects for given symbol.
+    """
+
+    if api_incremental:
+        return _fetch_symbol_delta(symbol)
+
+    # Create url for API request for given stock symbol
+    url = f'{api_url}&symbol={symbol}&apikey={api_key}'
+
+    # Wait for our turn to respect the API rate limit
+    rate_limiter.acquire()
+
+    # Get response from give url. The body is streamed, so the fetch
+    # is only over once its timeseries data is read
+    started_at = time.perf_counter()
+    response = _get_response(url)
+
+    # Get timeseries data from response,
+    # filter it for a specific range (default to latest 14 days)
+    # and process to prepare final result
+    items = _load_and_process_timeseries_data(
+        symbol,
+        response)
+    ingest_fetch_duration.observe(time.perf_counter() - started_at)
+    return items
+
+
+def _fetch_symbol_delta(symbol: str) -> List:
+    """
+    Requests external API for given stock symbol and returns the rows
+    which are not already stored in database.
+
+    Rows are fetched from the start of the load period, or from the
+    high-water mark (latest date stored) when it is older, so that
+    missed days are caught up. The compact output of the API is
+    requested when this range is short enough.
+
+    Args:
+        symbol (str): The stock symbol to fetch.
+
+    Returns:
+        A list of new or changed financial data objects for given symbol.
+    """
+
+    # Get what is already stored for this symbol
+    (high_water_mark, stored) = _load_stored_rows(symbol, start_date)
+
+    since = start_date
+    if high_water_mark is not None and high_water_mark < start_date:
+        since = high_water_mark
+        stored.update(_load_stored_rows(symbol, since)[1])
+
+    # The compact output only contains the latest 100 data points
+    output_size = 'compact' if (end_date - since).days <= api_compact_max_days else 'full'
+
+    # Create url for API request for given stock symbol
+    url = f'{api_url}&symbol={symbol}&outputsize={output_size}&apikey={api_key}'
+
+    # Wait for our turn to respect the API rate limit
+    rate_limiter.acquire()
+
+    # Get response from give url. The body is streamed, so the fetch
+    # is only over once its timeseries data is read
+    started_at = time.perf_counter()
+    response = _get_response(url)
+
+    # Get timeseries data from response for the range to update
+    items = _load_and_process_timeseries_data(symbol, response, since)
+    ingest_fetch_duration.observe(time.perf_counter() - started_at)
+
+    # Keep only the rows which differ from the stored ones
+    delta = [item for item in items
+             if stored.get(item.date) != _normalize_row(item)]
+
+    print(f"{symbol}: {len(delta)} of {len(items)} rows to save "
+          f"(high-water mark {high_water_mark}, outputsize={output_size})")
+    return delta
+
+
+def _normalize_row(item: FinancialData) -> Tuple[Decimal, Decimal, int]:
+    """
+    Converts the values of an API row to the values stored
+    in database, which keeps prices with 2 decimal places.
+
+    Args:
+        item (FinancialData): The financial data parsed from API response.
+
+    Returns:
+        A tuple with open_price, close_price and volume as stored.
+    """
+
+    cent = Decimal('0.01')
+    return (Decimal(item.open_price).quantize(cent, ROUND_HALF_UP),
+            Decimal(item.close_price).quantize(cent, ROUND_HALF_UP),
+            int(item.volume))
 
-        # Get response from give url
-        response = _get_response(url)
 
-        # Get timeseries data from response,
-        # filter it for a specific range (default to latest 14 days)
-        # and process to prepare final result
-        processed_data = _load_and_process_timeseries_data(
-            symbol,
-            response)
+def _load_stored_rows(
+        symbol: str,
+        since: date) -> Tuple[date, Dict[date, Tuple[Decimal, Decimal, int]]]:
+    """
+    Loads the high-water mark and the rows already stored
+    in database for a symbol from a given date.
 
-        # Save processed items into mysql db
-        _save_items_into_db(processed_data)
+    Args:
+        symbol (str): The stock symbol.
+        since (date): The first date of the rows to load.
 
+    Returns:
+        A tuple with the latest stored date (None if there is no row)
+        and the stored (open_price, close_price, volume) by date.
+    """
 
-def _save_items_into_db(financial_data: List):
+    db = DbConnection(pooled=True)
+    try:
+        db.connect()
+        db.open_cursor()
+
+        db.cursor.execute(
+            "SELECT date FROM financial_data WHERE symbol = %s "
+            "ORDER BY date DESC LIMIT 1",
+            (symbol,))
+        latest = db.cursor.fetchone()
+        high_water_mark = latest[0] if latest else None
+
+        db.cursor.execute(
+            "SELECT date, open_price, close_price, volume FROM financial_data "
+            "WHERE symbol = %s AND date >= %s",
+            (symbol, since))
+        stored = {row[0]: (row[1], row[2], int(row[3]))
+                  for row in db.cursor}
+
+        return high_water_mark, stored
+
+    except DatabaseError as error:
+        # Handle db exceptions that might occur
+        print("Failed to read records from table: {}".format(error))
+        sys.exit(1)
+    finally:
+        db.disconnect()
+
+
+def _save_items_into_db(
+        financial_data: List,
+        batch_size: int = None,
+        load_data_min_rows: int = None):
     """
     Inserts processed financial data into 
     the MySQL database table.
 
+    Rows are upserted with multi-row INSERT statements of `batch_size`
+    rows, committed batch by batch. When the number of rows reaches
+    `load_data_min_rows` (0 disables it), they are bulk loaded with
+    `LOAD DATA LOCAL INFILE` instead.
+
     Args:
         financial_data (List): 
         A list of financial data to be inserted into the table.
+        batch_size (int): Number of rows per INSERT statement
+        (default to DATABASE_INSERT_BATCH_SIZE).
+        load_data_min_rows (int): Minimum number of rows to use LOAD DATA
+        (default to DATABASE_LOAD_DATA_MIN_ROWS).
 
     Returns:
         None.
     """
 
-    db = DbConnection()
+    if not financial_data:
+        print("No rows to save")
+        return
+
+    if batch_size is None:
+        batch_size = database_insert_batch_size
+    if load_data_min_rows is None:
+        load_data_min_rows = database_load_data_min_rows
+    use_load_data = (storage_backend.supports_load_data
+                     and 0 < load_data_min_rows <= len(financial_data))
+
+    db = DbConnection(pooled=True)
     try:
+        started_at = time.perf_counter()
+
         # Connect to mysql db
-        db.connect()
+        db.connect(allow_local_infile=use_load_data)
 
         # Open a cursor to execute queries
         db.open_cursor()
 
         # Insert records into table by executing cursor
+        if use_load_data:
+            batch_started_at = time.perf_counter()
+            _load_data_infile(db, financial_data)
+            ingest_batch_duration.observe(time.perf_counter() - batch_started_at)
+        else:
+            _insert_batches(db, financial_data, max(1, batch_size))
+
+        # Update the running totals from the earliest written date of each symbol,
+        # unless they are not used or their table is not migrated yet
+        earliest_dates = {}
         for item in financial_data:
-            query = ("INSERT INTO financial_data (symbol, date, open_price, close_price, volume) "
-                     "VALUES (%s, %s, %s, %s, %s) "
-                     "ON DUPLICATE KEY UPDATE open_price=%s, close_price=%s, volume=%s")
-            val = (item.symbol, item.date, item.open_price, item.close_price, item.volume,
-                   item.open_price, item.close_price, item.volume)
-            db.cursor.execute(query, val)
-
-        # Commit the inserted records
+            if item.symbol not in earliest_dates or item.date < earliest_dates[item.symbol]:
+                earliest_dates[item.symbol] = item.date
+        if (statistics_source == 'cumulative'
+                and storage_backend.has_table(db.cursor, 'financial_data_cumulative')):
+            for symbol, since in earliest_dates.items():
+                update_cumulative_data(db, symbol, since)
+            db.conn.commit()
+
+        # Rewrite the local column files of these symbols,
+        # before the API drops its cached results
+        if column_store_dir:
+            export_column_files(db, column_store_dir, sorted(earliest_dates))
+
+        # Let the API invalidate its cached results of these symbols
+        _bump_data_versions(db, {item.symbol for item in financial_data})
+
+        elapsed = time.perf_counter() - started_at
+        rows = len(financial_data)
+        ingest_rows_upserted.inc(rows)
+        print(f"Saved {rows} rows in {elapsed:.3f}s "
+              f"({rows / elapsed if elapsed else 0:.0f} rows/s)")
+
+    except DatabaseError as error:
+        # Handle db exceptions that might occur
+        print("Failed to insert record into table: {}".format(error))
+        sys.exit(1)
+    finally:
+        # Close the cursor and return the connection to the pool
+        db.disconnect()
+
+
+def _insert_batches(db: DbConnection, financial_data: List, batch_size: int):
+    """
+    Upserts financial data with multi-row INSERT statements
+    and commits each batch.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor.
+        financial_data (List): A list of financial data to be inserted.
+        batch_size (int): Number of rows per INSERT statement.
+
+    Returns:
+        None.
+    """
+
+    for offset in range(0, len(financial_data), batch_size):
+        batch = financial_data[offset:offset + batch_size]
+        started_at = time.perf_counter()
+
+        # The storage backend writes the batch its fastest way. Prices are
+        # rounded to cents as MySQL DECIMAL(10, 2) columns do, which SQLite
+        # does not enforce, so that both store and sum the same values
+        storage_backend.upsert(
+            db.cursor, 'financial_data',
+            ('symbol', 'date', 'open_price', 'close_price', 'volume'),
+            ('symbol', 'date'),
+            [(item.symbol, item.date) + _normalize_row(item) for item in batch])
+
+        # Commit the inserted batch
         db.conn.commit()
+        ingest_batch_duration.observe(time.perf_counter() - started_at)
 
-        # Close the cursor and the database connection
-        db.close_cursor()
-        db.disconnect()
 
-    except mysql.connector.Error as error:
-        # Handle MYSQL db exceptions that might occur
-        print("Failed to insert record into MySQL table: {}".format(error))
-        sys.exit(1)
+def _bump_data_versions(db: DbConnection, symbols: set):
+    """
+    Increments the data version of the given symbols,
+    which tells the API that their cached results are stale.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor.
+        symbols (set): The symbols whose data has been written.
+
+    Returns:
+        None.
+    """
+
+    query = storage_backend.increment_query(
+        'financial_data_version', 'symbol', 'version')
+    for symbol in sorted(symbols):
+        db.cursor.execute(query, (symbol,))
+
+    # Commit the new versions
+    db.conn.commit()
+
+
+def _load_data_infile(db: DbConnection, financial_data: List):
+    """
+    Bulk loads financial data through a temporary CSV file
+    with `LOAD DATA LOCAL INFILE`, replacing existing rows.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor,
+        connected with local infile allowed.
+        financial_data (List): A list of financial data to be loaded.
+
+    Returns:
+        None.
+    """
+
+    with tempfile.NamedTemporaryFile(
+            'w', newline='', suffix='.csv', delete=False) as file:
+        writer = csv.writer(file, lineterminator='\n')
+        for item in financial_data:
+            # Rounded to cents as by the batched upserts, rather than
+            # by the truncation or rounding of the server
+            writer.writerow((item.symbol, item.date) + _normalize_row(item))
+
+    try:
+        query = ("LOAD DATA LOCAL INFILE %s REPLACE INTO TABLE financial_data "
+                 "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                 "LINES TERMINATED BY '\\n' "
+                 "(symbol, date, open_price, close_price, volume)")
+        db.cursor.execute(query, (file.name,))
+
+        # Commit the loaded records
+        db.conn.commit()
+    finally:
+        os.remove(file.name)
 
 
 def _load_and_process_timeseries_data(
         symbol: str,
-        response: requests.Response) -> List:
+        response: requests.Response,
+        since: date = None) -> List:
     """
     Load and process timeseries data from API response
     for a specific range of dates.
@@ -108,40 +519,44 @@ def _load_and_process_timeseries_data(
     Args:
         symbol: A string representing the financial symbol.
         response: A response object from API containing time series data.
+        since: The first date to keep (default to start of the load period).
 
     Returns:
         A list of financial data objects containing
         symbol, date, open_price, close_price and volume.
     """
 
-    items = []
-    try:
-        data = response.json()
-        ts_data = data[f'Time Series (Daily)']
+    if since is None:
+        since = start_date
 
-        for ts_key, ts_value in ts_data.items():
-            date = datetime.strptime(ts_key, '%Y-%m-%d').date()
+    # Days are compared as ISO strings, which sort like dates
+    first_day = since.isoformat()
+    last_day = end_date.isoformat()
 
-            if (date > end_date or date < start_date):
+    items = []
+    stream = TimeSeriesStream(response.iter_content(chunk_size=RESPONSE_CHUNK_SIZE))
+    try:
+        for (day, values) in stream:
+            # Days come latest first, the older ones are not even read
+            if day < first_day:
+                break
+            if day > last_day:
                 continue
 
-            for key, value in ts_value.items():
-                keyname = key.split(".")[1].strip()
-                if api_open_price_keyname == keyname:
-                    open_price = value
-                elif api_close_price_keyname == keyname:
-                    close_price = value
-                elif api_volume_keyname == keyname:
-                    volume = value
-            item = FinancialData(symbol, date, open_price, close_price, volume)
+            fields = {}
+            for (key, value) in values.items():
+                fields[_value_field(key)] = value
+            item = FinancialData(symbol, date.fromisoformat(day),
+                                 fields['open_price'], fields['close_price'],
+                                 fields['volume'])
             items.append(item)
 
         return items
     except KeyError as error:
-        if 'Note' in data:
-            print(data['Note'])
-        elif 'Error Message' in data:
-            print(data['Error Message'])
+        if 'Note' in stream.header:
+            print(stream.header['Note'])
+        elif 'Error Message' in stream.header:
+            print(stream.header['Error Message'])
         else:
             print("KeyError found", error)
         sys.exit(1)
@@ -151,6 +566,33 @@ def _load_and_process_timeseries_data(
     except Exception as error:
         print("Error", error)
         sys.exit(1)
+    finally:
+        response.close()
+
+
+def _value_field(key: str) -> str:
+    """
+    Returns the FinancialData field of a value key of the API response,
+    eg: `open_price` for `1. open`, or an empty string for unused values.
+
+    Keys are looked up in a table, filled the first time each key is met.
+
+    Args:
+        key (str): The value key, numbered by the API.
+
+    Returns:
+        The field name.
+    """
+
+    field = _value_fields.get(key)
+    if field is None:
+        keyname = key.split(".")[1].strip()
+        field = _value_fields[key] = {
+            api_open_price_keyname: 'open_price',
+            api_close_price_keyname: 'close_price',
+            api_volume_keyname: 'volume',
+        }.get(keyname, '')
+    return field
 
 
 def _get_response(url) -> requests.Response:
@@ -165,7 +607,7 @@ def _get_response(url) -> requests.Response:
 
     response = None
     try:
-        response = requests.get(url)
+        response = requests.get(url, stream=True)
         response.raise_for_status()
     # When invalid HTTP response
     except requests.exceptions.HTTPError as error:
@@ -0,0 +1,370 @@
+"""
+Collects counters and histograms, rendered in the Prometheus text format.
+
+The API records the duration of each request and of its spans (parse,
+connect, queries, materialization, serialization, write) by endpoint,
+and exposes them on `/metrics`. get_raw_data.py records its ingestion
+metrics in a separate registry, written to METRICS_INGEST_FILE at the end
+of each run, which the API appends to its own metrics.
+"""
+
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Upper bounds of the duration histograms buckets, in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], *extra: str) -> str:
+    """
+    Formats the labels of a sample, eg: `{endpoint="/api/statistics"}`,
+    followed by the already formatted extra labels which are not empty.
+    """
+    labels = [f'{name}="{_escape(value)}"' for (name, value) in zip(names, values)]
+    labels.extend(label for label in extra if label)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def _escape(value: str) -> str:
+    """
+    Escapes a label value.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    """
+    Formats a sample value, integers without decimal part.
+    """
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """
+    Represents a monotonically increasing counter, by label values.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        """
+        :param name: The metric name.
+        :param documentation: The help text of the metric.
+        :param labels: The label names.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values: str):
+        """
+        Increments the counter of the given label values.
+        """
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self, extra: str = '') -> Iterator[str]:
+        """
+        Returns the lines of the samples of the counter.
+
+        :param extra: Formatted labels added to every sample.
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+        for (label_values, value) in values:
+            yield (f"{self.name}{_format_labels(self.labels, label_values, extra)} "
+                   f"{_format_value(value)}")
+
+
+class Gauge(Counter):
+    """
+    Represents a value which can go up and down, by label values.
+    """
+
+    kind = 'gauge'
+
+    def set(self, value: float, *label_values: str):
+        """
+        Sets the value of the given label values.
+        """
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram:
+    """
+    Represents the distribution of observed values in cumulative
+    buckets, by label values.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        """
+        :param name: The metric name.
+        :param documentation: The help text of the metric.
+        :param labels: The label names.
+        :param buckets: The upper bounds of the buckets.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+
+        # Bucket counts, sum and count by label values
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        """
+        Records a value for the given label values.
+        """
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for (index, bound) in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self, extra: str = '') -> Iterator[str]:
+        """
+        Returns the lines of the samples of the histogram.
+
+        :param extra: Formatted labels added to every sample.
+        """
+        with self._lock:
+            values = sorted((key, (list(entry[0]), entry[1], entry[2]))
+                            for (key, entry) in self._values.items())
+        for (label_values, (counts, total, count)) in values:
+            cumulative = 0
+            for (bound, bucket_count) in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, label_values, extra,
+                                        f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, label_values, extra, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {count}"
+            labels = _format_labels(self.labels, label_values, extra)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    """
+    Represents a set of metrics rendered together.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        """
+        Adds a metric to the registry.
+
+        :param metric: The Counter, Gauge or Histogram.
+        :return: The metric.
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, labels: Optional[Dict[str, str]] = None) -> str:
+        """
+        Renders the metrics in the Prometheus text format.
+
+        :param labels: Labels added to every sample, eg: the process
+            which recorded them.
+        :return: The metrics text.
+        """
+        extra = _format_labels(tuple(labels), tuple(labels.values()))[1:-1] if labels else ''
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples(extra))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        """
+        Writes the rendered metrics to a file, replaced atomically.
+
+        :param path: The path of the file.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        (fd, temp_path) = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                file.write(self.render())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+# Metrics of the API
+registry = MetricsRegistry()
+
+request_duration = registry.register(Histogram(
+    'financial_api_request_duration_seconds',
+    'Duration of API requests.', ('endpoint', 'status')))
+span_duration = registry.register(Histogram(
+    'financial_api_span_duration_seconds',
+    'Duration of the spans of API requests.', ('endpoint', 'span')))
+slow_queries = registry.register(Counter(
+    'financial_db_slow_queries_total',
+    'Number of database queries slower than METRICS_SLOW_QUERY_THRESHOLD.'))
+
+# Metrics of an ingestion run of get_raw_data.py
+ingest_registry = MetricsRegistry()
+
+ingest_fetch_duration = ingest_registry.register(Histogram(
+    'financial_ingest_fetch_duration_seconds',
+    'Duration of the requests to the external API, '
+    'until their streamed time series is read.',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)))
+ingest_batch_duration = ingest_registry.register(Histogram(
+    'financial_ingest_batch_duration_seconds',
+    'Duration of the committed write batches.'))
+ingest_rows_upserted = ingest_registry.register(Counter(
+    'financial_ingest_rows_upserted_total',
+    'Number of rows written into financial_data.'))
+ingest_last_run = ingest_registry.register(Gauge(
+    'financial_ingest_last_run_timestamp_seconds',
+    'Time the last ingestion run completed.'))
+
+
+class RequestTimer:
+    """
+    Represents the timing of a request, whose spans are recorded
+    by the `span` context manager in the thread handling it.
+    """
+
+    _current = threading.local()
+
+    def __init__(self, endpoint: str):
+        """
+        :param endpoint: The endpoint label of the request.
+        """
+        self.endpoint = endpoint
+        self.status = None
+        self.spans = {}
+        self._started_at = None
+
+    @classmethod
+    def current(cls) -> Optional['RequestTimer']:
+        """
+        Returns the timer of the request handled by the current thread.
+        """
+        return getattr(cls._current, 'timer', None)
+
+    def __enter__(self) -> 'RequestTimer':
+        self._started_at = time.perf_counter()
+        RequestTimer._current.timer = self
+        return self
+
+    def __exit__(self, *exc_info):
+        RequestTimer._current.timer = None
+        duration = time.perf_counter() - self._started_at
+        request_duration.observe(duration, self.endpoint, str(self.status or 0))
+        for (name, seconds) in self.spans.items():
+            span_duration.observe(seconds, self.endpoint, name)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Times a span of the request handled by the current thread. The times
+    of a span entered several times in a request are added up. Nothing is
+    recorded outside of a request.
+
+    :param name: The span name, eg: `data_query`.
+    """
+    timer = RequestTimer.current()
+    if timer is None:
+        yield
+        return
+
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.spans[name] = timer.spans.get(name, 0.0) + time.perf_counter() - started_at
+
+
+class SlowQueryLog:
+    """
+    Represents the log of the database queries slower than a threshold.
+    """
+
+    # Maximum length of the logged query text and number of logged parameters
+    max_length = 500
+    max_params = 10
+
+    def __init__(self, threshold: float, path: str = ''):
+        """
+        :param threshold: Duration in seconds above which a query is logged,
+            0 disables the log.
+        :param path: The file the queries are appended to,
+            standard error when empty.
+        """
+        self.threshold = threshold
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, query: str, params: Sequence = ()):
+        """
+        Times the execution of a query and logs it when slow.
+
+        :param query: The query text.
+        :param params: The parameters of the query.
+        """
+        if self.threshold <= 0:
+            yield
+            return
+
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started_at
+            if elapsed >= self.threshold:
+                self.log(query, params, elapsed)
+
+    def log(self, query: str, params: Sequence, elapsed: float):
+        """
+        Logs a slow query.
+        """
+        slow_queries.inc()
+
+        # Multi-row statements are cut, not to flood the log
+        query = ' '.join(query.split())
+        if len(query) > self.max_length:
+            query = query[:self.max_length] + '...'
+        params = tuple(params)
+        shown = repr(params[:self.max_params])
+        if len(params) > self.max_params:
+            shown = shown[:-1] + f', ... {len(params)} parameters)'
+
+        line = (f"{time.strftime('%Y-%m-%d %H:%M:%S')} slow query "
+                f"({elapsed:.3f}s): {query} {shown}\n")
+        with self._lock:
+            if self.path:
+                with open(self.path, 'a') as file:
+                    file.write(line)
+            else:
+                sys.stderr.write(line)
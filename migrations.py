@@ -0,0 +1,334 @@
+"""
+Applies the schema migrations of the database, in order, recording each
+applied migration in the `schema_migrations` table. Run it after
+deploying a new version, before restarting the API:
+
+    python migrations.py [--status] [--partition] [--check-plans]
+
+`--partition` also range-partitions financial_data by year (MySQL only),
+and adds the partitions of the next years when run again.
+
+`--check-plans` explains the queries of the API for each supported
+combination of query parameters, and fails when one of them reads a
+whole table or index, does not read its expected index, or sorts the
+rows of a page.
+"""
+
+from datetime import date
+from typing import List, Tuple
+import argparse
+import sys
+from db_connection import DatabaseError, DbConnection, storage_backend
+
+# Secondary index of financial_data leading with the date, narrow enough
+# to count the rows of a date range across symbols
+DATE_INDEX = 'financial_data_date'
+
+# Secondary index of financial_data covering the statistics columns,
+# to fetch and aggregate a date range across symbols without reading the table
+DATE_COVERING_INDEX = 'financial_data_date_covering'
+
+# Schema migrations by version, as (name, statements)
+MIGRATIONS = [
+    (1, 'date_index', [
+        f"CREATE INDEX {DATE_INDEX} ON financial_data (date, symbol)",
+    ]),
+    (2, 'date_covering_index', [
+        f"CREATE INDEX {DATE_COVERING_INDEX} ON financial_data "
+        "(date, symbol, open_price, close_price, volume)",
+    ]),
+    # Created by the schema of new databases, missing from the older ones
+    (3, 'data_version_table', [
+        "CREATE TABLE IF NOT EXISTS financial_data_version ("
+        "symbol VARCHAR(255) NOT NULL, "
+        "version BIGINT UNSIGNED NOT NULL, "
+        "PRIMARY KEY (symbol))",
+    ]),
+    # Filled by get_raw_data.py when STATISTICS_SOURCE is `cumulative`,
+    # or by `cumulative_data.py --rebuild`
+    (4, 'cumulative_table', [
+        "CREATE TABLE IF NOT EXISTS financial_data_cumulative ("
+        "symbol VARCHAR(255) NOT NULL, "
+        "date DATE NOT NULL, "
+        "row_count INT UNSIGNED NOT NULL, "
+        "total_open_price DECIMAL(20, 2) NOT NULL, "
+        "total_close_price DECIMAL(20, 2) NOT NULL, "
+        "total_volume BIGINT UNSIGNED NOT NULL, "
+        "PRIMARY KEY (symbol, date))",
+    ]),
+]
+
+
+def load_indexes(db: DbConnection) -> frozenset:
+    """
+    Loads the names of the secondary indexes of financial_data.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor.
+
+    Returns:
+        frozenset: The index names.
+    """
+
+    return frozenset(storage_backend.list_indexes(db.cursor, 'financial_data'))
+
+
+def applied_migrations(db: DbConnection) -> List[int]:
+    """
+    Returns the versions of the applied migrations,
+    creating the `schema_migrations` table if needed.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor.
+
+    Returns:
+        List[int]: The applied versions, in order.
+    """
+
+    db.cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INT UNSIGNED NOT NULL, "
+        "name VARCHAR(255) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        "PRIMARY KEY (version))")
+    db.cursor.execute("SELECT version FROM schema_migrations ORDER BY version")
+    return [version for (version,) in db.cursor.fetchall()]
+
+
+def apply_migrations(db: DbConnection) -> List[str]:
+    """
+    Applies the pending migrations, committing each of them.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor.
+
+    Returns:
+        List[str]: The names of the applied migrations.
+    """
+
+    applied = set(applied_migrations(db))
+    names = []
+    for (version, name, statements) in MIGRATIONS:
+        if version in applied:
+            continue
+        for statement in statements:
+            db.cursor.execute(statement)
+        db.cursor.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+            (version, name))
+        db.conn.commit()
+        names.append(name)
+    return names
+
+
+def partition_by_date(db: DbConnection, last_year: int) -> int:
+    """
+    Range-partitions financial_data by year, from the year of its first
+    row to `last_year`, with a last partition for later dates. When the
+    table is already partitioned, the missing years are split from the
+    last partition.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor.
+        last_year (int): The last year with its own partition.
+
+    Returns:
+        int: The number of added partitions.
+    """
+
+    if storage_backend.name != 'mysql':
+        raise ValueError(
+            f"Partitioning is not supported by the {storage_backend.name} backend")
+
+    db.cursor.execute(
+        "SELECT partition_name FROM information_schema.partitions "
+        "WHERE table_schema = DATABASE() AND table_name = 'financial_data' "
+        "AND partition_name IS NOT NULL")
+    partitions = {name for (name,) in db.cursor.fetchall()}
+
+    db.cursor.execute("SELECT MIN(date) FROM financial_data")
+    (first_date,) = db.cursor.fetchone()
+    first_year = min(first_date.year if first_date else last_year, last_year)
+
+    years = [year for year in range(first_year, last_year + 1)
+             if f"p{year}" not in partitions]
+    if not years:
+        return 0
+
+    definitions = ", ".join(
+        f"PARTITION p{year} VALUES LESS THAN ('{year + 1}-01-01')" for year in years)
+    definitions += ", PARTITION pmax VALUES LESS THAN (MAXVALUE)"
+
+    if not partitions:
+        db.cursor.execute(
+            f"ALTER TABLE financial_data PARTITION BY RANGE COLUMNS(date) ({definitions})")
+    else:
+        # Later years can only be split from the last partition
+        if years[0] < max(int(name[1:]) for name in partitions if name != 'pmax'):
+            raise ValueError("Only years after the last partition can be added")
+        db.cursor.execute(
+            f"ALTER TABLE financial_data REORGANIZE PARTITION pmax INTO ({definitions})")
+    return len(years)
+
+
+def check_query_plans(db: DbConnection) -> List[Tuple[str, List[str]]]:
+    """
+    Explains the queries of the API for each supported combination of
+    query parameters, keyset (cursor) pages included, with the indexes
+    of the database, and checks that each one reads a range of the index
+    it is meant to: the primary key for the queries of symbols, and the
+    date indexes, when they exist, for the queries of a date range.
+    Pages must also be read in the order of their index, as sorting the
+    rows to return a page reads all of them.
+
+    Queries without any condition read every row by definition, so they
+    are not checked. The pages of a date range across symbols follow the
+    primary key order, and the optimizer chooses between reading it in
+    order until the page is complete, and reading the date range from a
+    date index to sort it: they are only checked not to force an index
+    whose rows are then sorted.
+
+    Args:
+        db (DbConnection): An opened database connection with a cursor.
+
+    Returns:
+        A list of (query, problems) tuples, the problems being the full
+        scans, the unexpected indexes and the sorted pages, empty when the
+        query only reads ranges of its index.
+    """
+
+    # The queries are built by the API itself
+    from financial.app import (TOTALS_QUERY, _data_queries, _export_query,
+                               _symbols_data_query, _totals_by_symbol_query)
+
+    indexes = load_indexes(db)
+    day = date(2020, 1, 2)
+
+    # Index expected for the queries of a date range across symbols
+    date_index = DATE_INDEX if DATE_INDEX in indexes else None
+    date_covering_index = DATE_COVERING_INDEX if DATE_COVERING_INDEX in indexes else None
+
+    # Queries as (query, params, expected index), None when any index will do
+    queries = []
+    # Pages, as (query, params), whose index is chosen by the optimizer
+    optimized_pages = []
+    pages = set()
+
+    for with_symbol in (False, True):
+        for with_start_date in (False, True):
+            for with_end_date in (False, True):
+                for with_after in (False, True):
+                    (query_count, query_get) = _data_queries(
+                        with_symbol, with_start_date, with_end_date,
+                        with_after, True, not with_after, indexes)
+                    params = [value for (value, used) in (('IBM', with_symbol),
+                                                          (day, with_start_date),
+                                                          (day, with_end_date))
+                              if used]
+                    if params and not with_after:
+                        queries.append((query_count, list(params),
+                                        'PRIMARY' if with_symbol else date_index))
+                    if with_symbol or with_after:
+                        if with_after:
+                            params.extend((day,) if with_symbol else ('IBM', 'IBM', day))
+                        params.append(5)
+                        if not with_after:
+                            params.append(10)
+                        queries.append((query_get, params, 'PRIMARY'))
+                        pages.add(query_get)
+                    elif params:
+                        optimized_pages.append((query_get, params + [5, 10]))
+
+    queries.append((TOTALS_QUERY, ['IBM', day, day], 'PRIMARY'))
+    for symbols in (None, ['IBM', 'AAPL']):
+        params = [day, day] + (symbols or [])
+        count = len(symbols) if symbols else None
+        expected_index = 'PRIMARY' if symbols else date_covering_index
+        queries.append((_totals_by_symbol_query(count, indexes), params, expected_index))
+        queries.append((_symbols_data_query(count, indexes), params, expected_index))
+        for with_start_date in (False, True):
+            for with_end_date in (False, True):
+                if count is None and not (with_start_date or with_end_date):
+                    continue
+                dates = [day for used in (with_start_date, with_end_date) if used]
+                query = _export_query(count, with_start_date, with_end_date, indexes)
+                queries.append((query, (symbols or []) + dates, expected_index))
+
+    results = []
+    for (query, params, expected_index) in queries:
+        problems = storage_backend.full_scans(db.cursor, query, params)
+        used_indexes = storage_backend.plan_indexes(db.cursor, query, params)
+        if expected_index is not None and expected_index not in used_indexes:
+            problems.append(f"reads {', '.join(used_indexes) or 'no index'} "
+                            f"instead of {expected_index}")
+        if query in pages:
+            problems.extend(storage_backend.plan_sorts(db.cursor, query, params))
+        results.append((query, problems))
+
+    hints = [storage_backend.index_hint(index) for index in (DATE_INDEX, DATE_COVERING_INDEX)]
+    for (query, params) in optimized_pages:
+        problems = []
+        if any(hint in query for hint in hints):
+            problems = storage_backend.plan_sorts(db.cursor, query, params)
+        results.append((query, problems))
+    return results
+
+
+def main():
+    """
+    Applies the pending migrations, or reports their status.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Apply the schema migrations of the database.")
+    parser.add_argument('--status', action='store_true',
+                        help='only list the applied and pending migrations')
+    parser.add_argument('--partition', action='store_true',
+                        help='range-partition financial_data by year (MySQL only)')
+    parser.add_argument('--check-plans', action='store_true',
+                        help='fail when a query of the API reads a whole table or index')
+    args = parser.parse_args()
+
+    db = DbConnection()
+    try:
+        db.connect()
+        db.open_cursor()
+
+        if args.status:
+            applied = set(applied_migrations(db))
+            for (version, name, _) in MIGRATIONS:
+                print(f"{version:4} {name}: {'applied' if version in applied else 'pending'}")
+            return
+
+        names = apply_migrations(db)
+        print("Applied migrations:", ", ".join(names) if names else "none")
+
+        if args.partition:
+            count = partition_by_date(db, date.today().year + 1)
+            print("Added", count, "partitions of financial_data.")
+
+        if args.check_plans:
+            failed = 0
+            for (query, problems) in check_query_plans(db):
+                if problems:
+                    failed += 1
+                    print("Unexpected plan:", query)
+                    for problem in problems:
+                        print("   ", problem)
+            if failed:
+                sys.exit(1)
+            print("Every query of the API reads ranges of its expected index.")
+
+    except DatabaseError as error:
+        # Handle db exceptions that might occur
+        print("Failed to migrate the database: {}".format(error))
+        sys.exit(1)
+    except ValueError as error:
+        print("Failed to migrate the database: {}".format(error))
+        sys.exit(1)
+    finally:
+        db.disconnect()
+
+
+if __name__ == '__main__':
+    main()
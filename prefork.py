@@ -0,0 +1,133 @@
+"""
+Runs a server in several forked worker processes sharing one listening
+socket, so that request handling is not limited to the core of a single
+Python interpreter.
+
+The supervisor (the parent process) only listens, forks the workers and
+restarts the ones which exit unexpectedly. On SIGTERM or SIGINT, it
+forwards SIGTERM to the workers and waits for them to drain their
+in-flight requests.
+"""
+
+from typing import Callable, Dict
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+
+def create_listening_socket(port: int, backlog: int = 128) -> socket.socket:
+    """
+    Creates the socket shared by the workers. It does not block, as the
+    workers race to accept each connection and the losers must go back
+    to waiting.
+
+    :param port: The port to listen on, on all interfaces.
+    :param backlog: The maximum number of pending connections.
+    :return: The listening socket.
+    """
+    listen_socket = socket.create_server(('', port), backlog=backlog)
+    listen_socket.setblocking(False)
+    return listen_socket
+
+
+class PreforkSupervisor:
+    """
+    Represents the parent process of the worker processes.
+    """
+
+    # Seconds a worker must have run for its exit not to be a crash loop
+    min_uptime = 1.0
+
+    def __init__(
+            self,
+            listen_socket: socket.socket,
+            processes: int,
+            serve: Callable[[socket.socket], None],
+            restart_delay: float = 1.0):
+        """
+        :param listen_socket: The listening socket shared by the workers.
+        :param processes: The number of worker processes.
+        :param serve: Function serving requests from the listening socket
+            in a worker, until the worker receives SIGTERM.
+        :param restart_delay: Seconds to wait before restarting a worker
+            which exited right after being started.
+        """
+        self.listen_socket = listen_socket
+        self.processes = processes
+        self.serve = serve
+        self.restart_delay = restart_delay
+        self.restarts = 0
+
+        # Start time of each running worker, by process id
+        self._workers: Dict[int, float] = {}
+        self._stopping = False
+
+    def run(self):
+        """
+        Starts the workers, restarts the crashed ones, and returns
+        once all of them exited after a stop was requested.
+        """
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        for _ in range(self.processes):
+            self._spawn()
+
+        while self._workers:
+            try:
+                (pid, status) = os.wait()
+            except ChildProcessError:
+                break
+
+            started_at = self._workers.pop(pid, None)
+            if started_at is None or self._stopping:
+                continue
+
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, "
+                  "restarting it.", flush=True)
+            self.restarts += 1
+
+            # Do not fork in a loop when workers can not start
+            if time.monotonic() - started_at < self.min_uptime:
+                time.sleep(self.restart_delay)
+            if not self._stopping:
+                self._spawn()
+
+        self.listen_socket.close()
+
+    def _spawn(self):
+        """
+        Forks a worker process serving from the listening socket.
+        """
+        pid = os.fork()
+        if pid:
+            self._workers[pid] = time.monotonic()
+            return
+
+        # In the worker: serve until stopped, and never return to the supervisor code
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            self.serve(self.listen_socket)
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def _request_stop(self, signum, frame):
+        """
+        Stops the workers, which drain their in-flight requests.
+        """
+        self._stopping = True
+        for pid in list(self._workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
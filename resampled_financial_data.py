@@ -0,0 +1,82 @@
+from datetime import date
+from decimal import Decimal
+import json
+
+
+class ResampledFinancialData:
+    """
+      Represents the financial data of a given stock symbol
+       resampled to one bar per week, month or quarter.
+      """
+
+    # No per-instance __dict__, as many of them are created per request
+    __slots__ = ('symbol', 'period', 'start_date', 'end_date',
+                 'open_price', 'close_price', 'volume')
+
+    def __init__(
+            self,
+            symbol: str,
+            period: date,
+            start_date: date,
+            end_date: date,
+            open_price: Decimal,
+            close_price: Decimal,
+            volume: int):
+        """
+        Initialize a ResampledFinancialData instance with the given parameters.
+
+        :param symbol: The stock symbol.
+        :param period: The first calendar day of the week, month or quarter.
+        :param start_date: The first trading date of the period.
+        :param end_date: The last trading date of the period.
+        :param open_price: The opening price of the stock on the first trading date.
+        :param close_price: The closing price of the stock on the last trading date.
+        :param volume: The total trading volume of the stock during the period.
+        """
+
+        self.symbol = symbol
+        self.period = period
+        self.start_date = start_date
+        self.end_date = end_date
+        self.open_price = open_price
+        self.close_price = close_price
+        self.volume = volume
+
+
+class ResampledFinancialDataEncoder(json.JSONEncoder):
+    """
+    A custom JSON encoder that serializes
+    ResampledFinancialData objects to JSON.
+    """
+
+    def default(self, obj):
+        """
+        Overrides the default() method of the JSONEncoder class
+        to handle serialization of ResampledFinancialData objects.
+
+        :param obj: The object to be serialized.
+        :return: A JSON-serializable representation of the object.
+        """
+
+        if isinstance(obj, ResampledFinancialData):
+            # If the object is an instance of ResampledFinancialData,
+            # serialize it to a dictionary with its attributes as keys
+            # and their serialized values as values.
+            return {
+                "symbol": obj.symbol,
+                "period": obj.period.isoformat(),
+                "start_date": obj.start_date.isoformat(),
+                "end_date": obj.end_date.isoformat(),
+                "open_price": f"{obj.open_price:.2f}",
+                "close_price": f"{obj.close_price:.2f}",
+                "volume": obj.volume,
+            }
+        elif isinstance(obj, Decimal):
+            # Serialize Decimal objects to strings
+            return str(obj)
+        elif isinstance(obj, date):
+            # Serialize date objects to ISO format strings
+            return obj.isoformat()
+        else:
+            # For all other objects, fallback to the default serialization behavior
+            return super().default(obj)
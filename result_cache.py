@@ -0,0 +1,180 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Optional
+import hashlib
+import threading
+import time
+
+
+class ResultCache:
+    """
+    Represents a thread-safe LRU cache of API results, with a time to live
+    and invalidation of the results of symbols whose data has changed.
+    """
+
+    def __init__(
+            self,
+            load_versions: Callable[[], Dict[str, int]],
+            max_entries: int = 1024,
+            ttl: float = 60.0,
+            version_check_interval: float = 5.0):
+        """
+        Initialize a ResultCache instance.
+
+        :param load_versions: Function returning the current data version
+            of each symbol. It is called at most once per check interval.
+        :param max_entries: Maximum number of cached results,
+            the least recently used ones are evicted first. 0 disables the cache.
+        :param ttl: Seconds after which a cached result expires.
+        :param version_check_interval: Seconds between two data version checks.
+        """
+
+        self.load_versions = load_versions
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+
+        # Cached results by key, as (symbol, value, expiration time)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Last known data version of each symbol, None when unknown,
+        # and a digest of the versions of all symbols
+        self._versions = None
+        self._all_versions_tag = None
+        self._next_version_check = 0.0
+
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'evictions': 0,
+        }
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """
+        Returns the cached result for a key.
+
+        :param key: The normalized query parameters of the result.
+        :return: The cached result, or None when missing or expired.
+        """
+
+        if self.max_entries <= 0:
+            return None
+
+        self._check_versions()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= time.monotonic():
+                self._stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def put(self, key: Hashable, symbol: Optional[str], value: str):
+        """
+        Stores a result in the cache.
+
+        :param key: The normalized query parameters of the result.
+        :param symbol: The symbol the result depends on,
+            or None when it depends on every symbol.
+        :param value: The result to cache.
+        """
+
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            # Results can not be invalidated while versions are unknown
+            if self._versions is None:
+                return
+
+            tag = symbol.upper() if symbol is not None else None
+            self._entries[key] = (tag, value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def version_tag(self, symbols: Optional[Iterable[str]] = None) -> Optional[str]:
+        """
+        Returns a tag of the current data versions of symbols,
+        which changes whenever rows of one of them are written.
+
+        :param symbols: The symbols a result depends on,
+            or None when it depends on every symbol.
+        :return: The tag, or None while the versions are unknown.
+        """
+
+        self._check_versions()
+
+        with self._lock:
+            if self._versions is None:
+                return None
+            if symbols is None:
+                return self._all_versions_tag
+            return ','.join(str(self._versions.get(symbol.upper(), 0))
+                            for symbol in symbols)
+
+    def stats(self) -> dict:
+        """
+        Returns the usage counters of the cache.
+
+        :return: A dictionary with the number of entries and
+            the hits, misses, invalidations and evictions counters.
+        """
+
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        return stats
+
+    def _check_versions(self):
+        """
+        Invalidates the results of symbols whose data version has changed
+        since the last check, when the check interval has elapsed.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_version_check:
+                return
+            self._next_version_check = now + self.version_check_interval
+
+        try:
+            versions = {symbol.upper(): version
+                        for symbol, version in self.load_versions().items()}
+        except Exception:
+            # Stop caching until versions can be loaded again
+            with self._lock:
+                self._versions = None
+                self._all_versions_tag = None
+                self._entries.clear()
+            return
+
+        all_versions_tag = hashlib.blake2b(
+            repr(sorted(versions.items())).encode(), digest_size=16).hexdigest()
+
+        with self._lock:
+            previous = self._versions
+            self._versions = versions
+            self._all_versions_tag = all_versions_tag
+            if previous is None:
+                # Nothing cached can be trusted since versions were unknown
+                self._entries.clear()
+                return
+
+            changed = {symbol for symbol in versions.keys() | previous.keys()
+                       if versions.get(symbol) != previous.get(symbol)}
+            if not changed:
+                return
+
+            # Results over every symbol depend on any change
+            stale = [key for key, entry in self._entries.items()
+                     if entry[0] is None or entry[0] in changed]
+            for key in stale:
+                del self._entries[key]
+            self._stats['invalidations'] += len(stale)
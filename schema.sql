@@ -5,4 +5,20 @@ CREATE TABLE financial_data (
     close_price DECIMAL(10, 2) NOT NULL,
     volume INT UNSIGNED NOT NULL,
     PRIMARY KEY (symbol, date)
+);
+
+CREATE TABLE financial_data_version (
+    symbol VARCHAR(255) NOT NULL,
+    version BIGINT UNSIGNED NOT NULL,
+    PRIMARY KEY (symbol)
+);
+
+CREATE TABLE financial_data_cumulative (
+    symbol VARCHAR(255) NOT NULL,
+    date DATE NOT NULL,
+    row_count INT UNSIGNED NOT NULL,
+    total_open_price DECIMAL(20, 2) NOT NULL,
+    total_close_price DECIMAL(20, 2) NOT NULL,
+    total_volume BIGINT UNSIGNED NOT NULL,
+    PRIMARY KEY (symbol, date)
 );
\ No newline at end of file
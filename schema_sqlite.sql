@@ -0,0 +1,24 @@
+CREATE TABLE IF NOT EXISTS financial_data (
+    symbol VARCHAR(255) NOT NULL COLLATE NOCASE,
+    date DATE NOT NULL,
+    open_price DECIMAL(10, 2) NOT NULL,
+    close_price DECIMAL(10, 2) NOT NULL,
+    volume INT UNSIGNED NOT NULL,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS financial_data_version (
+    symbol VARCHAR(255) NOT NULL COLLATE NOCASE,
+    version BIGINT UNSIGNED NOT NULL,
+    PRIMARY KEY (symbol)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS financial_data_cumulative (
+    symbol VARCHAR(255) NOT NULL COLLATE NOCASE,
+    date DATE NOT NULL,
+    row_count INT UNSIGNED NOT NULL,
+    total_open_price DECIMAL(20, 2) NOT NULL,
+    total_close_price DECIMAL(20, 2) NOT NULL,
+    total_volume BIGINT UNSIGNED NOT NULL,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
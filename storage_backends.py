@@ -0,0 +1,509 @@
+"""
+Storage backends of the financial data, selected with DATABASE_BACKEND:
+
+- `mysql`: a MySQL server (default).
+- `sqlite`: an embedded SQLite database file in WAL mode, for single-node
+  deployments which do not need a MySQL server.
+
+A backend opens the connections and provides the statements whose SQL
+differs between the engines, the other queries are shared.
+"""
+
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional, Sequence
+import os
+import sqlite3
+import threading
+import mysql.connector
+
+# Path of the SQLite schema, created on first connection
+SQLITE_SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'schema_sqlite.sql')
+
+_CENT = Decimal('0.01')
+
+
+def to_decimal(value) -> Optional[Decimal]:
+    """
+    Converts the result of a SUM of prices to a Decimal with 2 places,
+    like the sums of DECIMAL columns returned by MySQL. SQLite sums them
+    as floating point numbers, or as integers when every price is a whole
+    number. As prices are written rounded to cents, the error of a float
+    sum stays far below a cent, and rounding it to cents gives the exact
+    total.
+
+    :param value: The value returned by the database.
+    :return: The Decimal value, None for NULL.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        value = repr(value)
+    return Decimal(value).quantize(_CENT)
+
+
+class MySQLBackend:
+    """
+    Represents a MySQL server storage backend.
+    """
+
+    name = 'mysql'
+
+    # Whether rows can be bulk loaded with LOAD DATA LOCAL INFILE
+    supports_load_data = True
+
+    # Errors raised by the connections of this backend
+    errors = (mysql.connector.Error,)
+
+    def __init__(self, host: str, user: str, password: str, database: str):
+        """
+        Initialize a MySQLBackend instance.
+
+        :param host: The MySQL server host.
+        :param user: The user name.
+        :param password: The user password.
+        :param database: The database name.
+        """
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+
+    def connect(self, allow_local_infile: bool = False):
+        """
+        Opens a new connection to the MySQL database.
+
+        :param allow_local_infile: Whether `LOAD DATA LOCAL INFILE`
+            statements are allowed on this connection.
+        :return: The MySQL connection.
+        """
+        return mysql.connector.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            allow_local_infile=allow_local_infile
+        )
+
+    def prepared_cursor(self, conn):
+        """
+        Opens a cursor executing its query as a server-side prepared
+        statement, prepared once until the cursor is closed.
+
+        :param conn: A connection of this backend.
+        :return: The prepared cursor.
+        """
+        return conn.cursor(prepared=True)
+
+    def upsert(self, cursor, table: str, columns: Sequence[str],
+               keys: Sequence[str], rows: List[tuple]):
+        """
+        Inserts rows, updating the existing rows with the same keys,
+        with a single multi-row INSERT statement.
+
+        :param cursor: A cursor of a connection of this backend.
+        :param table: The table name.
+        :param columns: The names of the columns of the rows.
+        :param keys: The names of the primary key columns.
+        :param rows: The rows to write.
+        """
+        updates = ", ".join(f"{column}=VALUES({column})"
+                            for column in columns if column not in keys)
+        query = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+                 + ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(rows))
+                 + f" ON DUPLICATE KEY UPDATE {updates}")
+        cursor.execute(query, [value for row in rows for value in row])
+
+    def increment_query(self, table: str, key: str, column: str) -> str:
+        """
+        Returns the statement setting a counter to 1 for a new key,
+        or incrementing it for an existing key.
+
+        :param table: The table name.
+        :param key: The name of the primary key column, set by the parameter.
+        :param column: The name of the counter column.
+        :return: The SQL statement.
+        """
+        return (f"INSERT INTO {table} ({key}, {column}) VALUES (%s, 1) "
+                f"ON DUPLICATE KEY UPDATE {column} = {column} + 1")
+
+    def period_expression(self, interval: str) -> str:
+        """
+        Returns the expression of the first calendar day of the week
+        (starting on Monday), month or quarter of the `date` column.
+
+        :param interval: `week`, `month` or `quarter`.
+        :return: The SQL expression.
+        """
+        return {
+            'week': "DATE_SUB(date, INTERVAL WEEKDAY(date) DAY)",
+            'month': "DATE_SUB(date, INTERVAL DAYOFMONTH(date) - 1 DAY)",
+            'quarter': "MAKEDATE(YEAR(date), 1) + INTERVAL QUARTER(date) - 1 QUARTER",
+        }[interval]
+
+    def index_hint(self, index: str) -> str:
+        """
+        Returns the clause following a table name in a FROM clause,
+        which makes the query read the table through an index.
+
+        :param index: The index name.
+        :return: The SQL clause.
+        """
+        return f"FORCE INDEX ({index})"
+
+    def list_indexes(self, cursor, table: str) -> set:
+        """
+        Returns the names of the indexes of a table, besides its primary key.
+
+        :param cursor: A cursor of a connection of this backend.
+        :param table: The table name.
+        :return: The index names.
+        """
+        cursor.execute(
+            "SELECT DISTINCT index_name FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s "
+            "AND index_name != 'PRIMARY'", (table,))
+        return {name for (name,) in cursor.fetchall()}
+
+    def has_table(self, cursor, table: str) -> bool:
+        """
+        Tells whether a table exists.
+
+        :param cursor: A cursor of a connection of this backend.
+        :param table: The table name.
+        :return: True when the table exists.
+        """
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s", (table,))
+        return cursor.fetchone()[0] > 0
+
+    def full_scans(self, cursor, query: str, params: Sequence = ()) -> List[str]:
+        """
+        Explains a query and returns the steps of its plan which read
+        a whole table or a whole index.
+
+        :param cursor: A cursor of a connection of this backend.
+        :param query: The query, with `%s` placeholders.
+        :param params: The parameters of the query.
+        :return: The descriptions of the full scans, empty when there is none.
+        """
+        cursor.execute("EXPLAIN " + query, params)
+        columns = [column[0] for column in cursor.description]
+        scans = []
+        for row in cursor.fetchall():
+            step = dict(zip(columns, row))
+            if step['type'] in ('ALL', 'index'):
+                scans.append(f"{step['table']}: type={step['type']} key={step['key']}")
+        return scans
+
+    def plan_indexes(self, cursor, query: str, params: Sequence = ()) -> List[str]:
+        """
+        Explains a query and returns the indexes its plan reads.
+
+        :param cursor: A cursor of a connection of this backend.
+        :param query: The query, with `%s` placeholders.
+        :param params: The parameters of the query.
+        :return: The index names, `PRIMARY` for the primary key.
+        """
+        cursor.execute("EXPLAIN " + query, params)
+        columns = [column[0] for column in cursor.description]
+        return [step['key'] for step in (dict(zip(columns, row)) for row in cursor.fetchall())
+                if step['key']]
+
+    def plan_sorts(self, cursor, query: str, params: Sequence = ()) -> List[str]:
+        """
+        Explains a query and returns the steps of its plan which sort rows,
+        instead of reading them in the order of an index.
+
+        :param cursor: A cursor of a connection of this backend.
+        :param query: The query, with `%s` placeholders.
+        :param params: The parameters of the query.
+        :return: The descriptions of the sorts, empty when there is none.
+        """
+        cursor.execute("EXPLAIN " + query, params)
+        columns = [column[0] for column in cursor.description]
+        sorts = []
+        for row in cursor.fetchall():
+            step = dict(zip(columns, row))
+            if 'Using filesort' in (step['Extra'] or ''):
+                sorts.append(f"{step['table']}: {step['Extra']}")
+        return sorts
+
+
+class SQLiteCursor:
+    """
+    Represents a cursor of a SQLite connection, accepting the `%s`
+    placeholders of the queries shared with MySQL.
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        """
+        :param cursor: The wrapped sqlite3 cursor.
+        """
+        self._cursor = cursor
+
+    def execute(self, query: str, params: Sequence = ()):
+        self._cursor.execute(query.replace('%s', '?'), tuple(params))
+
+    def executemany(self, query: str, rows: Sequence[Sequence]):
+        self._cursor.executemany(query.replace('%s', '?'), rows)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class SQLiteConnection:
+    """
+    Represents a connection to a SQLite database,
+    with the methods used on MySQL connections.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        """
+        :param conn: The wrapped sqlite3 connection.
+        """
+        self._conn = conn
+
+    def cursor(self) -> SQLiteCursor:
+        return SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect: bool = False):
+        self._conn.execute("SELECT 1")
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteBackend:
+    """
+    Represents an embedded SQLite database storage backend. The database
+    is opened in WAL mode, so that readers are not blocked by the writer,
+    and its tables are clustered by primary key for range scans.
+    """
+
+    name = 'sqlite'
+
+    # Whether rows can be bulk loaded with LOAD DATA LOCAL INFILE
+    supports_load_data = False
+
+    # Errors raised by the connections of this backend
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path: str, mmap_size: int = 256 * 1024 * 1024):
+        """
+        Initialize a SQLiteBackend instance.
+
+        :param path: The path of the database file.
+        :param mmap_size: Number of bytes of the database file read
+            through memory mapping.
+        """
+        self.path = path
+        self.mmap_size = mmap_size
+        self._schema_created = False
+        self._lock = threading.Lock()
+
+        # Read DATE and DECIMAL columns as the MySQL connector does
+        sqlite3.register_adapter(Decimal, str)
+        sqlite3.register_adapter(date, date.isoformat)
+        sqlite3.register_converter(
+            'DATE', lambda value: date.fromisoformat(value.decode()))
+        sqlite3.register_converter(
+            'DECIMAL', lambda value: Decimal(value.decode()).quantize(_CENT))
+
+    def connect(self, allow_local_infile: bool = False) -> SQLiteConnection:
+        """
+        Opens a new connection to the SQLite database,
+        creating its tables if needed.
+
+        :param allow_local_infile: Ignored, as SQLite does not support
+            `LOAD DATA LOCAL INFILE`.
+        :return: The SQLite connection.
+        """
+        # Pooled connections are handed over between threads,
+        # but used by one thread at a time
+        conn = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+
+        with self._lock:
+            if not self._schema_created:
+                with open(SQLITE_SCHEMA_PATH) as schema:
+                    conn.executescript(schema.read())
+                self._schema_created = True
+
+        return SQLiteConnection(conn)
+
+    def prepared_cursor(self, conn: SQLiteConnection) -> SQLiteCursor:
+        """
+        Opens a cursor for prepared queries. SQLite connections keep
+        the statements they compiled, by query text.
+
+        :param conn: A connection of this backend.
+        :return: The cursor.
+        """
+        return conn.cursor()
+
+    def upsert(self, cursor, table: str, columns: Sequence[str],
+               keys: Sequence[str], rows: List[tuple]):
+        """
+        Inserts rows, updating the existing rows with the same keys, by
+        executing a prepared single-row statement for each row, which
+        SQLite runs faster than one statement of many rows.
+
+        :param cursor: A cursor of a connection of this backend.
+        :param table: The table name.
+        :param columns: The names of the columns of the rows.
+        :param keys: The names of the primary key columns.
+        :param rows: The rows to write.
+        """
+        updates = ", ".join(f"{column}=excluded.{column}"
+                            for column in columns if column not in keys)
+        query = (f"INSERT INTO {table} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join(['%s'] * len(columns))}) "
+                 f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}")
+        cursor.executemany(query, rows)
+
+    def increment_query(self, table: str, key: str, column: str) -> str:
+        """
+        Returns the statement setting a counter to 1 for a new key,
+        or incrementing it for an existing key.
+
+        :param table: The table name.
+        :param key: The name of the primary key column, set by the parameter.
+        :param column: The name of the counter column.
+        :return: The SQL statement.
+        """
+        return (f"INSERT INTO {table} ({key}, {column}) VALUES (%s, 1) "
+                f"ON CONFLICT ({key}) DO UPDATE SET {column} = {column} + 1")
+
+    def period_expression(self, interval: str) -> str:
+        """
+        Returns the expression of the first calendar day of the week
+        (starting on Monday), month or quarter of the `date` column.
+
+        :param interval: `week`, `month` or `quarter`.
+        :return: The SQL expression.
+        """
+        return {
+            'week': ("date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7)"
+                     " || ' days')"),
+            'month': "date(date, 'start of month')",
+            'quarter': ("date(date, 'start of month', '-' || "
+                        "((CAST(strftime('%m', date) AS INTEGER) - 1) % 3) || ' months')"),
+        }[interval]
+
+    def index_hint(self, index: str) -> str:
+        """
+        Returns the clause following a table name in a FROM clause,
+        which makes the query read the table through an index.
+
+        :param index: The index name.
+        :return: The SQL clause.
+        """
+        return f"INDEXED BY {index}"
+
+    def list_indexes(self, cursor, table: str) -> set:
+        """
+        Returns the names of the indexes of a table, besides its primary key.
+
+        :param cursor: A cursor of a connection of this backend.
+        :param table: The table name.
+        :return: The index names.
+        """
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' "
+            "AND tbl_name = %s AND name NOT LIKE 'sqlite_autoindex_%'", (table,))
+        return {name for (name,) in cursor.fetchall()}
+
+    def has_table(self, cursor, table: str) -> bool:
+        """
+        Tells whether a table exists.
+
+        :param cursor: A cursor of a connection of this backend.
+        :param table: The table name.
+        :return: True when the table exists.
+        """
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' "
+            "AND name = %s", (table,))
+        return cursor.fetchone()[0] > 0
+
+    def full_scans(self, cursor, query: str, params: Sequence = ()) -> List[str]:
+        """
+        Explains a query and returns the steps of its plan which read
+        a whole table or a whole index.
+
+        :param cursor: A cursor of a connection of this backend.
+        :param query: The query, with `%s` placeholders.
+        :param params: The parameters of the query.
+        :return: The descriptions of the full scans, empty when there is none.
+        """
+        cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+        return [detail for (_, _, _, detail) in cursor.fetchall()
+                if detail.startswith('SCAN ')]
+
+    def plan_indexes(self, cursor, query: str, params: Sequence = ()) -> List[str]:
+        """
+        Explains a query and returns the indexes its plan reads.
+
+        :param cursor: A cursor of a connection of this backend.
+        :param query: The query, with `%s` placeholders.
+        :param params: The parameters of the query.
+        :return: The index names, `PRIMARY` for the primary key.
+        """
+        cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+        indexes = []
+        for (_, _, _, detail) in cursor.fetchall():
+            words = detail.split()
+            if words[0] not in ('SCAN', 'SEARCH'):
+                continue
+            if 'INDEX' in words:
+                indexes.append(words[words.index('INDEX') + 1])
+            else:
+                # The tables are clustered by primary key (WITHOUT ROWID)
+                indexes.append('PRIMARY')
+        return indexes
+
+    def plan_sorts(self, cursor, query: str, params: Sequence = ()) -> List[str]:
+        """
+        Explains a query and returns the steps of its plan which sort rows,
+        instead of reading them in the order of an index.
+
+        :param cursor: A cursor of a connection of this backend.
+        :param query: The query, with `%s` placeholders.
+        :param params: The parameters of the query.
+        :return: The descriptions of the sorts, empty when there is none.
+        """
+        cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+        return [detail for (_, _, _, detail) in cursor.fetchall()
+                if detail.startswith('USE TEMP B-TREE FOR ORDER BY')]
@@ -0,0 +1,40 @@
+"""
+Runs the tests against a SQLite database in a temporary directory. The
+modules read their configuration when imported, so it is set up before.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir))
+sys.path.insert(0, ROOT_DIR)
+
+os.environ['DATABASE_BACKEND'] = 'sqlite'
+os.environ['DATABASE_SQLITE_PATH'] = os.path.join(
+    tempfile.mkdtemp(prefix='financial-tests-'), 'financial.sqlite3')
+os.environ.setdefault('API_GET_RECENT_DATA_IN_DAYS', '14')
+
+# Responses are not cached, as the tests write rows without data versions
+os.environ['CACHE_MAX_ENTRIES'] = '0'
+
+
+@pytest.fixture
+def db():
+    """
+    An opened connection with a cursor to the test database,
+    with the migrations applied.
+    """
+    from db_connection import DbConnection
+    from migrations import apply_migrations
+
+    connection = DbConnection()
+    connection.connect()
+    connection.open_cursor()
+    apply_migrations(connection)
+    try:
+        yield connection
+    finally:
+        connection.disconnect()
@@ -0,0 +1,51 @@
+from datetime import date
+from decimal import Decimal
+import json
+
+from financial_data import (FinancialData, FinancialDataBatch, FinancialDataEncoder,
+                            dump_financial_data, dump_financial_data_lines)
+
+# Prices as read from the DECIMAL(10, 2) columns
+ROWS = [
+    ('IBM', date(2023, 5, 5), Decimal('123.45'), Decimal('124.00'), 3200000),
+    ('IBM', date(2023, 5, 8), Decimal('0.07'), Decimal('0.50'), 0),
+    ('AAPL', date(2023, 5, 8), Decimal('-0.05'), Decimal('-12.34'), 42),
+    ('AAPL', date(2023, 5, 9), Decimal('-100.00'), Decimal('0.00'), 1),
+    ('B"R\\K', date(1999, 12, 31), Decimal('99999999.99'), Decimal('-99999999.99'), 2 ** 40),
+]
+
+
+def _row_dicts():
+    return [{
+        "symbol": symbol,
+        "date": day.isoformat(),
+        "open_price": str(open_price),
+        "close_price": str(close_price),
+        "volume": volume,
+    } for (symbol, day, open_price, close_price, volume) in ROWS]
+
+
+def test_dump_financial_data_matches_json_dumps():
+    batch = FinancialDataBatch.from_rows(ROWS)
+
+    assert dump_financial_data(batch) == json.dumps(_row_dicts()).encode()
+
+
+def test_dump_financial_data_matches_encoder():
+    batch = FinancialDataBatch.from_rows(ROWS)
+    items = [FinancialData(*row) for row in ROWS]
+
+    assert dump_financial_data(batch) == json.dumps(items, cls=FinancialDataEncoder).encode()
+    assert dump_financial_data(batch) == json.dumps(batch, cls=FinancialDataEncoder).encode()
+
+
+def test_dump_financial_data_lines_matches_json_dumps():
+    batch = FinancialDataBatch.from_rows(ROWS)
+
+    expected = "".join(json.dumps(row) + "\n" for row in _row_dicts())
+    assert dump_financial_data_lines(batch) == expected.encode()
+
+
+def test_dump_empty_batch():
+    assert dump_financial_data(FinancialDataBatch()) == b"[]"
+    assert dump_financial_data_lines(FinancialDataBatch()) == b""
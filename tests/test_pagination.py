@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from urllib.parse import urlencode
+import http.client
+import json
+import threading
+
+import pytest
+
+SYMBOLS = ('AAPL', 'IBM', 'MSFT')
+FIRST_DAY = date(2023, 1, 2)
+DAYS = 40
+
+
+@pytest.fixture
+def financial_data(db):
+    """
+    Rows of a few symbols on consecutive days.
+    """
+    from db_connection import storage_backend
+
+    rows = [(symbol, FIRST_DAY + timedelta(days=day),
+             Decimal(100 + day) / 4, Decimal(200 - day) / 8, 1000 * day)
+            for symbol in SYMBOLS for day in range(DAYS)]
+    storage_backend.upsert(
+        db.cursor, 'financial_data',
+        ('symbol', 'date', 'open_price', 'close_price', 'volume'),
+        ('symbol', 'date'), rows)
+    db.conn.commit()
+    try:
+        yield rows
+    finally:
+        db.cursor.execute("DELETE FROM financial_data")
+        db.conn.commit()
+
+
+@pytest.fixture(scope='module')
+def api():
+    """
+    A threaded API server, and a function returning
+    the JSON response of one of its paths.
+    """
+    from financial.app import create_server
+
+    httpd = create_server('threaded', port=0, workers=2)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    conn = http.client.HTTPConnection('localhost', httpd.server_port)
+
+    def get(path: str, **params) -> dict:
+        conn.request('GET', f"{path}?{urlencode(params)}")
+        response = conn.getresponse()
+        body = response.read()
+        assert response.status == 200, body
+        return json.loads(body)
+
+    try:
+        yield get
+    finally:
+        conn.close()
+        httpd.shutdown()
+        httpd.server_close()
+        thread.join()
+
+
+def _offset_walk(get, limit: int, **params) -> list:
+    rows = []
+    first = get('/api/financial_data', limit=limit, page=1, **params)
+    for page in range(1, first['pagination']['pages'] + 1):
+        rows.extend(get('/api/financial_data', limit=limit, page=page, **params)['data'])
+    return rows
+
+
+def _cursor_walk(get, limit: int, **params) -> list:
+    rows = []
+    cursor = 'first'
+    while cursor:
+        response = get('/api/financial_data', limit=limit, cursor=cursor, **params)
+        rows.extend(response['data'])
+        cursor = response['pagination'].get('next_cursor')
+    return rows
+
+
+@pytest.mark.parametrize('params', [
+    {},
+    {'symbol': 'IBM'},
+    {'start_date': '2023-01-20'},
+    {'end_date': '2023-01-25'},
+    {'start_date': '2023-01-10', 'end_date': '2023-02-01'},
+    {'symbol': 'MSFT', 'start_date': '2023-01-10', 'end_date': '2023-02-01'},
+])
+@pytest.mark.parametrize('limit', [1, 7, 40, 500])
+def test_cursor_walk_matches_offset_walk(financial_data, api, params, limit):
+    offset_rows = _offset_walk(api, limit, **params)
+    cursor_rows = _cursor_walk(api, limit, **params)
+
+    assert cursor_rows == offset_rows
+    assert offset_rows
+    keys = [(row['symbol'], row['date']) for row in offset_rows]
+    assert keys == sorted(set(keys))
@@ -0,0 +1,12 @@
+from migrations import DATE_COVERING_INDEX, DATE_INDEX, check_query_plans, load_indexes
+
+
+def test_migrations_create_date_indexes(db):
+    assert {DATE_INDEX, DATE_COVERING_INDEX} <= load_indexes(db)
+
+
+def test_queries_read_ranges_of_their_expected_index(db):
+    plans = check_query_plans(db)
+
+    assert plans
+    assert [(query, problems) for (query, problems) in plans if problems] == []
@@ -0,0 +1,169 @@
+"""
+Parses the daily timeseries of an external API response incrementally,
+from the chunks of its body, so that a full history does not have to be
+loaded in memory when only its latest days are kept.
+"""
+
+from json.decoder import scanstring
+from typing import Iterable, Iterator, Tuple
+import codecs
+import json
+
+# Characters skipped between JSON tokens
+WHITESPACE = ' \t\n\r'
+
+
+class TimeSeriesStream:
+    """
+    Represents the daily values of a timeseries payload, eg:
+    `{"Meta Data": {...}, "Time Series (Daily)": {"2023-05-12": {...}, ...}}`,
+    iterated as (day, values) tuples in payload order while the body is read.
+
+    The body is only read as far as the iteration goes, so stopping early
+    skips the rest of the payload. Each iteration raises KeyError when the
+    payload has no timeseries, and json.JSONDecodeError when it is invalid.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], series_key: str = 'Time Series (Daily)'):
+        """
+        :param chunks: The chunks of the response body, eg: `response.iter_content()`.
+        :param series_key: The key of the timeseries in the payload.
+        """
+        self.series_key = series_key
+
+        # Members of the payload read before the timeseries,
+        # eg: "Meta Data", or "Note" when the API refuses the request
+        self.header = {}
+
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def __iter__(self) -> Iterator[Tuple[str, dict]]:
+        self._expect('{')
+        if self._peek() == '}':
+            raise KeyError(self.series_key)
+
+        while True:
+            key = self._string()
+            self._expect(':')
+            if key == self.series_key:
+                yield from self._series()
+                return
+
+            self.header[key] = self._value()
+            if self._separator('}'):
+                raise KeyError(self.series_key)
+
+    def _series(self) -> Iterator[Tuple[str, dict]]:
+        """
+        Returns the (day, values) tuples of the timeseries object.
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            return
+
+        while True:
+            day = self._string()
+            self._expect(':')
+            yield (day, self._value())
+            if self._separator('}'):
+                return
+
+    def _fill(self) -> bool:
+        """
+        Appends the next chunk of the body to the buffer,
+        dropping what was already parsed.
+
+        :return: False at the end of the body.
+        """
+        if self._eof:
+            return False
+
+        for chunk in self._chunks:
+            text = self._text_decoder.decode(chunk)
+            if text:
+                self._buffer = self._buffer[self._pos:] + text
+                self._pos = 0
+                return True
+
+        # Fails when the body ends within a character
+        self._text_decoder.decode(b'', final=True)
+        self._eof = True
+        return False
+
+    def _error(self, message: str):
+        """
+        Raises a decoding error at the current position.
+        """
+        raise json.JSONDecodeError(message, self._buffer, self._pos)
+
+    def _peek(self) -> str:
+        """
+        Skips whitespace and returns the next character, without consuming it.
+        """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                self._error("Unexpected end of data")
+
+    def _expect(self, char: str):
+        """
+        Consumes the next character, which must be `char`.
+        """
+        if self._peek() != char:
+            self._error(f"Expecting '{char}'")
+        self._pos += 1
+
+    def _separator(self, closing: str) -> bool:
+        """
+        Consumes the separator following a member.
+
+        :param closing: The character closing the object.
+        :return: True when the object is closed.
+        """
+        char = self._peek()
+        if char != closing and char != ',':
+            self._error("Expecting ',' delimiter")
+        self._pos += 1
+        return char == closing
+
+    def _string(self) -> str:
+        """
+        Consumes a string, read further while it is not terminated.
+        """
+        self._expect('"')
+        while True:
+            try:
+                (value, end) = scanstring(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            self._pos = end
+            return value
+
+    def _value(self):
+        """
+        Consumes a value, read further while it is not complete.
+        """
+        self._peek()
+        while True:
+            try:
+                (value, end) = self._json_decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+
+            # A number ending the buffer may go on in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value